@@ -0,0 +1,264 @@
+"""Load and latency benchmarks for the tasks/comments API, with a regression gate.
+
+Seeds a throwaway database on a local MongoDB (``MONGO_URI``), drives the
+real Flask app in-process through each scenario and reports p50/p95/p99
+latency and throughput. With ``--baseline`` the run is compared against a
+stored result and exits non-zero when a scenario regressed::
+
+    make bench-api                   # compare with benchmarks/baseline.json
+    make bench-api-baseline          # record a new baseline on this machine
+
+Baselines are machine-specific; record them on the machine that runs the
+comparison.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+
+SCENARIOS = ('deep_pagination', 'comment_burst', 'list_tasks', 'cascade_delete', 'mixed')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class Recorder:
+    """Collect request latencies (seconds) for one scenario."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def call(self, method, *args, expect=(200,), **kwargs):
+        started = time.perf_counter()
+        response = method(*args, **kwargs)
+        # Streamed bodies are only produced while they are read
+        data = response.get_data()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies.append(elapsed)
+            if response.status_code not in expect:
+                self.errors += 1
+        return response, data
+
+    def summary(self, wall_time):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {'requests': 0, 'errors': self.errors}
+        return {
+            'requests': len(latencies),
+            'errors': self.errors,
+            'rps': round(len(latencies) / wall_time, 1),
+            'p50_ms': round(statistics.median(latencies) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3)
+        }
+
+
+def seed(tasks, comments_per_task, deep_comments):
+    """Create the dataset; return (task ids, id of the task with many comments)."""
+    from backend.models import Tasks, Comments
+
+    created = []
+    for start in range(0, tasks, 500):
+        batch = Tasks.create_batch([
+            {'title': f'Bench task {i}', 'description': 'Seeded by bench_api',
+             'status': random.choice(['todo', 'in_progress', 'done'])}
+            for i in range(start, min(start + 500, tasks))
+        ])
+        created += [task['_id'] for task in batch if task]
+    for task_id in created:
+        if comments_per_task:
+            Comments.create_batch(task_id, [
+                {'body': f'Comment {i}', 'author': 'bench'} for i in range(comments_per_task)
+            ])
+    deep_task = Tasks.create_batch([{'title': 'Bench deep task'}])[0]['_id']
+    for start in range(0, deep_comments, 1000):
+        Comments.create_batch(deep_task, [
+            {'body': f'Deep comment {i}'} for i in range(start, min(start + 1000, deep_comments))
+        ])
+    return [str(task_id) for task_id in created], str(deep_task)
+
+
+def deep_pagination(client, recorder, ctx, args):
+    """Walk every comment page of one large task via keyset cursors."""
+    for _ in range(args.repeat):
+        url = f"/api/tasks/{ctx['deep_task']}/comments?limit=100"
+        while url:
+            _, data = recorder.call(client.get, url)
+            cursor = json.loads(data)['next_cursor']
+            url = (f"/api/tasks/{ctx['deep_task']}/comments?limit=100&cursor={cursor}"
+                   if cursor else None)
+
+
+def comment_burst(client, recorder, ctx, args):
+    """Create comments on one task back to back."""
+    task_id = random.choice(ctx['tasks'])
+    for i in range(args.burst):
+        recorder.call(client.post, f'/api/tasks/{task_id}/comments',
+                      json={'body': f'Burst {i}', 'author': 'bench'}, expect=(201,))
+
+
+def list_tasks(client, recorder, ctx, args):
+    """Stream the full task listing."""
+    for _ in range(args.repeat):
+        recorder.call(client.get, '/api/tasks')
+
+
+def cascade_delete(client, recorder, ctx, args):
+    """Delete tasks with comments; the purge itself runs in the background."""
+    for _ in range(args.repeat):
+        response = client.post('/api/tasks', json={'title': 'Doomed'})
+        task_id = response.get_json()['_id']
+        client.post(f'/api/tasks/{task_id}/comments:batch', json={
+            'comments': [{'body': f'Doomed {i}'} for i in range(args.comments)]
+        })
+        recorder.call(client.delete, f'/api/tasks/{task_id}', expect=(204,))
+
+
+def mixed(client, recorder, ctx, args):
+    """80% reads (task, comment page, task page), 20% writes."""
+    rng = random.Random(threading.get_ident())
+    for _ in range(args.ops):
+        task_id = rng.choice(ctx['tasks'])
+        roll = rng.random()
+        if roll < 0.3:
+            recorder.call(client.get, f'/api/tasks/{task_id}')
+        elif roll < 0.6:
+            recorder.call(client.get, f'/api/tasks/{task_id}/comments?limit=20')
+        elif roll < 0.8:
+            recorder.call(client.get, '/api/tasks?limit=20')
+        elif roll < 0.9:
+            recorder.call(client.post, f'/api/tasks/{task_id}/comments',
+                          json={'body': 'Mixed'}, expect=(201,))
+        else:
+            recorder.call(client.patch, f'/api/tasks/{task_id}',
+                          json={'status': rng.choice(['todo', 'in_progress', 'done'])})
+
+
+def run_scenario(app, name, ctx, args):
+    """Run a scenario on ``args.threads`` clients and summarize it."""
+    recorder = Recorder()
+    scenario = globals()[name]
+    threads = [
+        threading.Thread(target=scenario, args=(app.test_client(), recorder, ctx, args))
+        for _ in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = recorder.summary(time.perf_counter() - started)
+    if name == 'cascade_delete':
+        # Time until the background purges have caught up
+        purge_started = time.perf_counter()
+        app.extensions['task_purger'].join()
+        summary['purge_drain_ms'] = round((time.perf_counter() - purge_started) * 1000, 3)
+    return summary
+
+
+def compare(results, baseline, tolerance):
+    """Return the regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous or not current.get('requests'):
+            continue
+        for metric in ('p95_ms', 'p99_ms'):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {previous[metric]} -> {current[metric]}")
+        if current['rps'] < previous['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+        if current['errors'] > previous.get('errors', 0):
+            regressions.append(f"{name}: errors {previous.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help="comma-separated subset of: " + ', '.join(SCENARIOS))
+    parser.add_argument('--tasks', type=int, default=2000, help="tasks to seed")
+    parser.add_argument('--comments', type=int, default=10, help="comments per seeded task")
+    parser.add_argument('--deep-comments', type=int, default=20000,
+                        help="comments on the task used for deep pagination")
+    parser.add_argument('--threads', type=int, default=1, help="concurrent clients")
+    parser.add_argument('--repeat', type=int, default=5, help="iterations of looped scenarios")
+    parser.add_argument('--burst', type=int, default=500, help="comments per creation burst")
+    parser.add_argument('--ops', type=int, default=2000, help="operations per mixed client")
+    parser.add_argument('--seed', type=int, default=1, help="random seed")
+    parser.add_argument('--baseline', help="baseline JSON to compare against")
+    parser.add_argument('--save-baseline', help="write the results to this JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="allowed relative slowdown before failing")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    os.environ['DB_NAME'] = f'bench_api_{uuid.uuid4().hex[:8]}'
+    from backend.app import create_app
+    from backend.db import get_client, get_db
+    from backend.indexes import sync_indexes
+    from backend.purge import InProcessPurger
+
+    app = create_app()
+    # Purges are timed in this process rather than handed to Temporal
+    app.extensions['task_purger'] = InProcessPurger()
+    # Every simulated client shares one address
+    app.extensions['admission'].enabled = False
+    sync_indexes(get_db())
+    try:
+        started = time.perf_counter()
+        tasks, deep_task = seed(args.tasks, args.comments, args.deep_comments)
+        print(f"seeded {len(tasks)} tasks x {args.comments} comments and "
+              f"{args.deep_comments} deep comments in {time.perf_counter() - started:.1f}s")
+        ctx = {'tasks': tasks, 'deep_task': deep_task}
+
+        results = {}
+        for name in args.scenarios.split(','):
+            if name not in SCENARIOS:
+                parser.error(f"unknown scenario {name}")
+            results[name] = run_scenario(app, name, ctx, args)
+            summary = results[name]
+            print(f"{name:<16} {summary['requests']:>7} req  {summary.get('rps', 0):>9} rps  "
+                  f"p50 {summary.get('p50_ms', 0):>8} ms  p95 {summary.get('p95_ms', 0):>8} ms  "
+                  f"p99 {summary.get('p99_ms', 0):>8} ms  errors {summary['errors']}")
+    finally:
+        get_client().drop_database(os.environ['DB_NAME'])
+
+    report = {'params': {k: v for k, v in vars(args).items()
+                         if k not in ('baseline', 'save_baseline')},
+              'scenarios': results}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline written to {args.save_baseline}")
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            print(f"no baseline at {args.baseline}; record one with --save-baseline")
+            return
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('params') != report['params']:
+            print("warning: baseline was recorded with different parameters")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
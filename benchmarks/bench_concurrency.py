@@ -0,0 +1,105 @@
+"""Load test: requests per second of the sync (Flask) vs async (Quart) API.
+
+Start each server with one worker against the same database, then point this
+script at it, e.g.::
+
+    make api-dev            # or: gunicorn -w 1 --threads 8 backend.app:app
+    make api-async          # hypercorn -w 1 backend.aio.app:app
+    make bench-concurrency URL=http://localhost:5000
+    make bench-concurrency URL=http://localhost:8000
+
+Each client thread keeps a connection open and loops over the read paths
+(task page, single task, comment page) for ``--duration`` seconds.
+"""
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def request(conn, method, path, body=None):
+    """Send a request on ``conn`` and return (status, decoded body)."""
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    conn.request(method, path, body=body and json.dumps(body), headers=headers)
+    response = conn.getresponse()
+    data = response.read()
+    return response.status, data
+
+
+def seed(host, port, tasks, comments):
+    """Create tasks with comments to read back; return the task ids."""
+    conn = http.client.HTTPConnection(host, port)
+    status, data = request(conn, 'POST', '/api/tasks:batch', {
+        'tasks': [{'title': f'Load test task {i}'} for i in range(tasks)]
+    })
+    assert status == 200, data
+    ids = [result['task']['_id'] for result in json.loads(data)['results']]
+    for task_id in ids:
+        request(conn, 'POST', f'/api/tasks/{task_id}/comments:batch', {
+            'comments': [{'body': f'Comment {i}'} for i in range(comments)]
+        })
+    conn.close()
+    return ids
+
+
+def client(host, port, paths, deadline, latencies, errors):
+    """Issue requests round-robin over ``paths`` until ``deadline``."""
+    conn = http.client.HTTPConnection(host, port)
+    i = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            status, _ = request(conn, 'GET', paths[i % len(paths)])
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, port)
+            status = None
+        latencies.append(time.perf_counter() - started)
+        if status != 200:
+            errors.append(status)
+        i += 1
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', default='http://localhost:5000', help="API base URL")
+    parser.add_argument('--concurrency', type=int, default=64, help="client threads")
+    parser.add_argument('--duration', type=float, default=15, help="seconds per run")
+    parser.add_argument('--tasks', type=int, default=50, help="tasks to seed")
+    parser.add_argument('--comments', type=int, default=20, help="comments per task")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    ids = seed(url.hostname, url.port or 80, args.tasks, args.comments)
+    paths = ['/api/tasks?limit=20']
+    paths += [f'/api/tasks/{task_id}' for task_id in ids]
+    paths += [f'/api/tasks/{task_id}/comments?limit=20' for task_id in ids]
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=client, args=(
+            url.hostname, url.port or 80, paths, deadline, latencies, errors
+        ))
+        for _ in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"{args.url}: {args.concurrency} clients, {args.duration:.0f}s")
+    print(f"requests  {total:10d}   errors {len(errors)}")
+    print(f"rps       {total / args.duration:10.1f}")
+    print(f"p50       {statistics.median(latencies) * 1000:10.2f} ms")
+    print(f"p99       {latencies[int(total * 0.99)] * 1000:10.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Microbenchmark: old vs new serialization of a page of tasks/comments.
+
+Run with ``make bench-serialization`` (no database needed).
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta
+from bson import ObjectId
+from backend.json_provider import dumps, orjson
+from backend.utils import (
+    jsonify_task, jsonify_tasks, jsonify_comment, jsonify_comments
+)
+
+
+def make_tasks(n):
+    """Build ``n`` task documents shaped like the ones in Mongo."""
+    now = datetime(2024, 1, 1)
+    return [
+        {
+            '_id': ObjectId(),
+            'title': f'Task {i}',
+            'description': 'Lorem ipsum dolor sit amet ' * 4,
+            'status': 'todo',
+            'comment_count': i,
+            'last_comment_at': now + timedelta(minutes=i),
+            'created_at': now + timedelta(seconds=i),
+            'updated_at': now + timedelta(seconds=i)
+        }
+        for i in range(n)
+    ]
+
+
+def make_comments(n):
+    """Build ``n`` comment documents shaped like the ones in Mongo."""
+    now = datetime(2024, 1, 1)
+    task_id = ObjectId()
+    return [
+        {
+            '_id': ObjectId(),
+            'task_id': task_id,
+            'body': 'Looks good to me, shipping it. ' * 3,
+            'author': 'alice',
+            'created_at': now + timedelta(seconds=i),
+            'updated_at': now + timedelta(seconds=i)
+        }
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=100, help="documents per page")
+    parser.add_argument('--number', type=int, default=2000, help="pages per timing")
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.size)
+    comments = make_comments(args.size)
+    # Both paths must produce identical payloads
+    assert [jsonify_task(t) for t in tasks] == jsonify_tasks(tasks)
+    assert [jsonify_comment(c) for c in comments] == jsonify_comments(comments)
+
+    cases = {
+        'tasks (old)': lambda: json.dumps([jsonify_task(t) for t in tasks]),
+        'tasks (new)': lambda: dumps(jsonify_tasks(tasks)),
+        'comments (old)': lambda: json.dumps([jsonify_comment(c) for c in comments]),
+        'comments (new)': lambda: dumps(jsonify_comments(comments)),
+    }
+    print(f"encoder: {'orjson' if orjson else 'json'}, "
+          f"{args.size} docs/page, best of 5 x {args.number} pages")
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, number=args.number, repeat=5))
+        print(f"{name:<16} {best / args.number * 1e6:10.1f} us/page")
+
+
+if __name__ == '__main__':
+    main()
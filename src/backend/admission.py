@@ -0,0 +1,246 @@
+"""Admission control for the /api routes: rate limits, concurrency caps, shedding.
+
+Every /api request passes three checks before it runs, cheapest first:
+
+1. Shedding: while the MongoDB pool has more than ``max_pool_wait_queue``
+   threads waiting for a connection, or checkouts waited more than
+   ``max_pool_wait_ms`` on average over the last second, requests are
+   answered 503 at once instead of joining the queue.
+2. Per-client token buckets (``rate_limit``), keyed by the address the
+   trusted proxies saw (client_key); clients over their rate get 429.
+3. In-flight caps per route class (``max_in_flight``): reads, writes, the
+   cascading task deletes and comment streams; a full class answers 503.
+   An open stream holds a worker thread of the Flask app for its whole
+   life, so there streams get ``sync_stream`` slots, a small fraction of
+   a worker's threads. The async app holds none and gets ``stream``.
+
+Rejections carry Retry-After. Settings come from the ``admission``
+config section; the counters are exported on /metrics.
+"""
+import contextvars
+import math
+import threading
+import time
+from collections import defaultdict
+from flask import request as flask_request
+from backend.cache import LRUCache
+from backend.config import get_config
+from backend.db import pool_metrics
+from backend.metrics import _labels, call_on_close, request_hook
+
+
+ROUTE_CLASSES = ('read', 'write', 'cascade', 'stream')
+# Endpoints whose class does not follow from the method
+CASCADE_ENDPOINTS = ('tasks.delete_task', 'tasks.delete_tasks_batch')
+STREAM_ENDPOINTS = ('comments.stream_comments',)
+
+_admitted = contextvars.ContextVar('admitted', default=None)
+
+
+def route_class(method, endpoint):
+    """Classify a request for the in-flight caps."""
+    if endpoint in CASCADE_ENDPOINTS:
+        return 'cascade'
+    if endpoint in STREAM_ENDPOINTS:
+        return 'stream'
+    return 'read' if method in ('GET', 'HEAD', 'OPTIONS') else 'write'
+
+
+class TokenBucket:
+    """Allow ``rate`` requests per second on average, bursts up to ``burst``."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Spend a token; return 0, or the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Admit or reject requests according to the ``admission`` settings."""
+
+    def __init__(self, settings=None, asynchronous=True):
+        settings = get_config('admission', {}) if settings is None else settings
+        self.enabled = settings.get('enabled', True)
+        rate_limit = settings.get('rate_limit', {})
+        self.rate = rate_limit.get('requests_per_second', 100)
+        self.burst = rate_limit.get('burst', 200)
+        max_in_flight = settings.get('max_in_flight', {})
+        self.max_in_flight = {
+            'read': max_in_flight.get('read', 64),
+            'write': max_in_flight.get('write', 32),
+            'cascade': max_in_flight.get('cascade', 4),
+            'stream': (max_in_flight.get('stream', 256) if asynchronous
+                       else max_in_flight.get('sync_stream', 2)),
+        }
+        shed = settings.get('shed', {})
+        self.max_pool_wait_queue = shed.get('max_pool_wait_queue', 50)
+        self.max_pool_wait_ms = shed.get('max_pool_wait_ms', 500)
+        self.retry_after = settings.get('retry_after_s', 1)
+        # Buckets of clients idle for a minute are dropped (and start full)
+        self._buckets = LRUCache(maxsize=settings.get('max_clients', 10000), ttl=60)
+        self._lock = threading.Lock()
+        self.in_flight = defaultdict(int)   # route class
+        self.outcomes = defaultdict(int)    # (route class, outcome)
+
+    def admit(self, client, route_class):
+        """Return None if the request may run, else an error response.
+
+        An admitted request holds an in-flight slot until release().
+        """
+        if self._overloaded():
+            return self._reject(route_class, 'shed', 503,
+                                "Server is overloaded, retry later", self.retry_after)
+        if self.rate:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets.set(client, bucket)
+            wait = bucket.take()
+            if wait:
+                return self._reject(route_class, 'rate_limited', 429,
+                                    "Rate limit exceeded", math.ceil(wait))
+        with self._lock:
+            if self.in_flight[route_class] >= self.max_in_flight[route_class]:
+                self.outcomes[(route_class, 'over_capacity')] += 1
+                full = True
+            else:
+                self.in_flight[route_class] += 1
+                self.outcomes[(route_class, 'admitted')] += 1
+                full = False
+        if full:
+            return self._error(503, f"Too many {route_class} requests, retry later",
+                               self.retry_after)
+        return None
+
+    def release(self, route_class):
+        with self._lock:
+            self.in_flight[route_class] -= 1
+
+    def _overloaded(self):
+        return (pool_metrics.waiting > self.max_pool_wait_queue
+                or pool_metrics.recent_wait_ms() > self.max_pool_wait_ms)
+
+    def _reject(self, route_class, outcome, status, message, retry_after):
+        with self._lock:
+            self.outcomes[(route_class, outcome)] += 1
+        return self._error(status, message, retry_after)
+
+    @staticmethod
+    def _error(status, message, retry_after):
+        return {'error': message}, status, {'Retry-After': str(max(1, retry_after))}
+
+    def render(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += ['# HELP admission_requests_total API requests by route class and '
+                      'admission outcome.',
+                      '# TYPE admission_requests_total counter']
+            for (name, outcome), count in sorted(self.outcomes.items()):
+                labels = _labels(**{'class': name, 'outcome': outcome})
+                lines.append(f'admission_requests_total{{{labels}}} {count}')
+            lines += ['# HELP admission_in_flight Requests running, by route class.',
+                      '# TYPE admission_in_flight gauge']
+            for name in ROUTE_CLASSES:
+                lines.append(f'admission_in_flight{{{_labels(**{"class": name})}}} '
+                             f'{self.in_flight[name]}')
+        lines += ['# HELP admission_in_flight_limit In-flight cap, by route class.',
+                  '# TYPE admission_in_flight_limit gauge']
+        for name in ROUTE_CLASSES:
+            lines.append(f'admission_in_flight_limit{{{_labels(**{"class": name})}}} '
+                         f'{self.max_in_flight[name]}')
+        for name, help_text, value in (
+            ('admission_rate_limit_per_second', 'Requests per second allowed per client.',
+             self.rate),
+            ('admission_rate_limit_burst', 'Burst allowed per client.', self.burst),
+            ('admission_shed_pool_wait_queue', 'Pool wait queue length that sheds load.',
+             self.max_pool_wait_queue),
+            ('admission_shed_pool_wait_ms', 'Average pool wait (ms) that sheds load.',
+             self.max_pool_wait_ms),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge',
+                      f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+def detached_context():
+    """Copy the current context for an in-process sub-request (see routes.batch).
+
+    The copy does not hold the parent's in-flight slot, so tearing the
+    sub-request down does not release it.
+    """
+    context = contextvars.copy_context()
+    context.run(_admitted.set, None)
+    return context
+
+
+def client_key(request):
+    """Identify the client for rate limiting.
+
+    Behind ``trusted_proxy_hops`` proxies, each appends the address it got
+    the request from to X-Forwarded-For, so the client is that many
+    entries from the right. Entries further left are whatever the client
+    sent and are never trusted.
+    """
+    if get_config('is_server_running_behind_proxy', False):
+        hops = get_config('trusted_proxy_hops', 1)
+        forwarded = [address.strip()
+                     for address in request.headers.get('X-Forwarded-For', '').split(',')
+                     if address.strip()]
+        if hops >= 1 and len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.remote_addr
+
+
+def init_admission(app, request=None):
+    """Run admission control before every /api request of ``app``.
+
+    ``request`` is the framework's request proxy; it defaults to Flask's
+    and the async app passes Quart's. The controller is kept in
+    ``app.extensions['admission']``.
+    """
+    asynchronous = request is not None
+    if request is None:
+        request = flask_request
+    app.extensions['admission'] = AdmissionController(asynchronous=asynchronous)
+
+    def admit():
+        controller = app.extensions['admission']
+        if not controller.enabled or not request.path.startswith('/api/'):
+            return None
+        name = route_class(request.method, request.endpoint)
+        rejection = controller.admit(client_key(request), name)
+        if rejection is None:
+            _admitted.set((controller, name))
+        return rejection
+
+    def hold_for_stream(response):
+        admitted = _admitted.get()
+        # Streamed bodies are still being written; keep the slot until then
+        if admitted is not None and call_on_close(
+                response, lambda: admitted[0].release(admitted[1]), asynchronous):
+            _admitted.set(None)
+        return response
+
+    def release(exc=None):
+        admitted = _admitted.get()
+        if admitted is not None:
+            admitted[0].release(admitted[1])
+            _admitted.set(None)
+
+    app.before_request(request_hook(admit, asynchronous))
+    app.after_request(request_hook(hold_for_stream, asynchronous))
+    app.teardown_request(request_hook(release, asynchronous))
@@ -0,0 +1 @@
+"""Asyncio serving mode: the tasks/comments API on Quart (ASGI)."""
@@ -0,0 +1,74 @@
+"""Quart application factory for the async serving mode.
+
+Serve with an ASGI server, e.g. ``hypercorn backend.aio.app:app``.
+"""
+from quart import Quart, Response, request
+from backend.admission import init_admission
+from backend.aio.db import close_executor, run
+from backend.aio.routes.batch import batch_bp
+from backend.aio.routes.comments import comments_bp
+from backend.aio.routes.search import search_bp
+from backend.aio.routes.tasks import tasks_bp
+from backend.config import get_config
+from backend.db import get_db, pool_metrics
+from backend.json_provider import init_json
+from backend.metrics import batch_metrics, init_metrics, request_metrics
+from backend.models import Tasks
+from backend.purge import create_purger
+from backend.search import create_search
+from backend.slowlog import report as slow_query_report
+from backend.utils import init_batch_limits
+
+def create_app():
+    """Create and configure the Quart application."""
+    app = Quart(__name__)
+    init_json(app)
+    init_metrics(app, request)
+    init_admission(app, request)
+    init_batch_limits(app)
+    app.extensions['task_purger'] = create_purger()
+    app.extensions['search'] = create_search()
+    
+    app.register_blueprint(comments_bp)
+    app.register_blueprint(tasks_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(batch_bp)
+    
+    @app.before_serving
+    async def connect():
+        # Connect (and check the indexes) before taking traffic
+        await run(get_db)
+        # Resumes the purges a crash left behind
+        app.extensions['task_purger'].start()
+    
+    @app.after_serving
+    async def disconnect():
+        close_executor()
+    
+    @app.route('/health')
+    async def health():
+        return {'status': 'ok'}, 200
+    
+    @app.route('/health/cache')
+    async def cache_health():
+        return {'tasks': Tasks.cache_stats()}, 200
+    
+    @app.route('/health/db')
+    async def db_health():
+        return {'pool': pool_metrics.stats()}, 200
+    
+    if get_config('mongodb.slow_queries.endpoint', False):
+        @app.route('/debug/slow-queries')
+        async def slow_queries():
+            limit = request.args.get('limit', 20, type=int)
+            return {'queries': await run(slow_query_report, get_db(), limit)}, 200
+    
+    @app.route('/metrics')
+    async def metrics():
+        return Response(request_metrics.render() + batch_metrics.render()
+                        + app.extensions['admission'].render(),
+                        mimetype='text/plain; version=0.0.4')
+    
+    return app
+
+app = create_app()
@@ -0,0 +1,62 @@
+"""Run the blocking pymongo models from the event loop.
+
+Motor 2.x (the last release that supports pymongo 3.12) wraps pymongo in a
+thread pool and does not run on current Pythons, so this does the same
+directly: calls are handed to an executor sized to the connection pool, so
+the loop never blocks and at most one thread waits per pooled connection.
+"""
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from backend.config import get_config
+
+
+_executor = None
+_pid = None
+
+
+def get_executor():
+    """Get this process's database executor, creating it on first use."""
+    global _executor, _pid
+    if _executor is None or _pid != os.getpid():
+        _executor = ThreadPoolExecutor(
+            max_workers=get_config('mongodb.pool.max_size', 50),
+            thread_name_prefix='mongo'
+        )
+        _pid = os.getpid()
+    return _executor
+
+
+async def run(func, *args, **kwargs):
+    """Await ``func(*args, **kwargs)`` run on the database executor.
+
+    The call runs in a copy of the caller's context, so per-request state
+    such as the metrics timer follows it onto the executor thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(), context.run, partial(func, *args, **kwargs)
+    )
+
+
+async def iter_batches(docs, batch_size):
+    """Yield lists of at most ``batch_size`` documents from a pymongo cursor."""
+    docs = iter(docs)
+    while True:
+        batch = await run(lambda: list(islice(docs, batch_size)))
+        if not batch:
+            return
+        yield batch
+
+
+def close_executor():
+    """Shut the executor down, waiting for running calls."""
+    global _executor, _pid
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+        _pid = None
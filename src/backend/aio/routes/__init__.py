@@ -0,0 +1 @@
+"""Async routes package."""
\ No newline at end of file
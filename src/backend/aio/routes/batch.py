@@ -0,0 +1,82 @@
+"""Batch endpoint on Quart, mirroring backend.routes.batch."""
+import asyncio
+import logging
+from quart import Blueprint, current_app, request
+from werkzeug.exceptions import HTTPException
+from backend.admission import client_key, detached_context
+from backend.routes.batch import admit, parse_sub_request, plan, sub_result
+from backend.utils import batch_error, batch_response, error_response, validate_batch
+
+
+logger = logging.getLogger(__name__)
+
+batch_bp = Blueprint('batch', __name__, url_prefix='/api')
+
+
+async def dispatch(app, sub_request, client):
+    """Admit and run one sub-request (see backend.routes.batch.dispatch)."""
+    controller = app.extensions['admission']
+    name, error = admit(controller, client, sub_request)
+    if error:
+        return error
+    try:
+        return await run_view(app, sub_request)
+    finally:
+        if name is not None:
+            controller.release(name)
+
+
+async def run_view(app, sub_request):
+    """Run one sub-request through its view; return its batch result."""
+    index = sub_request['index']
+    options = {'method': sub_request['method']}
+    if sub_request['body'] is not None:
+        options['json'] = sub_request['body']
+    try:
+        async with app.test_request_context(sub_request['path'], **options):
+            view = app.ensure_async(app.view_functions[sub_request['endpoint']])
+            response = await app.make_response(await view(**sub_request['view_args']))
+            if response.is_json:
+                body = await response.get_json()
+            else:
+                body = await response.get_data(as_text=True) or None
+    except HTTPException as e:
+        return batch_error(index, e.description or e.name, e.code)
+    except Exception:
+        logger.exception("Batched %s %s failed", sub_request['method'], sub_request['path'])
+        return batch_error(index, "Internal server error", 500)
+    return sub_result(index, response.status_code, body)
+
+
+async def run_batch(app, items, client):
+    """Validate and run the sub-requests of ``client``; return the per-item results."""
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        sub_request, error = parse_sub_request(index, item, app.url_map)
+        if error:
+            results[index] = error
+        else:
+            valid.append(sub_request)
+    
+    for step in plan(valid):
+        outcomes = await asyncio.gather(*(
+            asyncio.create_task(dispatch(app, sub, client), context=detached_context())
+            for sub in step
+        ))
+        for sub_request, outcome in zip(step, outcomes):
+            results[sub_request['index']] = outcome
+    return results
+
+
+@batch_bp.route('/batch', methods=['POST'])
+async def run_requests():
+    """Run several API calls from a ``requests`` list of ``{method, path, body}``."""
+    items, error = validate_batch(await request.get_json(silent=True), 'requests',
+                                  current_app.config['MAX_BATCH_REQUESTS'])
+    if error:
+        return error_response(error, 400)
+    
+    return batch_response(
+        await run_batch(current_app._get_current_object(), items, client_key(request))
+    )
@@ -0,0 +1,77 @@
+"""Comment CRUD endpoints on Quart, mirroring backend.routes.comments."""
+from quart import Blueprint, current_app, request
+from backend.aio.db import run
+from backend.aio.utils import event_stream_response
+from backend.events import AsyncSubscriber, async_event_stream
+from backend.models import Tasks
+from backend.routes.comments import (
+    handle_create_comment, handle_create_comments_batch, handle_list_comments,
+    handle_update_comment, handle_delete_comment, handle_update_comments_batch,
+    handle_delete_comments_batch, subscribe_comments
+)
+from backend.utils import oid, error_response
+
+
+comments_bp = Blueprint('comments', __name__, url_prefix='/api')
+
+
+@comments_bp.route('/tasks/<task_id>/comments', methods=['POST'])
+async def create_comment(task_id):
+    """Create a comment for a task."""
+    return await run(handle_create_comment, current_app, task_id, await request.get_json())
+
+
+@comments_bp.route('/tasks/<task_id>/comments:batch', methods=['POST'])
+async def create_comments_batch(task_id):
+    """Create many comments on a task at once from a ``comments`` list."""
+    return await run(handle_create_comments_batch, current_app, task_id,
+                     await request.get_json(silent=True))
+
+
+@comments_bp.route('/tasks/<task_id>/comments', methods=['GET'])
+async def list_comments(task_id):
+    """List comments for a task with pagination."""
+    return await run(handle_list_comments, current_app, request, task_id)
+
+
+@comments_bp.route('/tasks/<task_id>/comments/stream', methods=['GET'])
+async def stream_comments(task_id):
+    """Push created/updated/deleted comment events of a task (Server-Sent Events)."""
+    task_oid = oid(task_id)
+    if not task_oid:
+        return error_response("Invalid task ID", 400)
+    
+    if not await run(Tasks.find_by_id, task_oid):
+        return error_response("Task not found", 404)
+    
+    # The subscriber needs the running loop, so it is created here
+    subscriber = AsyncSubscriber(task_oid)
+    replayed = await run(subscribe_comments, request, subscriber)
+    return event_stream_response(async_event_stream(subscriber, replayed))
+
+
+@comments_bp.route('/comments/<comment_id>', methods=['PATCH'])
+async def update_comment(comment_id):
+    """Update a comment."""
+    return await run(handle_update_comment, current_app, comment_id,
+                     await request.get_json())
+
+
+@comments_bp.route('/comments/<comment_id>', methods=['DELETE'])
+async def delete_comment(comment_id):
+    """Delete a comment."""
+    return await run(handle_delete_comment, comment_id)
+
+
+@comments_bp.route('/comments:batch', methods=['PATCH'])
+async def update_comments_batch():
+    """Update many comments at once from a ``comments`` list of objects with ``_id``."""
+    return await run(handle_update_comments_batch, current_app,
+                     await request.get_json(silent=True))
+
+
+@comments_bp.route('/comments:batch', methods=['DELETE'])
+async def delete_comments_batch():
+    """Delete many comments at once from an ``ids`` list."""
+    return await run(handle_delete_comments_batch, current_app,
+                     await request.get_json(silent=True))
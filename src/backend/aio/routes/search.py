@@ -0,0 +1,13 @@
+"""Full-text search endpoint on Quart, mirroring backend.routes.search."""
+from quart import Blueprint, current_app, request
+from backend.aio.db import run
+from backend.routes.search import handle_search
+
+
+search_bp = Blueprint('search', __name__, url_prefix='/api')
+
+
+@search_bp.route('/search', methods=['GET'])
+async def search():
+    """Search tasks and comments, most relevant first."""
+    return await run(handle_search, current_app, request)
@@ -0,0 +1,71 @@
+"""Task CRUD endpoints on Quart, mirroring backend.routes.tasks."""
+from quart import Blueprint, current_app, request
+from backend.aio.db import run
+from backend.aio.utils import stream_json_array, stream_ndjson
+from backend.routes.tasks import (
+    handle_create_task, handle_create_tasks_batch, handle_update_tasks_batch,
+    handle_delete_tasks_batch, handle_list_tasks, handle_get_task_stats,
+    handle_get_task, handle_update_task, handle_delete_task
+)
+
+
+tasks_bp = Blueprint('tasks', __name__, url_prefix='/api')
+
+
+@tasks_bp.route('/tasks', methods=['POST'])
+async def create_task():
+    """Create a new task."""
+    return await run(handle_create_task, current_app, await request.get_json())
+
+
+@tasks_bp.route('/tasks:batch', methods=['POST'])
+async def create_tasks_batch():
+    """Create many tasks at once from a ``tasks`` list."""
+    return await run(handle_create_tasks_batch, current_app,
+                     await request.get_json(silent=True))
+
+
+@tasks_bp.route('/tasks:batch', methods=['PATCH'])
+async def update_tasks_batch():
+    """Update many tasks at once from a ``tasks`` list of objects with ``_id``."""
+    return await run(handle_update_tasks_batch, current_app,
+                     await request.get_json(silent=True))
+
+
+@tasks_bp.route('/tasks:batch', methods=['DELETE'])
+async def delete_tasks_batch():
+    """Delete many tasks (and their comments) from an ``ids`` list."""
+    # Scheduling may start a Temporal workflow, so it stays off the loop too
+    return await run(handle_delete_tasks_batch, current_app,
+                     await request.get_json(silent=True))
+
+
+@tasks_bp.route('/tasks', methods=['GET'])
+async def list_tasks():
+    """List tasks, newest first (see backend.routes.tasks.list_tasks)."""
+    return await run(handle_list_tasks, current_app, request,
+                     stream_json_array=stream_json_array, stream_ndjson=stream_ndjson)
+
+
+@tasks_bp.route('/tasks/stats', methods=['GET'])
+async def get_task_stats():
+    """Dashboard statistics (see backend.routes.tasks.get_task_stats)."""
+    return await run(handle_get_task_stats, current_app, request)
+
+
+@tasks_bp.route('/tasks/<task_id>', methods=['GET'])
+async def get_task(task_id):
+    """Get a specific task."""
+    return await run(handle_get_task, current_app, request, task_id)
+
+
+@tasks_bp.route('/tasks/<task_id>', methods=['PATCH'])
+async def update_task(task_id):
+    """Update a task."""
+    return await run(handle_update_task, current_app, task_id, await request.get_json())
+
+
+@tasks_bp.route('/tasks/<task_id>', methods=['DELETE'])
+async def delete_task(task_id):
+    """Delete a task and its comments."""
+    return await run(handle_delete_task, current_app, task_id)
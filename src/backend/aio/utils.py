@@ -0,0 +1,33 @@
+"""Response helpers for the async serving mode (see backend.utils)."""
+from quart import Response
+from backend.aio.db import iter_batches
+from backend.json_provider import dumps
+from backend.utils import STREAM_BATCH_SIZE
+
+
+async def stream_json_array(docs, serialize, batch_size=STREAM_BATCH_SIZE):
+    """Yield a JSON array of serialized documents from a pymongo cursor."""
+    yield '['
+    separator = ''
+    async for batch in iter_batches(docs, batch_size):
+        # Drop the brackets of the encoded batch to splice it into the array
+        yield separator + dumps(serialize(batch))[1:-1]
+        separator = ','
+    yield ']'
+
+
+async def stream_ndjson(docs, serialize, batch_size=STREAM_BATCH_SIZE):
+    """Yield newline-delimited JSON for documents from a pymongo cursor."""
+    async for batch in iter_batches(docs, batch_size):
+        yield ''.join(dumps(doc) + '\n' for doc in serialize(batch))
+
+
+def event_stream_response(messages):
+    """Wrap an async iterable of Server-Sent Events messages in a response."""
+    response = Response(messages, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Streams are open-ended; Quart would otherwise cut them off
+    response.timeout = None
+    return response
+
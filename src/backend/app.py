@@ -1,31 +1,84 @@
 """Flask application factory."""
 import os
-from flask import Flask
+from flask import Flask, Response, request
 from flask_cors import CORS
+from backend.admission import init_admission
+from backend.commands import register_commands
+from backend.config import get_config
+from backend.db import get_db, pool_metrics
+from backend.json_provider import init_json
+from backend.metrics import batch_metrics, init_metrics, request_metrics
+from backend.models import Tasks
+from backend.purge import create_purger
+from backend.search import create_search
+from backend.slowlog import report as slow_query_report
+from backend.utils import init_batch_limits
+from backend.routes.batch import batch_bp
 from backend.routes.comments import comments_bp
+from backend.routes.search import search_bp
 from backend.routes.tasks import tasks_bp
 
 def create_app():
     """Create and configure Flask application."""
     app = Flask(__name__)
+    init_json(app)
+    init_metrics(app)
+    init_admission(app)
+    init_batch_limits(app)
+    # Runs the comment purge for deleted tasks off the request path
+    app.extensions['task_purger'] = create_purger()
+    # Text indexes or an in-process index, per the search config
+    app.extensions['search'] = create_search()
+    
+    @app.before_request
+    def start_purger():
+        # Once per worker process; resumes the purges a crash left behind
+        app.extensions['task_purger'].start()
     
     # CORS configuration for React dev server
     CORS(app, resources={
         r"/api/*": {
             "origins": ["http://localhost:5173", "http://127.0.0.1:5173"],  # Vite default port
             "methods": ["GET", "POST", "PATCH", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type"]
+            "allow_headers": ["Content-Type", "If-None-Match"],
+            # Conditional GETs and delta sync read these from the frontend
+            "expose_headers": ["ETag", "X-Sync-Token"]
         }
     })
     
-    # Register blueprints with prefixes
-    app.register_blueprint(comments_bp, url_prefix='/api/comments')
-    app.register_blueprint(tasks_bp, url_prefix='/api/tasks')
+    # Register blueprints (each blueprint carries its own /api prefix)
+    app.register_blueprint(comments_bp)
+    app.register_blueprint(tasks_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(batch_bp)
+    
+    register_commands(app)
     
     @app.route('/health')
     def health():
         return {'status': 'ok'}, 200
     
+    @app.route('/health/cache')
+    def cache_health():
+        return {'tasks': Tasks.cache_stats()}, 200
+    
+    @app.route('/health/db')
+    def db_health():
+        return {'pool': pool_metrics.stats()}, 200
+    
+    # Query shapes and callers are internals; only development exposes them
+    if get_config('mongodb.slow_queries.endpoint', False):
+        @app.route('/debug/slow-queries')
+        def slow_queries():
+            limit = request.args.get('limit', 20, type=int)
+            return {'queries': slow_query_report(get_db(), limit)}, 200
+    
+    @app.route('/metrics')
+    def metrics():
+        return Response(request_metrics.render() + batch_metrics.render()
+                        + app.extensions['admission'].render(),
+                        mimetype='text/plain; version=0.0.4')
+    
     return app
 
 # For flask run command
@@ -0,0 +1,98 @@
+"""Flask CLI maintenance commands."""
+import asyncio
+import json
+import click
+from backend import purge
+from backend.config import get_config
+from backend.db import get_db
+from backend.events import COLLECTION as EVENT_LOG, ensure_event_log
+from backend.indexes import sync_indexes
+from backend.slowlog import report
+from backend.models import Stats, Tasks
+
+
+@click.command('recount-comments')
+def recount_comments_command():
+    """Repair comment_count/last_comment_at drift on tasks."""
+    fixed = Tasks.recount_comments()
+    click.echo(f"Fixed comment counters on {fixed} task(s)")
+
+
+@click.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the dashboard statistics served by /api/tasks/stats."""
+    totals = Stats.rebuild()
+    click.echo(f"Rebuilt stats: {sum(totals['tasks'].values())} task(s), "
+               f"{totals['comments']} comment(s)")
+
+
+@click.command('purge-tasks')
+def purge_tasks_command():
+    """Finish purging deleted tasks, e.g. after a crashed worker."""
+    task_ids = Tasks.find_tombstoned()
+    for task_id in task_ids:
+        total = purge.purge_task(
+            task_id,
+            progress=lambda n, task_id=task_id: click.echo(
+                f"Task {task_id}: {n} comment(s) purged"
+            )
+        )
+        click.echo(f"Purged task {task_id} ({total} comment(s))")
+    click.echo(f"Purged {len(task_ids)} task(s)")
+
+
+@click.command('purge-worker')
+def purge_worker_command():
+    """Run the Temporal worker that purges deleted tasks."""
+    if purge.workflow is None:
+        raise click.ClickException("temporalio is not installed")
+    if not get_config('temporal.server_address'):
+        raise click.ClickException("temporal.server_address is not configured")
+    asyncio.run(purge.run_worker())
+
+
+@click.command('sync-indexes')
+@click.option('--dry-run', is_flag=True, help="Only report the differences.")
+@click.option('--no-drop', is_flag=True, help="Keep indexes missing from the manifest.")
+def sync_indexes_command(dry_run, no_drop):
+    """Build missing indexes and drop obsolete ones (see backend.indexes)."""
+    missing, changed, obsolete = sync_indexes(
+        get_db(), drop=not no_drop, dry_run=dry_run, echo=click.echo
+    )
+    for label, names in (('missing', missing), ('changed', changed), ('obsolete', obsolete)):
+        for collection, name in names:
+            click.echo(f"{label}: {collection}.{name}")
+    if not missing + changed + obsolete:
+        click.echo("Indexes match the manifest")
+    if not dry_run and not ensure_event_log(get_db()):
+        click.echo(f"warning: {EVENT_LOG} exists but is not capped; drop it and rerun")
+
+
+@click.command('slow-queries')
+@click.option('--limit', default=20, show_default=True, help="Number of query shapes.")
+def slow_queries_command(limit):
+    """Report the slowest logged query shapes with their explain summaries."""
+    rows = report(get_db(), limit)
+    if not rows:
+        click.echo("No slow queries logged")
+    for row in rows:
+        explain = row['explain'] or {}
+        click.echo(f"{row['count']:>6}x  avg {row['avg_ms']:.1f} ms  max {row['max_ms']:.1f} ms  "
+                   f"{', '.join(row['callers']) or '?'}")
+        click.echo(f"        {json.dumps(row['shape'], default=str)}")
+        if explain:
+            flags = [flag for flag in ('collscan', 'in_memory_sort') if explain.get(flag)]
+            click.echo(f"        {' > '.join(filter(None, explain['stages']))}  "
+                       f"examined {explain['docs_examined']} docs / "
+                       f"{explain['keys_examined']} keys for {explain['returned']}"
+                       f"{'  [' + ', '.join(flags) + ']' if flags else ''}")
+
+
+def register_commands(app):
+    """Register maintenance commands on the Flask CLI."""
+    app.cli.add_command(recount_comments_command)
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(purge_tasks_command)
+    app.cli.add_command(purge_worker_command)
+    app.cli.add_command(sync_indexes_command)
+    app.cli.add_command(slow_queries_command)
@@ -0,0 +1,75 @@
+"""Configuration loaded from the YAML files in config/ (see docs/configuration.md)."""
+import os
+import yaml
+
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'config')
+
+_config = None
+
+
+def _merge(base, override):
+    """Recursively merge ``override`` into ``base``."""
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def _read(name):
+    path = os.path.join(CONFIG_DIR, f'{name}.yml')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+
+def _format(value, fmt):
+    if fmt == 'number':
+        return float(value) if '.' in value else int(value)
+    if fmt == 'boolean':
+        return value.lower() in ('1', 'true', 'yes')
+    return value
+
+
+def _from_env(mapping):
+    """Resolve custom-environment-variables.yml against the environment."""
+    resolved = {}
+    for key, spec in mapping.items():
+        if isinstance(spec, dict) and '__name' not in spec:
+            nested = _from_env(spec)
+            if nested:
+                resolved[key] = nested
+            continue
+        if isinstance(spec, dict):
+            name, fmt = spec['__name'], spec.get('__format')
+        else:
+            name, fmt = spec, None
+        value = os.getenv(name)
+        # Empty variables are ignored
+        if value:
+            resolved[key] = _format(value, fmt)
+    return resolved
+
+
+def load_config():
+    """Load default.yml, then the APP_ENV file, then environment overrides."""
+    config = _read('default')
+    _merge(config, _read(os.getenv('APP_ENV', 'development')))
+    _merge(config, _from_env(_read('custom-environment-variables')))
+    return config
+
+
+def get_config(path, default=None):
+    """Look up a dotted key such as ``'mongodb.pool.max_size'``."""
+    global _config
+    if _config is None:
+        _config = load_config()
+    value = _config
+    for key in path.split('.'):
+        if not isinstance(value, dict) or value.get(key) is None:
+            return default
+        value = value[key]
+    return value
@@ -1,49 +1,201 @@
 """MongoDB database connection and helpers."""
 import os
-from pymongo import MongoClient, DESCENDING
+import threading
+import time
+from collections import deque
+from pymongo import MongoClient, monitoring
 from pymongo.errors import ConnectionFailure
+from backend.config import get_config
+from backend.indexes import verify_indexes
+from backend.metrics import command_metrics
+from backend.slowlog import slow_query_listener
 
 
 _client = None
 _db = None
+# pid that created _client; a forked child must not reuse its parent's pool
+_pid = None
+_lock = threading.RLock()
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Track connection pool usage from pymongo's pool events.
+
+    Checkouts happen on the requesting thread, so the wait for a connection
+    is timed with a thread-local start time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # (monotonic time, wait) of recent checkouts, for load shedding
+            self.recent = deque(maxlen=1000)
+            self.in_use = 0
+            self.waiting = 0
+            self.max_waiting = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.checkout_time_total = 0.0
+            self.checkout_time_max = 0.0
+            self.connections_created = 0
+            self.connections_closed = 0
+
+    def stats(self):
+        """Return a snapshot of the pool counters (times in milliseconds)."""
+        with self._lock:
+            avg = self.checkout_time_total / self.checkouts if self.checkouts else 0.0
+            return {
+                'in_use': self.in_use,
+                'wait_queue': self.waiting,
+                'max_wait_queue': self.max_waiting,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'checkout_ms_avg': round(avg * 1000, 3),
+                'checkout_ms_max': round(self.checkout_time_max * 1000, 3),
+                'connections_created': self.connections_created,
+                'connections_closed': self.connections_closed
+            }
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, 'started', None)
+        elapsed = time.perf_counter() - started if started is not None else 0.0
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+            self.checkouts += 1
+            self.checkout_time_total += elapsed
+            self.checkout_time_max = max(self.checkout_time_max, elapsed)
+            self.recent.append((time.monotonic(), elapsed))
+
+    def recent_wait_ms(self, window=1.0):
+        """Average checkout wait over the last ``window`` seconds (0 if idle)."""
+        since = time.monotonic() - window
+        with self._lock:
+            waits = [elapsed for at, elapsed in self.recent if at >= since]
+        return sum(waits) / len(waits) * 1000 if waits else 0.0
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+pool_metrics = PoolMetrics()
+
+
+def _client_options():
+    """Pool and timeout settings from config/*.yml (mongodb.pool)."""
+    pool = get_config('mongodb.pool', {})
+    options = {
+        'maxPoolSize': pool.get('max_size', 50),
+        'minPoolSize': pool.get('min_size', 0),
+        'waitQueueTimeoutMS': pool.get('wait_queue_timeout_ms'),
+        'serverSelectionTimeoutMS': pool.get('server_selection_timeout_ms', 5000),
+        'connectTimeoutMS': pool.get('connect_timeout_ms'),
+        'socketTimeoutMS': pool.get('socket_timeout_ms')
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def _reset_after_fork():
+    """Forget the parent's client in a forked child.
+
+    The inherited client is dropped rather than closed; its sockets belong
+    to the parent. The lock is replaced in case the fork happened while
+    another thread held it.
+    """
+    global _client, _db, _pid, _lock
+    _client = None
+    _db = None
+    _pid = None
+    _lock = threading.RLock()
+    pool_metrics.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
 
 def get_client():
-    """Get MongoDB client singleton."""
-    global _client
-    if _client is None:
-        mongo_uri = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
-        _client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
-        try:
-            # Verify connection
-            _client.admin.command('ping')
-        except ConnectionFailure as e:
-            raise ConnectionFailure(f"Cannot connect to MongoDB: {e}")
+    """Get this process's MongoDB client, creating it on first use."""
+    global _client, _pid
+    if _client is not None and _pid == os.getpid():
+        return _client
+    with _lock:
+        if _client is None or _pid != os.getpid():
+            mongo_uri = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
+            client = MongoClient(
+                mongo_uri,
+                event_listeners=[pool_metrics, command_metrics, slow_query_listener],
+                **_client_options()
+            )
+            try:
+                # Verify connection
+                client.admin.command('ping')
+            except ConnectionFailure as e:
+                client.close()
+                raise ConnectionFailure(f"Cannot connect to MongoDB: {e}")
+            _client = client
+            _pid = os.getpid()
     return _client
 
 
 def get_db():
     """Get database instance."""
     global _db
-    if _db is None:
-        client = get_client()
-        db_name = os.getenv('DB_NAME', 'better_software_dev')
-        _db = client[db_name]
-        _ensure_indexes()
+    client = get_client()
+    if _db is not None:
+        return _db
+    with _lock:
+        if _db is None:
+            db_name = os.getenv('DB_NAME', 'better_software_dev')
+            db = client[db_name]
+            # Only checks the manifest; `flask sync-indexes` builds indexes
+            verify_indexes(db)
+            _db = db
     return _db
 
 
-def _ensure_indexes():
-    """Create necessary indexes."""
-    db = _db
-    # Index on (task_id, -created_at) for efficient comment queries
-    db.comments.create_index([('task_id', 1), ('created_at', DESCENDING)])
-
-
 def close_db():
     """Close database connection."""
-    global _client, _db
-    if _client is not None:
-        _client.close()
-        _client = None
-        _db = None
\ No newline at end of file
+    global _client, _db, _pid
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+            _db = None
+            _pid = None
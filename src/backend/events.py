@@ -0,0 +1,315 @@
+"""Comment events for GET /api/tasks/<task_id>/comments/stream (Server-Sent Events).
+
+Comment writes queue their events for a publisher thread, which appends
+them to ``comment_events``, a capped collection created by ``flask
+sync-indexes``, off the request path; events queued while an append is
+in flight go in the next one. Each worker tails the log with one thread
+and fans the events out to its subscribers, so all workers see every
+write. The ObjectId of an event is its SSE id; a reconnecting
+client's Last-Event-ID replays what it missed from the log.
+
+A change stream on ``comments`` would not do: delete events carry only
+the comment id on MongoDB 5.0 (no pre-images), so they could not be
+routed to the task's subscribers, and standalone servers have none.
+Without the capped log, events are delivered within the worker only.
+
+Deployment: a stream served by the Flask app pins a sync or gthread
+gunicorn worker thread until the tab closes, so admission control caps
+them at a few per worker (``admission.max_in_flight.sync_stream``). To
+keep a stream open in every browser tab, route
+/api/tasks/*/comments/stream to the async app (``make api-async``),
+where an open stream is just a coroutine waiting on a queue.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import PyMongoError
+from backend.db import get_db
+from backend.json_provider import dumps
+from backend.utils import jsonify_comment, oid
+
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = 'comment_events'
+LOG_SIZE = 16 * 1024 * 1024
+HEARTBEAT_SECONDS = 15
+# Writers in other processes can insert events whose ObjectIds sort
+# slightly before ones already seen; tail and replay reach back this far
+# and drop the duplicates
+CLOCK_SKEW = timedelta(seconds=5)
+
+
+def ensure_event_log(db):
+    """Create the capped event log if missing; return False if it is not capped."""
+    if COLLECTION not in db.list_collection_names():
+        db.create_collection(COLLECTION, capped=True, size=LOG_SIZE)
+    return bool(db[COLLECTION].options().get('capped'))
+
+
+def format_event(event):
+    """Encode a stored event as an SSE message."""
+    if event['type'] == 'deleted':
+        data = {'_id': str(event['comment']['_id']), 'task_id': str(event['task_id'])}
+    else:
+        data = jsonify_comment(event['comment'])
+    return f"id: {event['_id']}\nevent: {event['type']}\ndata: {dumps(data)}\n\n"
+
+
+class Subscriber:
+    """Events for one client stream, handed over through a bounded queue."""
+
+    def __init__(self, task_id, maxsize=1000):
+        self.task_id = task_id
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        # Called from the tail thread; a stuck client must not block it
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Next event, or None after ``timeout`` seconds without one."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscriber(Subscriber):
+    """Subscriber whose events are awaited on an event loop."""
+
+    def __init__(self, task_id, maxsize=1000):
+        super().__init__(task_id, maxsize)
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop has shut down; the stream is gone with it
+            pass
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class CommentEventHub:
+    """Publish comment events and fan them out to this worker's subscribers."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._logged = False
+        # Events waiting for the publisher thread, and whether it is appending
+        self._pending = []
+        self._appending = False
+        self._published = threading.Condition()
+
+    def _start(self):
+        """Check the event log and start the tail and publisher threads, once per process."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._subscribers = defaultdict(set)
+            self._pending = []
+            self._appending = False
+            self._published = threading.Condition()
+            try:
+                db = get_db()
+                self._logged = (COLLECTION in db.list_collection_names()
+                                and bool(db[COLLECTION].options().get('capped')))
+            except PyMongoError as e:
+                logger.warning("Cannot check the comment event log: %s", e)
+                self._logged = False
+            if self._logged:
+                threading.Thread(target=self._tail, name='comment-events', daemon=True).start()
+                threading.Thread(target=self._append, name='comment-events-publish',
+                                 daemon=True).start()
+            else:
+                logger.warning("No capped %s collection (run `flask sync-indexes`); "
+                               "comment events only reach this worker", COLLECTION)
+            self._pid = os.getpid()
+
+    def publish(self, event_type, comments):
+        """Record ``created``/``updated``/``deleted`` events for comment documents."""
+        if not comments:
+            return
+        self._start()
+        events = [
+            {'_id': ObjectId(), 'task_id': comment['task_id'], 'type': event_type,
+             'comment': comment if event_type != 'deleted' else {'_id': comment['_id']}}
+            for comment in comments
+        ]
+        if not self._logged:
+            self._dispatch(events)
+            return
+        with self._published:
+            self._pending.extend(events)
+            self._published.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until the events published so far are appended; False on timeout."""
+        with self._published:
+            return self._published.wait_for(
+                lambda: not self._pending and not self._appending, timeout
+            )
+
+    def subscribe(self, subscriber):
+        self._start()
+        with self._lock:
+            self._subscribers[subscriber.task_id].add(subscriber)
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.task_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.task_id]
+
+    def replay(self, task_id, last_event_id):
+        """Events of a task after ``last_event_id``, or None if they cannot be replayed."""
+        last = oid(last_event_id)
+        if last is None or not self._logged:
+            return None
+        db = get_db()
+        since = ObjectId.from_datetime(last.generation_time - CLOCK_SKEW)
+        events = list(db[COLLECTION].find({'_id': {'$gte': since}, 'task_id': task_id}))
+        oldest = db[COLLECTION].find_one(sort=[('$natural', 1)], projection={'_id': 1})
+        if oldest is None or oldest['_id'].generation_time > last.generation_time:
+            # The log has wrapped past the client's position
+            return None
+        ids = [event['_id'] for event in events]
+        if last in ids:
+            return events[ids.index(last) + 1:]
+        return [event for event in events if event['_id'] > last]
+
+    def _dispatch(self, events):
+        with self._lock:
+            targets = [(event, list(self._subscribers.get(event['task_id'], ())))
+                       for event in events]
+        for event, subscribers in targets:
+            for subscriber in subscribers:
+                subscriber.put(event)
+
+    def _append(self):
+        """Append queued events to the log, all that queued up in one insert."""
+        while True:
+            with self._published:
+                self._published.wait_for(lambda: self._pending)
+                events, self._pending = self._pending, []
+                self._appending = True
+            try:
+                get_db()[COLLECTION].insert_many(events)
+            except PyMongoError as e:
+                logger.warning("Cannot log comment events, delivering locally: %s", e)
+                self._dispatch(events)
+            finally:
+                with self._published:
+                    self._appending = False
+                    self._published.notify_all()
+
+    def _tail(self):
+        """Follow the capped log forever, restarting dead cursors."""
+        collection = get_db()[COLLECTION]
+        seen = deque(maxlen=10000)
+        seen_set = set()
+        since = ObjectId.from_datetime(ObjectId().generation_time - CLOCK_SKEW)
+        while True:
+            try:
+                cursor = collection.find({'_id': {'$gte': since}},
+                                         cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    for event in cursor:
+                        if event['_id'] in seen_set:
+                            continue
+                        if len(seen) == seen.maxlen:
+                            seen_set.discard(seen[0])
+                        seen.append(event['_id'])
+                        seen_set.add(event['_id'])
+                        since = max(since, ObjectId.from_datetime(
+                            event['_id'].generation_time - CLOCK_SKEW))
+                        self._dispatch([event])
+            except PyMongoError as e:
+                logger.warning("Comment event tail failed, retrying: %s", e)
+            # Tailable cursors on an empty log die at once
+            time.sleep(1)
+
+
+comment_events = CommentEventHub()
+
+
+def _replay(replayed, seen):
+    """SSE messages for replayed events, remembering their ids in ``seen``."""
+    if replayed is None:
+        return ['event: reset\ndata: {}\n\n']
+    seen.update(event['_id'] for event in replayed)
+    return [format_event(event) for event in replayed]
+
+
+def event_stream(subscriber, replayed):
+    """Yield the SSE messages of a subscription until the client disconnects.
+
+    ``replayed`` are the events to send first (see CommentEventHub.replay);
+    None sends a ``reset`` event instead.
+    """
+    try:
+        yield 'retry: 3000\n\n'
+        seen = set()
+        yield from _replay(replayed, seen)
+        while True:
+            event = subscriber.get(timeout=HEARTBEAT_SECONDS)
+            if subscriber.overflowed:
+                # Events were dropped; the client must refetch and resubscribe
+                yield 'event: reset\ndata: {}\n\n'
+                return
+            if event is None:
+                yield ': heartbeat\n\n'
+            elif event['_id'] not in seen:
+                yield format_event(event)
+    finally:
+        comment_events.unsubscribe(subscriber)
+
+
+async def async_event_stream(subscriber, replayed):
+    """event_stream for an AsyncSubscriber."""
+    try:
+        yield 'retry: 3000\n\n'
+        seen = set()
+        for message in _replay(replayed, seen):
+            yield message
+        while True:
+            event = await subscriber.get(timeout=HEARTBEAT_SECONDS)
+            if subscriber.overflowed:
+                yield 'event: reset\ndata: {}\n\n'
+                return
+            if event is None:
+                yield ': heartbeat\n\n'
+            elif event['_id'] not in seen:
+                yield format_event(event)
+    finally:
+        comment_events.unsubscribe(subscriber)
@@ -0,0 +1,97 @@
+"""Group commit: merge concurrent writes into one round trip.
+
+A caller of GroupCommitter.submit blocks while its item waits in a queue.
+The first caller to find no batch being gathered leads the next one: it
+waits up to ``window`` seconds (or until ``max_batch`` items are queued),
+takes the batch and writes it with ``flush`` outside the lock, so the next
+batch gathers while this one is written. Every caller gets its own result
+or exception back.
+"""
+import threading
+import time
+
+
+class _Pending:
+    """One submitted item and, once flushed, its outcome."""
+
+    __slots__ = ('item', 'result', 'error', 'done')
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = False
+
+
+class GroupCommitter:
+    """Coalesce concurrent submissions into batches for ``flush``.
+
+    ``flush`` takes a list of items and returns one outcome per item, in
+    order: a result, or an exception instance to raise in that caller. If
+    ``flush`` itself raises, every caller in the batch gets the exception.
+    ``on_flush`` is called with the size of each batch.
+    """
+
+    def __init__(self, flush, window=0.002, max_batch=200, on_flush=None):
+        self.flush = flush
+        self.window = window
+        self.max_batch = max_batch
+        self.on_flush = on_flush
+        self._queue = []
+        self._gathering = False
+        self._cond = threading.Condition()
+
+    def submit(self, item):
+        """Write ``item`` with whatever else arrives in the window; return its result."""
+        pending = _Pending(item)
+        with self._cond:
+            self._queue.append(pending)
+            # Wakes a leader waiting for the batch to fill up
+            self._cond.notify_all()
+            while not pending.done:
+                if self._gathering or pending not in self._queue:
+                    self._cond.wait()
+                    continue
+                batch = self._gather()
+                self._cond.release()
+                try:
+                    self._flush(batch)
+                finally:
+                    self._cond.acquire()
+                    for done in batch:
+                        done.done = True
+                    self._cond.notify_all()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _gather(self):
+        """Lead a batch: wait out the window, then take up to max_batch items."""
+        self._gathering = True
+        deadline = time.monotonic() + self.window
+        while len(self._queue) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+        batch = self._queue[:self.max_batch]
+        del self._queue[:self.max_batch]
+        # The next batch may gather while this one is written
+        self._gathering = False
+        self._cond.notify_all()
+        return batch
+
+    def _flush(self, batch):
+        if self.on_flush:
+            self.on_flush(len(batch))
+        try:
+            outcomes = self.flush([pending.item for pending in batch])
+        except Exception as e:
+            for pending in batch:
+                pending.error = e
+            return
+        for pending, outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception):
+                pending.error = outcome
+            else:
+                pending.result = outcome
@@ -0,0 +1,182 @@
+"""Declarative index manifest for the tasks API.
+
+INDEXES is the single source of truth for the indexes the queries in
+backend.models rely on. ``flask sync-indexes`` builds what is missing and
+drops what is no longer listed; the app itself only verifies the manifest
+on startup and never builds indexes on the request path.
+"""
+import logging
+from datetime import timedelta
+from pymongo import DESCENDING, IndexModel
+
+
+logger = logging.getLogger(__name__)
+
+# How long deletions are remembered for ?since= delta syncs; older sync
+# tokens are refused and clients reload the full list
+TOMBSTONE_RETENTION = timedelta(days=7)
+
+# Relevance weights of the searched fields (backend.search)
+TASK_TEXT_WEIGHTS = {'title': 10, 'description': 2}
+COMMENT_TEXT_WEIGHTS = {'body': 1}
+
+# Options that change what an index is; anything else (e.g. background,
+# so builds do not block the collection) only affects how it is built
+_SPEC_OPTIONS = ('unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds')
+
+INDEXES = {
+    'tasks': [
+        # Task listings, pages and keyset cursors: LIVE filter, sorted by
+        # (-created_at, -_id) so they never sort in memory
+        IndexModel([('created_at', DESCENDING), ('_id', DESCENDING)],
+                   name='created_at_-1__id_-1', background=True),
+        # ?sort=updated_at and ?updated_after=
+        IndexModel([('updated_at', DESCENDING), ('_id', DESCENDING)],
+                   name='updated_at_-1__id_-1', background=True),
+        # ?status= with either sort (and the matching *_after range)
+        IndexModel([('status', 1), ('created_at', DESCENDING), ('_id', DESCENDING)],
+                   name='status_1_created_at_-1__id_-1', background=True),
+        IndexModel([('status', 1), ('updated_at', DESCENDING), ('_id', DESCENDING)],
+                   name='status_1_updated_at_-1__id_-1', background=True),
+        # ?since= also picks up counter changes made by comment writes
+        IndexModel([('comments_updated_at', DESCENDING)], name='comments_updated_at_-1',
+                   background=True),
+        # The purge worker and ?since= find tombstoned tasks without a scan
+        IndexModel([('deleted_at', 1)], name='deleted_at_1', sparse=True,
+                   background=True),
+        # The most commented tasks of the dashboard statistics (Stats.read)
+        IndexModel([('comment_count', DESCENDING), ('_id', DESCENDING)],
+                   name='comment_count_-1__id_-1',
+                   partialFilterExpression={'comment_count': {'$gt': 0}}, background=True),
+        # Full-text search of titles and descriptions
+        IndexModel([(field, 'text') for field in TASK_TEXT_WEIGHTS], name='tasks_text',
+                   weights=TASK_TEXT_WEIGHTS, background=True),
+    ],
+    'comments': [
+        # Comment pages and counts per task, the newest comment of a task,
+        # recounts and purges; _id breaks created_at ties for keyset pages
+        IndexModel([('task_id', 1), ('created_at', DESCENDING), ('_id', DESCENDING)],
+                   name='task_id_1_created_at_-1__id_-1', background=True),
+        # Comments of a task changed since a sync token
+        IndexModel([('task_id', 1), ('updated_at', DESCENDING)],
+                   name='task_id_1_updated_at_-1', background=True),
+        # Full-text search of comment bodies
+        IndexModel([(field, 'text') for field in COMMENT_TEXT_WEIGHTS], name='comments_text',
+                   weights=COMMENT_TEXT_WEIGHTS, background=True),
+    ],
+    'tombstones': [
+        # Deletions expire with the retention window; tasks deleted since
+        IndexModel([('deleted_at', 1)], name='deleted_at_1',
+                   expireAfterSeconds=int(TOMBSTONE_RETENTION.total_seconds()),
+                   background=True),
+        # Comments of a task deleted since
+        IndexModel([('task_id', 1), ('deleted_at', 1)], name='task_id_1_deleted_at_1',
+                   sparse=True, background=True),
+    ],
+    'slow_queries': [
+        # Slow-query log entries expire after a week
+        IndexModel([('recorded_at', 1)], name='recorded_at_1',
+                   expireAfterSeconds=7 * 24 * 3600, background=True),
+    ],
+}
+
+
+def _spec(document):
+    """Reduce an index document to the parts that identify it."""
+    key = [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+           for field, direction in document['key'].items()]
+    options = {option: document[option] for option in _SPEC_OPTIONS if option in document}
+    text = [field for field, direction in key
+            if direction == 'text' or field in ('_fts', '_ftsx')]
+    if text:
+        # listIndexes reports the text fields as _fts/_ftsx plus their weights
+        weights = document.get('weights') or {
+            field: 1 for field, direction in key if direction == 'text'
+        }
+        position = key.index(next(item for item in key if item[0] in text))
+        key = [item for item in key if item[0] not in text]
+        key.insert(position, ('$text', 'text'))
+        options['weights'] = dict(weights)
+    return key, options
+
+
+def supports_query(collection, equality, ranges, sort):
+    """Whether a manifest index serves a query without scanning or sorting.
+
+    ``equality`` and ``ranges`` are the sets of fields compared with ``==``
+    and with ranges; ``sort`` is the (field, direction) the results are
+    ordered by, with _id as tie-breaker. The index must start with the
+    equality fields, followed by the sort field and _id in either scan
+    direction, and ranges are only possible on the sort field.
+    """
+    field, direction = sort
+    if set(ranges) - {field}:
+        return False
+    wanted = [[(field, d), ('_id', d)] for d in (1, -1)]
+    for model in INDEXES.get(collection, []):
+        keys = list(model.document['key'].items())
+        prefix = len(equality)
+        if ({key for key, _ in keys[:prefix]} == set(equality)
+                and keys[prefix:prefix + 2] in wanted):
+            return True
+    return False
+
+
+def diff_indexes(db):
+    """Compare the database with the manifest.
+
+    Returns (missing, changed, obsolete) as lists of (collection, name).
+    Changed indexes exist under a manifest name with a different spec.
+    """
+    missing, changed, obsolete = [], [], []
+    for collection, models in INDEXES.items():
+        existing = {
+            name: _spec(dict(info, key=dict(info['key'])))
+            for name, info in db[collection].index_information().items()
+            if name != '_id_'
+        }
+        wanted = {model.document['name']: _spec(model.document) for model in models}
+        for name, spec in wanted.items():
+            if name not in existing:
+                missing.append((collection, name))
+            elif existing[name] != spec:
+                changed.append((collection, name))
+        obsolete.extend((collection, name) for name in existing if name not in wanted)
+    return missing, changed, obsolete
+
+
+def verify_indexes(db):
+    """Log the manifest indexes the database lacks; return their names.
+
+    One listIndexes per collection, so this is cheap enough for startup.
+    """
+    missing, changed, _ = diff_indexes(db)
+    for collection, name in missing + changed:
+        logger.warning("Index %s.%s is missing or outdated; run `flask sync-indexes`",
+                       collection, name)
+    return missing + changed
+
+
+def sync_indexes(db, drop=True, dry_run=False, echo=logger.info):
+    """Make the database match the manifest.
+
+    Missing indexes are built in the background so the collections stay
+    available; changed ones are dropped and rebuilt. Indexes not in the
+    manifest are dropped when ``drop`` is set. Returns the diff.
+    """
+    missing, changed, obsolete = diff_indexes(db)
+    if dry_run:
+        return missing, changed, obsolete
+
+    for collection, name in changed + (obsolete if drop else []):
+        echo(f"Dropping index {collection}.{name}")
+        db[collection].drop_index(name)
+
+    for collection, models in INDEXES.items():
+        build = {name for coll, name in missing + changed if coll == collection}
+        models = [model for model in models if model.document['name'] in build]
+        for model in models:
+            echo(f"Building index {collection}.{model.document['name']}")
+        if models:
+            db[collection].create_indexes(models)
+    return missing, changed, obsolete
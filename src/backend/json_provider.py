@@ -0,0 +1,61 @@
+"""JSON encoding for API responses, backed by orjson when it is installed."""
+import json
+from datetime import datetime
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+from backend.metrics import timed
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib
+    orjson = None
+
+
+def _default(obj):
+    """Encode the BSON types that can reach a response."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime):
+        return obj.strftime('%Y-%m-%dT%H:%M:%SZ')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    # Naive datetimes are UTC in this app; match to_iso's second precision
+    _ORJSON_OPTIONS = (
+        orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_OMIT_MICROSECONDS
+    )
+
+    @timed
+    def dumps(obj):
+        """Encode ``obj`` to a JSON string."""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS).decode()
+else:
+    @timed
+    def dumps(obj):
+        """Encode ``obj`` to a JSON string."""
+        return json.dumps(obj, default=_default, separators=(',', ':'))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    @timed
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS),
+            mimetype=self.mimetype
+        )
+
+
+def init_json(app):
+    """Install the fastest available JSON provider on the app."""
+    if orjson is not None:
+        app.json = FastJSONProvider(app)
@@ -0,0 +1,291 @@
+"""Per-request performance metrics: latency histograms, Mongo time, Server-Timing.
+
+The current request's RequestTimer lives in a context variable, so MongoDB
+commands (via CommandMetrics) and serialization (via ``timed``) are
+attributed to it from anywhere on the request's thread or task.
+"""
+import contextvars
+import functools
+import threading
+import time
+import weakref
+from collections import defaultdict
+from flask import request as flask_request
+from pymongo import monitoring
+from quart.wrappers.response import IterableBody
+
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the write batch size buckets
+BATCH_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_current = contextvars.ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """Time spent by one request, split by phase."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.db_commands = 0
+        self.serialize_time = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Format the Server-Timing header value (milliseconds)."""
+        return (
+            f'db;desc="{self.db_commands} commands";dur={self.db_time * 1000:.2f}, '
+            f'serialize;dur={self.serialize_time * 1000:.2f}, '
+            f'total;dur={self.elapsed() * 1000:.2f}'
+        )
+
+
+def timed(func):
+    """Attribute the time spent in ``func`` to the current request's serialization."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        timer = _current.get()
+        if timer is None:
+            return func(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timer.serialize_time += time.perf_counter() - started
+    return wrapper
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Attribute MongoDB command count and time to the current request.
+
+    pymongo reports command events on the thread that runs the command,
+    which is the request's thread (or, in the async app, an executor
+    thread running in a copy of the request's context).
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def _record(self, event):
+        timer = _current.get()
+        if timer is not None:
+            timer.db_commands += 1
+            timer.db_time += event.duration_micros / 1e6
+
+
+command_metrics = CommandMetrics()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+class RequestMetrics:
+    """Per-route request counters and latency histograms for /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)          # (method, route, status)
+            self.latency = defaultdict(Histogram)     # (method, route)
+            self.db_commands = defaultdict(int)       # (method, route)
+            self.db_time = defaultdict(float)         # (method, route)
+            self.serialize_time = defaultdict(float)  # (method, route)
+
+    def record(self, method, route, status, timer, duration):
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] += 1
+            self.latency[key].observe(duration)
+            self.db_commands[key] += timer.db_commands
+            self.db_time[key] += timer.db_time
+            self.serialize_time[key] += timer.serialize_time
+
+    def render(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += ['# HELP http_requests_total HTTP requests by route and status.',
+                      '# TYPE http_requests_total counter']
+            for (method, route, status), count in sorted(self.requests.items()):
+                labels = _labels(method=method, route=route, status=status)
+                lines.append(f'http_requests_total{{{labels}}} {count}')
+
+            lines += ['# HELP http_request_duration_seconds HTTP request latency by route.',
+                      '# TYPE http_request_duration_seconds histogram']
+            for (method, route), histogram in sorted(self.latency.items()):
+                labels = _labels(method=method, route=route)
+                for bound, count in histogram.cumulative():
+                    lines.append(
+                        f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}'
+                    )
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} '
+                             f'{histogram.count}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} '
+                             f'{histogram.count}')
+
+            for name, kind, help_text, values in (
+                ('mongodb_commands_total', 'counter',
+                 'MongoDB commands issued by requests, by route.', self.db_commands),
+                ('mongodb_command_seconds_total', 'counter',
+                 'Time spent in MongoDB commands by requests, by route.', self.db_time),
+                ('serialization_seconds_total', 'counter',
+                 'Time spent serializing responses, by route.', self.serialize_time),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                for (method, route), value in sorted(values.items()):
+                    lines.append(f'{name}{{{_labels(method=method, route=route)}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+class BatchMetrics:
+    """Sizes of group-committed write batches (see backend.groupcommit)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sizes = defaultdict(lambda: Histogram(BATCH_BUCKETS))  # operation
+
+    def record(self, operation, size):
+        with self._lock:
+            self.sizes[operation].observe(size)
+
+    def render(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = ['# HELP write_batch_size Writes merged into each group commit.',
+                 '# TYPE write_batch_size histogram']
+        with self._lock:
+            for operation, histogram in sorted(self.sizes.items()):
+                labels = _labels(operation=operation)
+                for bound, count in histogram.cumulative():
+                    lines.append(f'write_batch_size_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'write_batch_size_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'write_batch_size_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'write_batch_size_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+batch_metrics = BatchMetrics()
+
+
+def request_hook(func, asynchronous):
+    """Adapt a request hook for the app it is registered on.
+
+    Quart runs plain functions in a thread with a copy of the request's
+    context, so context variables they set would be lost; the async app
+    gets a coroutine function running in the request's own context.
+    """
+    if not asynchronous:
+        return func
+
+    @functools.wraps(func)
+    async def hook(*args, **kwargs):
+        return func(*args, **kwargs)
+    return hook
+
+
+def call_on_close(response, callback, asynchronous):
+    """Run ``callback`` once the body of a streamed response has been sent.
+
+    Returns False, scheduling nothing, if ``response`` is not streamed.
+    Quart responses have no call_on_close, and Quart tears the request
+    down before it sends the body, so on the async app the body is
+    wrapped in a generator that runs ``callback`` when it ends (or when
+    it is dropped without being sent).
+    """
+    if not asynchronous:
+        if not response.is_streamed:
+            return False
+        response.call_on_close(callback)
+        return True
+    body = response.response
+    if not isinstance(body, IterableBody):
+        return False
+
+    async def stream():
+        try:
+            async with body as chunks:
+                async for chunk in chunks:
+                    yield chunk
+        finally:
+            closed()
+
+    wrapped = stream()
+    # Runs the callback at most once, from the generator or its collection
+    closed = weakref.finalize(wrapped, callback)
+    response.response = IterableBody(wrapped)
+    return True
+
+
+def init_metrics(app, request=None):
+    """Time every request of ``app`` and add a Server-Timing header.
+
+    ``request`` is the framework's request proxy; it defaults to Flask's
+    and the async app passes Quart's.
+    """
+    asynchronous = request is not None
+    if request is None:
+        request = flask_request
+
+    def start_timer():
+        _current.set(RequestTimer())
+
+    def record_request(response):
+        timer = _current.get()
+        if timer is None:
+            return response
+        response.headers['Server-Timing'] = timer.server_timing()
+        # Unmatched URLs share one label to keep the series bounded
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        method, status = request.method, response.status_code
+
+        def record():
+            request_metrics.record(method, route, status, timer, timer.elapsed())
+
+        # Streamed bodies are still being written; count their full time
+        if not call_on_close(response, record, asynchronous):
+            record()
+        return response
+
+    app.before_request(request_hook(start_timer, asynchronous))
+    app.after_request(request_hook(record_request, asynchronous))
@@ -1,10 +1,393 @@
 """Data models and database operations."""
-from datetime import datetime
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
 from bson import ObjectId
-from pymongo.errors import DuplicateKeyError
+from bson.son import SON
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import (
+    BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError, WriteError
+)
+from backend.cache import LRUCache
+from backend.config import get_config
 from backend.db import get_db
+from backend.events import comment_events
+from backend.groupcommit import GroupCommitter
+from backend.indexes import supports_query
+from backend.metrics import batch_metrics
 
 
+logger = logging.getLogger(__name__)
+
+# Read-through cache for Tasks.find_by_id. Writes in this process invalidate
+# entries directly; writes in other workers arrive through a change stream
+# on the tasks collection or, where change streams are unavailable
+# (standalone servers), by polling the task list version.
+_task_cache = LRUCache(
+    maxsize=get_config('task_cache.max_size', 1024),
+    ttl=get_config('task_cache.ttl_s', 5)
+)
+_watcher_pid = None
+_watcher_lock = threading.Lock()
+# False once the server turned change streams down (standalone servers)
+_change_streams_supported = None
+# Backoff between attempts to reopen a failed change stream, in seconds
+WATCH_RETRY_MIN = 1
+WATCH_RETRY_MAX = 60
+# "The $changeStream stage is only supported on replica sets"
+CHANGE_STREAM_UNSUPPORTED = 40573
+# Seconds between polls of the task list version without change streams
+WATCH_POLL_INTERVAL = 1
+
+
+# Tasks tombstoned by Tasks.delete stay in the collection until their
+# comments are purged; every read and write of live tasks filters them out.
+LIVE = {'deleted_at': {'$exists': False}}
+
+
+# Projections of the fields the API serializes, so list reads never
+# transfer or decode internal bookkeeping such as the purge fields
+TASK_FIELDS = {
+    field: 1 for field in (
+        'title', 'description', 'status', 'comment_count', 'last_comment_at',
+        'comments_version', 'comments_updated_at', 'created_at', 'updated_at'
+    )
+}
+# What conditional GETs compare; always fetched, whatever the fieldset
+TASK_VERSION_FIELDS = ('updated_at', 'comment_count', 'comments_version')
+# What validates a cached task (see Tasks.find_by_id) and a task's comment list
+TASK_VALIDATOR_FIELDS = TASK_VERSION_FIELDS + ('comments_updated_at',)
+COMMENT_LIST_VERSION_FIELDS = ('comment_count', 'comments_version', 'comments_updated_at')
+COMMENT_FIELDS = {
+    field: 1 for field in ('task_id', 'body', 'author', 'created_at', 'updated_at')
+}
+
+# task_stats document holding the task counts by status and the comment total;
+# comments per day are in 'comments:YYYY-MM-DD' documents
+STATS_TOTALS = 'totals'
+# task_stats document whose version every write to the task list bumps;
+# full listings are validated against it (see Tasks.list_stamp)
+STATS_LIST_VERSION = 'list_version'
+
+# Task list filters: name -> (field, operator); None means equality
+TASK_FILTERS = {
+    'status': ('status', None),
+    'created_after': ('created_at', '$gt'),
+    'updated_after': ('updated_at', '$gt'),
+}
+DEFAULT_TASK_SORT = ('created_at', -1)
+
+
+def _projection(fields, default, always=()):
+    """Build a projection for the requested fields (``None`` means all).
+
+    created_at is always included because keyset cursors are built from it.
+    """
+    if not fields:
+        return default
+    return dict.fromkeys(set(fields) | {'created_at'} | set(always), 1)
+
+
+def _comments_lookup(limit):
+    """$lookup stage embedding each task's newest ``limit`` comments as ``comments``.
+
+    The sub-pipeline runs per task on task_id_1_created_at_-1__id_-1, so
+    it reads ``limit`` index keys and comments per task.
+    """
+    return {'$lookup': {
+        'from': 'comments',
+        'localField': '_id',
+        'foreignField': 'task_id',
+        'pipeline': [
+            {'$sort': SON([('created_at', -1), ('_id', -1)])},
+            {'$limit': limit},
+            {'$project': COMMENT_FIELDS}
+        ],
+        'as': 'comments'
+    }}
+
+
+def _find_tasks(query, projection, sort=None, skip=0, limit=None, batch_size=None,
+                comments_limit=None):
+    """Find tasks, with their newest comments embedded when ``comments_limit`` is set.
+
+    Without comments this is a plain find(); with them, the same query as
+    an aggregation ending in _comments_lookup.
+    """
+    db = get_db()
+    if comments_limit is None:
+        tasks = db.tasks.find(query, projection)
+        if sort:
+            tasks = tasks.sort(sort)
+        if skip:
+            tasks = tasks.skip(skip)
+        if limit is not None:
+            tasks = tasks.limit(limit)
+        if batch_size:
+            tasks = tasks.batch_size(batch_size)
+        return tasks
+    pipeline = [{'$match': query}]
+    if sort:
+        pipeline.append({'$sort': SON(sort)})
+    if skip:
+        pipeline.append({'$skip': skip})
+    if limit is not None:
+        pipeline.append({'$limit': limit})
+    pipeline += [{'$project': projection}, _comments_lookup(comments_limit)]
+    options = {'batchSize': batch_size} if batch_size else {}
+    return db.tasks.aggregate(pipeline, **options)
+
+
+def _watch_tasks(db):
+    """Invalidate cached tasks changed by any process.
+    
+    A failed stream is reopened with exponential backoff. Servers without
+    change streams get the task list version polled instead.
+    """
+    global _watcher_pid, _change_streams_supported
+    pipeline = [{'$match': {'operationType': {'$in': ['update', 'replace', 'delete']}}}]
+    delay = WATCH_RETRY_MIN
+    try:
+        while _change_streams_supported is not False:
+            opened = False
+            try:
+                with db.tasks.watch(pipeline) as stream:
+                    _change_streams_supported = opened = True
+                    delay = WATCH_RETRY_MIN
+                    for change in stream:
+                        _task_cache.invalidate(change['documentKey']['_id'])
+            except Exception as e:
+                if isinstance(e, OperationFailure) and e.code == CHANGE_STREAM_UNSUPPORTED:
+                    _change_streams_supported = False
+                    logger.info("Change streams are unsupported (standalone server); "
+                                "polling the task list version every %ss",
+                                WATCH_POLL_INTERVAL)
+                    break
+                logger.warning("Task cache change stream failed, retrying in %ss: %s",
+                               delay, e)
+            if opened:
+                # Events may have been missed, so nothing cached can be trusted
+                _task_cache.clear()
+            time.sleep(delay)
+            delay = min(delay * 2, WATCH_RETRY_MAX)
+        _poll_list_version(db)
+    finally:
+        with _watcher_lock:
+            if _watcher_pid == os.getpid():
+                _watcher_pid = None
+
+
+def _poll_list_version(db):
+    """Empty the task cache whenever the task list version moves.
+    
+    Every task write bumps the version (see _record_stats), so other
+    workers' writes stay unseen for at most WATCH_POLL_INTERVAL. A failed
+    poll empties the cache too, since writes may have been missed.
+    """
+    seen = None
+    while True:
+        try:
+            doc = db.task_stats.find_one({'_id': STATS_LIST_VERSION}) or {}
+            version = (doc.get('epoch'), doc.get('version'))
+        except PyMongoError as e:
+            logger.warning("Cannot poll the task list version: %s", e)
+            version = None
+        if version is None or version != seen:
+            _task_cache.clear()
+            seen = version
+        time.sleep(WATCH_POLL_INTERVAL)
+
+
+def _ensure_task_watcher(db):
+    """Start the change stream listener once per process (also after fork)."""
+    global _watcher_pid
+    if _watcher_pid == os.getpid():
+        return
+    with _watcher_lock:
+        if _watcher_pid != os.getpid():
+            _watcher_pid = os.getpid()
+            _task_cache.clear()
+            threading.Thread(
+                target=_watch_tasks, args=(db,), name='task-cache-watch', daemon=True
+            ).start()
+
+
+def _after(cursor, sort=('created_at', -1)):
+    """Build the keyset filter for documents sorted by (sort, _id).
+
+    ``cursor`` is the (value of the sort field, _id) of the last document
+    of the previous page.
+    """
+    field, direction = sort
+    value, doc_id = cursor
+    op = '$lt' if direction < 0 else '$gt'
+    return {'$or': [
+        {field: {op: value}},
+        {field: value, '_id': {op: doc_id}}
+    ]}
+
+
+def _sort_keys(sort):
+    """Sort specification for (sort, _id); _id breaks ties deterministically."""
+    field, direction = sort
+    return [(field, direction), ('_id', direction)]
+
+
+def _insert_batch(collection, docs):
+    """Insert documents unordered; return the indexes that failed."""
+    if not docs:
+        return set()
+    try:
+        collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        return {err['index'] for err in e.details['writeErrors']}
+    return set()
+
+
+def _update_batch(collection, updates, query=None):
+    """Apply (_id, fields) updates unordered; return updated docs by _id.
+
+    ``query`` restricts which documents may be updated and returned. The
+    _ids whose update failed with a write error map to None.
+    """
+    if not updates:
+        return {}
+    query = query or {}
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(dict(query, _id=doc_id), {'$set': dict(fields, updated_at=now)})
+        for doc_id, fields in updates
+    ]
+    failed = set()
+    try:
+        collection.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        failed = {updates[err['index']][0] for err in e.details['writeErrors']}
+    ids = [doc_id for doc_id, _ in updates if doc_id not in failed]
+    docs = {
+        doc['_id']: doc
+        for doc in collection.find(dict(query, _id={'$in': ids}))
+    }
+    docs.update(dict.fromkeys(failed))
+    return docs
+
+
+def _day(dt):
+    """The day a timestamp falls on, as the YYYY-MM-DD key of task_stats."""
+    return dt.strftime('%Y-%m-%d')
+
+
+def _record_stats(statuses=None, created=(), deleted=()):
+    """Apply the effect of a write to the task_stats collection with $inc.
+
+    ``statuses`` maps task statuses to the change in their number of live
+    tasks; ``created`` and ``deleted`` list the created_at of the comments
+    added and removed. The task list version is bumped in the same
+    unordered bulk write, so every write that changes a listing calls this.
+    """
+    totals = {f'tasks.{status}': delta
+              for status, delta in (statuses or {}).items() if delta}
+    if len(created) != len(deleted):
+        totals['comments'] = len(created) - len(deleted)
+    per_day = defaultdict(int)
+    for created_at in created:
+        per_day[_day(created_at)] += 1
+    for created_at in deleted:
+        per_day[_day(created_at)] -= 1
+    ops = [UpdateOne({'_id': STATS_TOTALS}, {'$inc': totals}, upsert=True)] if totals else []
+    ops += [
+        UpdateOne({'_id': f'comments:{day}'},
+                  {'$inc': {'comments': count}, '$setOnInsert': {'day': day}}, upsert=True)
+        for day, count in sorted(per_day.items()) if count
+    ]
+    # The epoch tells a recreated version document from the one it replaced
+    ops.append(UpdateOne({'_id': STATS_LIST_VERSION},
+                         {'$inc': {'version': 1}, '$setOnInsert': {'epoch': ObjectId()}},
+                         upsert=True))
+    get_db().task_stats.bulk_write(ops, ordered=False)
+
+
+def _uncount_comments(counts):
+    """Take comments that were counted but not inserted back off their tasks.
+
+    ``counts`` maps task _ids to the number of comments to take off.
+    """
+    db = get_db()
+    for task_id, count in counts.items():
+        db.tasks.update_one({'_id': task_id}, {'$inc': {'comment_count': -count}})
+        _task_cache.invalidate(task_id)
+
+
+def _create_comments(comments):
+    """Write comments from concurrent Comments.create calls together.
+    
+    One counter update per distinct task (which doubles as its existence
+    check), then a single unordered insert. Returns per comment the
+    comment, None if its task does not exist, or its insert's WriteError.
+    """
+    db = get_db()
+    by_task = defaultdict(list)
+    for comment in comments:
+        by_task[comment['task_id']].append(comment)
+    live = set()
+    for task_id, task_comments in by_task.items():
+        newest = max(comment['created_at'] for comment in task_comments)
+        result = db.tasks.update_one(
+            dict(LIVE, _id=task_id),
+            {'$inc': {'comment_count': len(task_comments), 'comments_version': 1},
+             '$max': {'last_comment_at': newest, 'comments_updated_at': newest}}
+        )
+        _task_cache.invalidate(task_id)
+        if result.matched_count:
+            live.add(task_id)
+    
+    docs = [comment for comment in comments if comment['task_id'] in live]
+    errors = {}
+    if docs:
+        try:
+            db.comments.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            errors = {
+                id(docs[err['index']]): WriteError(err['errmsg'], err['code'], err)
+                for err in e.details['writeErrors']
+            }
+        except Exception:
+            # Nothing is known to be written: uncount the whole batch
+            # (`flask recount-comments` repairs any that did land)
+            _uncount_comments({task_id: len(by_task[task_id]) for task_id in live})
+            raise
+    failed = defaultdict(int)
+    for comment in docs:
+        if id(comment) in errors:
+            failed[comment['task_id']] += 1
+    _uncount_comments(failed)
+    if docs:
+        _record_stats(created=[c['created_at'] for c in docs if id(c) not in errors])
+    comment_events.publish('created', [c for c in docs if id(c) not in errors])
+    return [
+        None if comment['task_id'] not in live else errors.get(id(comment), comment)
+        for comment in comments
+    ]
+
+
+def _comment_committer():
+    """Build the opt-in group commit of Comments.create, or None when disabled."""
+    settings = get_config('mongodb.comment_group_commit', {})
+    if not settings.get('enabled', False):
+        return None
+    return GroupCommitter(
+        _create_comments,
+        window=settings.get('window_ms', 2) / 1000,
+        max_batch=settings.get('max_batch', 200),
+        on_flush=lambda size: batch_metrics.record('comments.create', size)
+    )
+
+
+_comment_commits = _comment_committer()
+
 
 class Tasks:
     """Task model operations."""
@@ -18,47 +401,403 @@ class Tasks:
             'title': title,
             'description': description,
             'status': status,
+            'comment_count': 0,
+            'last_comment_at': None,
+            'comments_version': 0,
+            'comments_updated_at': None,
             'created_at': now,
             'updated_at': now
         }
         result = db.tasks.insert_one(task)
         task['_id'] = result.inserted_id
+        _record_stats({status: 1})
         return task
     
     @staticmethod
-    def find_by_id(task_id):
-        """Find task by ID."""
+    def find_by_id(task_id, validate=False):
+        """Find task by ID, served from the task cache when possible.
+        
+        With ``validate``, a cached task is served only if its version
+        fields match a fresh read of them, so it never lags other
+        workers' writes; that read is still far smaller than the task.
+        """
+        db = get_db()
+        _ensure_task_watcher(db)
+        task_id = ObjectId(task_id)
+        task = _task_cache.get(task_id)
+        if task is not None and validate:
+            versions = Tasks.find_versions(task_id, TASK_VALIDATOR_FIELDS)
+            if versions is None:
+                _task_cache.invalidate(task_id)
+                return None
+            if any(task.get(field) != versions.get(field) for field in TASK_VALIDATOR_FIELDS):
+                _task_cache.invalidate(task_id)
+                task = None
+        if task is None:
+            # A write invalidating the task while it is read must not
+            # leave the version read before it cached
+            generation = _task_cache.generation
+            task = db.tasks.find_one(dict(LIVE, _id=task_id))
+            if task is None:
+                return None
+            _task_cache.set(task_id, task, generation)
+        # Callers get their own copy so they cannot corrupt the cache
+        return dict(task)
+    
+    @staticmethod
+    def find_versions(task_id, fields=TASK_VALIDATOR_FIELDS):
+        """Read only the given version fields of a live task, bypassing the cache."""
+        db = get_db()
+        return db.tasks.find_one(dict(LIVE, _id=ObjectId(task_id)), dict.fromkeys(fields, 1))
+    
+    @staticmethod
+    def cache_stats():
+        """Return hit/miss/eviction counters of the task cache."""
+        return _task_cache.stats()
+    
+    @staticmethod
+    def cache_clear():
+        """Empty the task cache."""
+        _task_cache.clear()
+    
+    @staticmethod
+    def filter_query(filters=None):
+        """Build the query for live tasks matching ``filters`` (see TASK_FILTERS)."""
+        query = dict(LIVE)
+        for name, value in (filters or {}).items():
+            field, op = TASK_FILTERS[name]
+            if op is None:
+                query[field] = value
+            else:
+                query.setdefault(field, {})[op] = value
+        return query
+    
+    @staticmethod
+    def is_indexed(filters=None, sort=DEFAULT_TASK_SORT):
+        """Whether an index in the manifest serves ``filters`` sorted by ``sort``."""
+        equality, ranges = set(), set()
+        for name in filters or {}:
+            field, op = TASK_FILTERS[name]
+            (equality if op is None else ranges).add(field)
+        return supports_query('tasks', equality, ranges, sort)
+    
+    @staticmethod
+    def find_all(limit=None, offset=0, after=None, fields=None, filters=None,
+                 sort=DEFAULT_TASK_SORT, comments_limit=None):
+        """Find tasks in ``sort`` order (newest first), optionally one page at a time.
+
+        ``after`` is a (sort value, _id) keyset cursor; when given, ``offset``
+        is ignored. ``fields`` limits the fields fetched and ``filters``
+        the tasks (see TASK_FILTERS); callers check is_indexed first. With
+        ``comments_limit``, each task carries its newest comments.
+        """
+        query = Tasks.filter_query(filters)
+        if after is not None:
+            query.update(_after(after, sort))
+            offset = 0
+        projection = _projection(fields, TASK_FIELDS, TASK_VERSION_FIELDS)
+        return list(_find_tasks(query, projection, _sort_keys(sort), offset, limit,
+                                comments_limit=comments_limit))
+    
+    @staticmethod
+    def iter_all(batch_size=500, fields=None, filters=None, sort=DEFAULT_TASK_SORT,
+                 comments_limit=None):
+        """Iterate over all matching tasks without loading them at once."""
+        projection = _projection(fields, TASK_FIELDS, TASK_VERSION_FIELDS)
+        return _find_tasks(Tasks.filter_query(filters), projection, _sort_keys(sort),
+                           batch_size=batch_size, comments_limit=comments_limit)
+    
+    @staticmethod
+    def find_many(task_ids, fields=None, comments_limit=None):
+        """Find live tasks by _id with one $in query, in the order of ``task_ids``.
+        
+        Unknown and deleted tasks are left out.
+        """
+        query = dict(LIVE, _id={'$in': list(task_ids)})
+        projection = _projection(fields, TASK_FIELDS, TASK_VERSION_FIELDS)
+        found = {task['_id']: task
+                 for task in _find_tasks(query, projection, comments_limit=comments_limit)}
+        return [found[task_id] for task_id in task_ids if task_id in found]
+    
+    @staticmethod
+    def changes_since(since, fields=None):
+        """Return (tasks changed, _ids of tasks deleted) since ``since``.
+        
+        Counter changes from comment writes count as changes. Deleted tasks
+        are tombstoned documents until purged, then entries in the
+        tombstones collection, so both are consulted.
+        """
         db = get_db()
-        return db.tasks.find_one({'_id': ObjectId(task_id)})
+        projection = dict(_projection(fields, TASK_FIELDS, TASK_VERSION_FIELDS),
+                          deleted_at=1)
+        changed, deleted = [], set()
+        for task in db.tasks.find({'$or': [
+            {'updated_at': {'$gte': since}},
+            {'comments_updated_at': {'$gte': since}},
+            {'deleted_at': {'$gte': since}},
+        ]}, projection):
+            if 'deleted_at' in task:
+                deleted.add(task['_id'])
+            else:
+                changed.append(task)
+        deleted.update(
+            tombstone['doc_id']
+            for tombstone in db.tombstones.find(
+                {'collection': 'tasks', 'deleted_at': {'$gte': since}}, {'doc_id': 1}
+            )
+        )
+        return changed, sorted(deleted)
     
     @staticmethod
-    def find_all():
-        """Find all tasks."""
+    def search(text, status=None, after=None, limit=20):
+        """Find live tasks matching a $text query, best first.
+        
+        Each task carries its relevance as ``score``; tasks come in (score,
+        _id) descending order and ``after`` is the (score, _id) of the last
+        task of the previous page.
+        """
         db = get_db()
-        return list(db.tasks.find().sort('created_at', -1))
+        query = dict(LIVE, **{'$text': {'$search': text}})
+        if status:
+            query['status'] = status
+        pipeline = [{'$match': query}, {'$addFields': {'score': {'$meta': 'textScore'}}}]
+        if after is not None:
+            pipeline.append({'$match': _after(after, ('score', -1))})
+        pipeline += [
+            {'$sort': SON([('score', -1), ('_id', -1)])},
+            {'$limit': limit},
+            {'$project': dict(TASK_FIELDS, score=1)}
+        ]
+        return list(db.tasks.aggregate(pipeline))
+    
+    @staticmethod
+    def list_stamp():
+        """Identify the current state of the task list with one point read.
+        
+        The version changes whenever a task is created, updated, deleted or
+        has its comments changed (see _record_stats), so it can validate a
+        full listing without fetching any task.
+        """
+        doc = get_db().task_stats.find_one({'_id': STATS_LIST_VERSION}) or {}
+        return {'epoch': doc.get('epoch'), 'version': doc.get('version', 0)}
     
     @staticmethod
     def update(task_id, updates):
-        """Update a task."""
+        """Update a task, moving it between status counts if its status changes."""
         db = get_db()
         updates['updated_at'] = datetime.utcnow()
-        result = db.tasks.update_one(
-            {'_id': ObjectId(task_id)},
-            {'$set': updates}
+        # The previous status comes back with the write; the result is
+        # exactly the previous document with ``updates`` applied
+        before = db.tasks.find_one_and_update(
+            dict(LIVE, _id=ObjectId(task_id)),
+            {'$set': updates},
+            return_document=ReturnDocument.BEFORE
         )
-        if result.matched_count == 0:
+        _task_cache.invalidate(ObjectId(task_id))
+        if before is None:
             return None
-        return Tasks.find_by_id(task_id)
+        task = dict(before, **updates)
+        if task['status'] != before['status']:
+            _record_stats({before['status']: -1, task['status']: 1})
+        else:
+            _record_stats()
+        return task
     
     @staticmethod
     def delete(task_id):
-        """Delete a task and its comments."""
+        """Tombstone a task so it disappears from reads right away.
+        
+        The task's comments and the document itself are removed later by
+        the purge worker (see backend.purge). Returns False if there was no
+        live task to delete.
+        """
         db = get_db()
-        # Delete associated comments first
-        db.comments.delete_many({'task_id': ObjectId(task_id)})
-        # Delete task
-        result = db.tasks.delete_one({'_id': ObjectId(task_id)})
-        return result.deleted_count > 0
+        task = db.tasks.find_one_and_update(
+            dict(LIVE, _id=ObjectId(task_id)),
+            {'$set': {'deleted_at': datetime.utcnow(), 'purged_comments': 0}},
+            projection={'status': 1}
+        )
+        _task_cache.invalidate(ObjectId(task_id))
+        if task is None:
+            return False
+        _record_stats({task['status']: -1})
+        return True
+    
+    @staticmethod
+    def create_batch(items):
+        """Create many tasks in one unordered insert.
+        
+        ``items`` are dicts of create fields. Returns the task documents in
+        input order, with None for tasks that failed to insert.
+        """
+        db = get_db()
+        now = datetime.utcnow()
+        tasks = [
+            {
+                'title': item['title'],
+                'description': item.get('description'),
+                'status': item.get('status', 'todo'),
+                'comment_count': 0,
+                'last_comment_at': None,
+                'comments_version': 0,
+                'comments_updated_at': None,
+                'created_at': now,
+                'updated_at': now
+            }
+            for item in items
+        ]
+        failed = _insert_batch(db.tasks, tasks)
+        statuses = defaultdict(int)
+        for i, task in enumerate(tasks):
+            if i not in failed:
+                statuses[task['status']] += 1
+        _record_stats(statuses)
+        return [None if i in failed else t for i, t in enumerate(tasks)]
+    
+    @staticmethod
+    def update_batch(updates):
+        """Apply (task_id, updates) pairs; return updated tasks by _id.
+        
+        Tasks whose update failed map to None. Status counts are moved by
+        the statuses read before the write; a concurrent status change in
+        between can skew them until the next `flask rebuild-stats`.
+        """
+        db = get_db()
+        moved = [task_id for task_id, fields in updates if 'status' in fields]
+        previous = {
+            task['_id']: task['status']
+            for task in db.tasks.find(dict(LIVE, _id={'$in': moved}), {'status': 1})
+        } if moved else {}
+        tasks = _update_batch(db.tasks, updates, LIVE)
+        for task_id, _ in updates:
+            _task_cache.invalidate(task_id)
+        statuses = defaultdict(int)
+        for task_id, status in previous.items():
+            if tasks.get(task_id) and tasks[task_id]['status'] != status:
+                statuses[status] -= 1
+                statuses[tasks[task_id]['status']] += 1
+        _record_stats(statuses)
+        return tasks
+    
+    @staticmethod
+    def delete_batch(task_ids):
+        """Tombstone many tasks (see delete); return the tombstoned _ids."""
+        db = get_db()
+        query = dict(LIVE, _id={'$in': list(task_ids)})
+        found = {task['_id']: task['status']
+                 for task in db.tasks.find(query, projection={'status': 1})}
+        if not found:
+            return set()
+        db.tasks.update_many(
+            dict(LIVE, _id={'$in': list(found)}),
+            {'$set': {'deleted_at': datetime.utcnow(), 'purged_comments': 0}}
+        )
+        for task_id in found:
+            _task_cache.invalidate(task_id)
+        statuses = defaultdict(int)
+        for status in found.values():
+            statuses[status] -= 1
+        _record_stats(statuses)
+        # Tasks tombstoned concurrently by another request are still gone
+        return set(found)
+    
+    @staticmethod
+    def find_tombstoned():
+        """Return the _ids of tombstoned tasks still awaiting a purge."""
+        db = get_db()
+        return [
+            task['_id']
+            for task in db.tasks.find({'deleted_at': {'$exists': True}}, {'_id': 1})
+        ]
+    
+    @staticmethod
+    def purge_comments(task_id, batch_size=1000):
+        """Delete up to ``batch_size`` comments of a tombstoned task.
+        
+        Progress is recorded in the task's ``purged_comments``. Returns the
+        number of comments deleted; 0 means there is nothing left.
+        """
+        db = get_db()
+        task_id = ObjectId(task_id)
+        comments = list(
+            db.comments.find({'task_id': task_id}, {'created_at': 1}).limit(batch_size)
+        )
+        if not comments:
+            return 0
+        ids = [c['_id'] for c in comments]
+        deleted = db.comments.delete_many({'_id': {'$in': ids}}).deleted_count
+        if deleted < len(comments):
+            # Comments.delete raced us and recorded its own stats; leave
+            # out the comments it tombstoned, and never count more than
+            # were deleted here
+            raced = {t['doc_id'] for t in db.tombstones.find(
+                {'collection': 'comments', 'doc_id': {'$in': ids}}, {'doc_id': 1}
+            )}
+            comments = [c for c in comments if c['_id'] not in raced][:deleted]
+        _record_stats(deleted=[c['created_at'] for c in comments])
+        db.tasks.update_one(
+            {'_id': task_id, 'deleted_at': {'$exists': True}},
+            {'$inc': {'purged_comments': deleted}}
+        )
+        return deleted
+    
+    @staticmethod
+    def finish_purge(task_id):
+        """Remove a tombstoned task once its comments are gone.
+        
+        The deletion is recorded in the tombstones collection first, for
+        clients syncing with ?since=.
+        """
+        db = get_db()
+        query = {'_id': ObjectId(task_id), 'deleted_at': {'$exists': True}}
+        task = db.tasks.find_one(query, {'deleted_at': 1})
+        if task is None:
+            return
+        db.tombstones.insert_one(
+            {'collection': 'tasks', 'doc_id': task['_id'], 'deleted_at': task['deleted_at']}
+        )
+        db.tasks.delete_one(query)
+    
+    @staticmethod
+    def recount_comments(batch_size=1000):
+        """Recompute comment_count/last_comment_at on every task.
+        
+        Repairs drift in the denormalized counters. Only tasks whose counters
+        differ from the comments collection are written. Returns the number
+        of tasks fixed.
+        """
+        db = get_db()
+        totals = {
+            row['_id']: row
+            for row in db.comments.aggregate([
+                {'$group': {
+                    '_id': '$task_id',
+                    'count': {'$sum': 1},
+                    'last': {'$max': '$created_at'}
+                }}
+            ], allowDiskUse=True)
+        }
+        fixed = 0
+        ops = []
+        projection = {'comment_count': 1, 'last_comment_at': 1}
+        for task in db.tasks.find(LIVE, projection):
+            row = totals.get(task['_id'], {})
+            expected = {
+                'comment_count': row.get('count', 0),
+                'last_comment_at': row.get('last')
+            }
+            if all(task.get(k) == v for k, v in expected.items()):
+                continue
+            ops.append(UpdateOne({'_id': task['_id']}, {'$set': expected}))
+            if len(ops) >= batch_size:
+                fixed += db.tasks.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            fixed += db.tasks.bulk_write(ops, ordered=False).modified_count
+        if fixed:
+            _task_cache.clear()
+            _record_stats()
+        return fixed
 
 
 class Comments:
@@ -66,7 +805,13 @@ class Comments:
     
     @staticmethod
     def create(task_id, body, author=None):
-        """Create a new comment."""
+        """Create a new comment.
+        
+        Returns None without inserting anything if the task does not exist;
+        bumping the task's counters doubles as the existence check. With
+        ``mongodb.comment_group_commit`` enabled, concurrent creates are
+        written together (see _create_comments).
+        """
         db = get_db()
         now = datetime.utcnow()
         comment = {
@@ -76,10 +821,65 @@ class Comments:
             'created_at': now,
             'updated_at': now
         }
-        result = db.comments.insert_one(comment)
+        if _comment_commits is not None:
+            return _comment_commits.submit(comment)
+        result = db.tasks.update_one(
+            dict(LIVE, _id=comment['task_id']),
+            {'$inc': {'comment_count': 1, 'comments_version': 1},
+             '$max': {'last_comment_at': now, 'comments_updated_at': now}}
+        )
+        _task_cache.invalidate(comment['task_id'])
+        if result.matched_count == 0:
+            return None
+        try:
+            result = db.comments.insert_one(comment)
+        except Exception:
+            _uncount_comments({comment['task_id']: 1})
+            raise
         comment['_id'] = result.inserted_id
+        _record_stats(created=[now])
+        comment_events.publish('created', [comment])
         return comment
     
+    @staticmethod
+    def create_batch(task_id, items):
+        """Create many comments on one task in one unordered insert.
+        
+        ``items`` are dicts with ``body`` and optional ``author``. Returns
+        None if the task does not exist, otherwise the comment documents in
+        input order with None for comments that failed to insert.
+        """
+        db = get_db()
+        now = datetime.utcnow()
+        comments = [
+            {
+                'task_id': ObjectId(task_id),
+                'body': item['body'],
+                'author': item.get('author'),
+                'created_at': now,
+                'updated_at': now
+            }
+            for item in items
+        ]
+        result = db.tasks.update_one(
+            dict(LIVE, _id=ObjectId(task_id)),
+            {'$inc': {'comment_count': len(comments), 'comments_version': 1},
+             '$max': {'last_comment_at': now, 'comments_updated_at': now}}
+        )
+        _task_cache.invalidate(ObjectId(task_id))
+        if result.matched_count == 0:
+            return None
+        try:
+            failed = _insert_batch(db.comments, comments)
+        except Exception:
+            _uncount_comments({ObjectId(task_id): len(comments)})
+            raise
+        if failed:
+            _uncount_comments({ObjectId(task_id): len(failed)})
+        _record_stats(created=[now] * (len(comments) - len(failed)))
+        comment_events.publish('created', [c for i, c in enumerate(comments) if i not in failed])
+        return [None if i in failed else c for i, c in enumerate(comments)]
+    
     @staticmethod
     def find_by_id(comment_id):
         """Find comment by ID."""
@@ -87,34 +887,289 @@ class Comments:
         return db.comments.find_one({'_id': ObjectId(comment_id)})
     
     @staticmethod
-    def find_by_task(task_id, limit=20, offset=0):
-        """Find comments for a task with pagination."""
+    def find_by_task(task_id, limit=20, offset=0, after=None, fields=None):
+        """Find comments for a task with pagination.
+
+        When ``after`` is a (created_at, _id) tuple, the page starts right
+        after that comment (keyset pagination) and ``offset`` is ignored, so
+        deep pages cost the same as the first one. ``fields`` limits the
+        fields fetched.
+        """
         db = get_db()
-        comments = list(
-            db.comments.find({'task_id': ObjectId(task_id)})
-            .sort('created_at', -1)
+        query = {'task_id': ObjectId(task_id)}
+        if after is not None:
+            query.update(_after(after))
+            offset = 0
+        return list(
+            db.comments.find(query, _projection(fields, COMMENT_FIELDS))
+            .sort([('created_at', -1), ('_id', -1)])
             .skip(offset)
             .limit(limit)
         )
-        total = db.comments.count_documents({'task_id': ObjectId(task_id)})
-        return comments, total
+    
+    @staticmethod
+    def count_by_task(task_id):
+        """Count comments for a task (fallback for tasks without counters)."""
+        db = get_db()
+        return db.comments.count_documents({'task_id': ObjectId(task_id)})
+    
+    @staticmethod
+    def changes_since(task_id, since, fields=None):
+        """Return (comments changed, _ids of comments deleted) on a task since ``since``."""
+        db = get_db()
+        task_id = ObjectId(task_id)
+        changed = list(db.comments.find(
+            {'task_id': task_id, 'updated_at': {'$gte': since}},
+            _projection(fields, COMMENT_FIELDS)
+        ))
+        deleted = [
+            tombstone['doc_id']
+            for tombstone in db.tombstones.find(
+                {'task_id': task_id, 'deleted_at': {'$gte': since}}, {'doc_id': 1}
+            )
+        ]
+        return changed, deleted
+    
+    @staticmethod
+    def iter_all(batch_size=500):
+        """Iterate over all comments without loading them at once."""
+        db = get_db()
+        return db.comments.find({}, COMMENT_FIELDS).batch_size(batch_size)
+    
+    @staticmethod
+    def search(text, status=None, after=None, limit=20):
+        """Find comments of live tasks matching a $text query (see Tasks.search).
+        
+        Each comment carries the _id, title and status of its task as
+        ``task``; ``status`` filters on the task's status.
+        """
+        db = get_db()
+        pipeline = [
+            {'$match': {'$text': {'$search': text}}},
+            {'$addFields': {'score': {'$meta': 'textScore'}}}
+        ]
+        if after is not None:
+            pipeline.append({'$match': _after(after, ('score', -1))})
+        pipeline += [
+            {'$sort': SON([('score', -1), ('_id', -1)])},
+            # Looked up lazily, only until the page is full
+            {'$lookup': {
+                'from': 'tasks',
+                'localField': 'task_id',
+                'foreignField': '_id',
+                'pipeline': [{'$match': LIVE}, {'$project': {'title': 1, 'status': 1}}],
+                'as': 'task'
+            }},
+            {'$unwind': '$task'}
+        ]
+        if status:
+            pipeline.append({'$match': {'task.status': status}})
+        pipeline += [
+            {'$limit': limit},
+            {'$project': dict(COMMENT_FIELDS, score=1, task=1)}
+        ]
+        return list(db.comments.aggregate(pipeline))
     
     @staticmethod
     def update(comment_id, updates):
-        """Update a comment."""
+        """Update a comment and bump its task's comments_version."""
         db = get_db()
         updates['updated_at'] = datetime.utcnow()
-        result = db.comments.update_one(
+        comment = db.comments.find_one_and_update(
             {'_id': ObjectId(comment_id)},
-            {'$set': updates}
+            {'$set': updates},
+            return_document=ReturnDocument.AFTER
         )
-        if result.matched_count == 0:
-            return None
-        return Comments.find_by_id(comment_id)
+        if comment is not None:
+            # Counters do not change on edits, so ETags need the version
+            db.tasks.update_one(
+                {'_id': comment['task_id']},
+                {'$inc': {'comments_version': 1},
+                 '$max': {'comments_updated_at': updates['updated_at']}}
+            )
+            _task_cache.invalidate(comment['task_id'])
+            _record_stats()
+            comment_events.publish('updated', [comment])
+        return comment
     
     @staticmethod
     def delete(comment_id):
-        """Delete a comment."""
+        """Delete a comment and update its task's counters."""
+        db = get_db()
+        comment = db.comments.find_one_and_delete(
+            {'_id': ObjectId(comment_id)},
+            projection={'task_id': 1, 'created_at': 1}
+        )
+        if comment is None:
+            return False
+        now = datetime.utcnow()
+        db.tombstones.insert_one({'collection': 'comments', 'doc_id': comment['_id'],
+                                  'task_id': comment['task_id'], 'deleted_at': now})
+        task = db.tasks.find_one_and_update(
+            {'_id': comment['task_id']},
+            {'$inc': {'comment_count': -1, 'comments_version': 1},
+             '$max': {'comments_updated_at': now}},
+            projection={'last_comment_at': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if task and task.get('last_comment_at') == comment['created_at']:
+            # The newest comment went away; fall back to the next newest
+            newest = db.comments.find_one(
+                {'task_id': comment['task_id']},
+                projection={'created_at': 1},
+                sort=[('created_at', -1)]
+            )
+            db.tasks.update_one(
+                {'_id': comment['task_id']},
+                {'$set': {'last_comment_at': newest and newest['created_at']}}
+            )
+        _task_cache.invalidate(comment['task_id'])
+        _record_stats(deleted=[comment['created_at']])
+        comment_events.publish('deleted', [comment])
+        return True
+    
+    @staticmethod
+    def update_batch(updates):
+        """Apply (comment_id, updates) pairs; return updated comments by _id.
+        
+        Comments whose update failed map to None.
+        """
+        db = get_db()
+        comments = _update_batch(db.comments, updates)
+        updated = [comment for comment in comments.values() if comment is not None]
+        task_ids = {comment['task_id'] for comment in updated}
+        if task_ids:
+            db.tasks.update_many(
+                {'_id': {'$in': list(task_ids)}},
+                {'$inc': {'comments_version': 1},
+                 '$max': {'comments_updated_at': datetime.utcnow()}}
+            )
+            for task_id in task_ids:
+                _task_cache.invalidate(task_id)
+            _record_stats()
+            comment_events.publish('updated', updated)
+        return comments
+    
+    @staticmethod
+    def delete_batch(comment_ids):
+        """Delete many comments and fix their tasks' counters.
+        
+        Returns the _ids that were deleted.
+        """
+        db = get_db()
+        comments = list(db.comments.find(
+            {'_id': {'$in': list(comment_ids)}},
+            projection={'task_id': 1, 'created_at': 1}
+        ))
+        if not comments:
+            return set()
+        deleted = {c['_id'] for c in comments}
+        db.comments.delete_many({'_id': {'$in': list(deleted)}})
+        now = datetime.utcnow()
+        db.tombstones.insert_many([
+            {'collection': 'comments', 'doc_id': c['_id'], 'task_id': c['task_id'],
+             'deleted_at': now}
+            for c in comments
+        ], ordered=False)
+        removed = {}
+        for comment in comments:
+            removed[comment['task_id']] = removed.get(comment['task_id'], 0) + 1
+        # One aggregate gives the new newest comment for every touched task
+        newest = {
+            row['_id']: row['last']
+            for row in db.comments.aggregate([
+                {'$match': {'task_id': {'$in': list(removed)}}},
+                {'$group': {'_id': '$task_id', 'last': {'$max': '$created_at'}}}
+            ])
+        }
+        db.tasks.bulk_write([
+            UpdateOne(
+                {'_id': task_id},
+                {'$inc': {'comment_count': -count, 'comments_version': 1},
+                 '$set': {'last_comment_at': newest.get(task_id)},
+                 '$max': {'comments_updated_at': now}}
+            )
+            for task_id, count in removed.items()
+        ], ordered=False)
+        for task_id in removed:
+            _task_cache.invalidate(task_id)
+        _record_stats(deleted=[c['created_at'] for c in comments])
+        comment_events.publish('deleted', comments)
+        return deleted
+
+
+class Stats:
+    """Dashboard statistics, kept current in the task_stats collection.
+    
+    Task and comment writes apply their effect with $inc (_record_stats),
+    so reads fetch a handful of documents whatever the data size.
+    ``flask rebuild-stats`` recomputes them from scratch.
+    """
+    
+    @staticmethod
+    def read(days=30, most_active=10):
+        """Return the dashboard statistics.
+        
+        A dict of the live task counts by status, the comment total, the
+        comment counts of each of the last ``days`` days (UTC, oldest first,
+        zero-filled) and the ``most_active`` tasks with the most comments.
+        """
+        db = get_db()
+        today = datetime.utcnow()
+        day_list = [_day(today - timedelta(days=n)) for n in range(days - 1, -1, -1)]
+        docs = {
+            doc['_id']: doc
+            for doc in db.task_stats.find(
+                {'_id': {'$in': [STATS_TOTALS] + [f'comments:{day}' for day in day_list]}}
+            )
+        }
+        totals = docs.get(STATS_TOTALS, {})
+        # Served by the partial comment_count index, not a scan
+        active = list(db.tasks.find(
+            dict(LIVE, comment_count={'$gt': 0}),
+            {'title': 1, 'status': 1, 'comment_count': 1, 'last_comment_at': 1},
+            sort=[('comment_count', -1), ('_id', -1)],
+            limit=most_active
+        ))
+        return {
+            'tasks': totals.get('tasks', {}),
+            'comments': totals.get('comments', 0),
+            'comments_per_day': [
+                (day, docs.get(f'comments:{day}', {}).get('comments', 0))
+                for day in day_list
+            ],
+            'most_active': active
+        }
+    
+    @staticmethod
+    def rebuild():
+        """Recompute task_stats with one aggregation over tasks and comments.
+        
+        Writes racing the rebuild can be lost from the counts; run it when
+        the stats collection is first deployed and to repair drift. Returns
+        the live task counts by status and the comment total.
+        """
         db = get_db()
-        result = db.comments.delete_one({'_id': ObjectId(comment_id)})
-        return result.deleted_count > 0
\ No newline at end of file
+        rows = list(db.tasks.aggregate([
+            {'$match': LIVE},
+            {'$group': {'_id': {'status': '$status'}, 'count': {'$sum': 1}}},
+            {'$unionWith': {'coll': 'comments', 'pipeline': [
+                {'$group': {
+                    '_id': {'day': {'$dateToString': {'format': '%Y-%m-%d',
+                                                      'date': '$created_at'}}},
+                    'count': {'$sum': 1}
+                }}
+            ]}}
+        ], allowDiskUse=True))
+        tasks = {row['_id']['status']: row['count'] for row in rows if 'status' in row['_id']}
+        per_day = {row['_id']['day']: row['count'] for row in rows if 'day' in row['_id']}
+        totals = {'tasks': tasks, 'comments': sum(per_day.values())}
+        ops = [ReplaceOne({'_id': STATS_TOTALS}, totals, upsert=True)]
+        ops += [
+            ReplaceOne({'_id': f'comments:{day}'}, {'day': day, 'comments': count}, upsert=True)
+            for day, count in per_day.items()
+        ]
+        db.task_stats.bulk_write(ops, ordered=False)
+        kept = [STATS_TOTALS, STATS_LIST_VERSION] + [f'comments:{day}' for day in per_day]
+        db.task_stats.delete_many({'_id': {'$nin': kept}})
+        return totals
@@ -0,0 +1,257 @@
+"""Background purge of deleted tasks and their comments.
+
+Tasks.delete only tombstones a task. The comments are then deleted here in
+throttled batches, off the request path, and the task document is removed
+last. Every step is idempotent, so an interrupted purge is simply run again.
+
+Purges run as a Temporal workflow when ``temporal.enabled`` is set, with
+``temporal.server_address`` configured and temporalio installed, otherwise
+on a background thread in the web process. That thread starts with a resume
+pass over the tasks left tombstoned, e.g. by a crashed worker.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from backend.config import get_config
+from backend.models import Tasks
+
+try:
+    from temporalio import activity, workflow
+    from temporalio.client import Client
+    from temporalio.worker import Worker
+    from temporalio.worker.workflow_sandbox import (
+        SandboxedWorkflowRunner, SandboxRestrictions
+    )
+except ImportError:  # Temporal is optional
+    activity = workflow = Client = Worker = None
+
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = get_config('purge.batch_size', 1000)
+# Pause between batches so a large purge does not saturate the primary
+PURGE_BATCH_DELAY = get_config('purge.batch_delay_ms', 50) / 1000
+PURGE_TASK_QUEUE = 'task-purge'
+# How long a DELETE waits for Temporal before purging in-process
+TEMPORAL_SUBMIT_TIMEOUT = get_config('temporal.submit_timeout_ms', 2000) / 1000
+# Pause between connection attempts after Temporal was unreachable
+TEMPORAL_RECONNECT_INTERVAL = 30
+# Queued by InProcessPurger.start to purge the tasks left tombstoned
+RESUME = object()
+
+
+def purge_task(task_id, batch_size=PURGE_BATCH_SIZE, delay=PURGE_BATCH_DELAY,
+               progress=None):
+    """Delete a tombstoned task's comments in batches, then the task itself.
+
+    ``progress`` is called with the running total after each batch. Returns
+    the number of comments deleted by this run.
+    """
+    total = 0
+    while True:
+        deleted = Tasks.purge_comments(task_id, batch_size)
+        total += deleted
+        if progress:
+            progress(total)
+        if deleted < batch_size:
+            break
+        time.sleep(delay)
+    Tasks.finish_purge(task_id)
+    logger.info("Purged task %s and %d comment(s)", task_id, total)
+    return total
+
+
+class InProcessPurger:
+    """Run purges one at a time on a daemon thread in this process.
+
+    With ``resume``, the thread first queues the tasks already tombstoned.
+    """
+
+    def __init__(self, resume=True):
+        self.resume = resume
+        self._queue = queue.Queue()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the purge thread of this process, if not running yet."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                if self.resume:
+                    # Queued first, so join() waits for the resumed purges too
+                    self._queue.put(RESUME)
+                threading.Thread(target=self._run, name='task-purger', daemon=True).start()
+                self._pid = os.getpid()
+
+    def schedule(self, task_id):
+        """Queue a purge for a tombstoned task."""
+        self.start()
+        self._queue.put(task_id)
+
+    def join(self):
+        """Block until every queued purge has finished."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            task_id = self._queue.get()
+            try:
+                if task_id is RESUME:
+                    self._resume()
+                else:
+                    purge_task(task_id)
+            except Exception:
+                # The tombstone stays; `flask purge-tasks` resumes it
+                logger.exception("Purge of task %s failed", task_id)
+            finally:
+                self._queue.task_done()
+
+    def _resume(self):
+        try:
+            task_ids = Tasks.find_tombstoned()
+        except Exception:
+            logger.exception("Cannot resume purges; run `flask purge-tasks`")
+            return
+        if task_ids:
+            logger.info("Resuming the purge of %d task(s)", len(task_ids))
+        for task_id in task_ids:
+            self._queue.put(task_id)
+
+
+if workflow is not None:
+    @activity.defn(name='purge_task')
+    def purge_task_activity(task_id: str) -> int:
+        """Temporal activity wrapping purge_task, heartbeating progress."""
+        return purge_task(task_id, progress=activity.heartbeat)
+
+    @workflow.defn(name='PurgeTaskWorkflow')
+    class PurgeTaskWorkflow:
+        """Purge one tombstoned task, retried by Temporal until it completes."""
+
+        @workflow.run
+        async def run(self, task_id: str) -> int:
+            return await workflow.execute_activity(
+                'purge_task',
+                task_id,
+                start_to_close_timeout=timedelta(hours=2),
+                heartbeat_timeout=timedelta(minutes=2)
+            )
+
+
+class TemporalPurger:
+    """Start a PurgeTaskWorkflow per deleted task on a Temporal server.
+
+    Each process keeps one client on an event loop of its own, connected
+    on first use. After a failed connection, schedules fall back at once
+    until the next attempt, TEMPORAL_RECONNECT_INTERVAL later.
+    """
+
+    def __init__(self, address, fallback, timeout=TEMPORAL_SUBMIT_TIMEOUT):
+        self.address = address
+        self.fallback = fallback
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._client = None     # future of the connected client, on the loop
+        self._retry_at = 0
+
+    def schedule(self, task_id):
+        """Start the purge workflow, or purge in-process if Temporal is down."""
+        future = asyncio.run_coroutine_threadsafe(self._start(str(task_id)), self._get_loop())
+        try:
+            future.result(timeout=self.timeout)
+        except Exception as e:
+            # Purges are idempotent, so a start that still lands is harmless
+            future.cancel()
+            logger.warning("Cannot start the purge workflow (%s); purging task %s "
+                           "in-process", str(e) or type(e).__name__, task_id)
+            self.fallback.schedule(task_id)
+
+    def start(self):
+        """Nothing to resume: Temporal retries started workflows until they complete."""
+
+    def join(self):
+        """Wait for purges that fell back to the in-process runner."""
+        self.fallback.join()
+
+    def _get_loop(self):
+        """Get this process's client loop, started on a daemon thread."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='temporal-client',
+                                 daemon=True).start()
+                self._client = None
+                self._retry_at = 0
+                self._pid = os.getpid()
+            return self._loop
+
+    async def _get_client(self):
+        # Runs on the client loop only, so the state needs no lock
+        if self._client is None:
+            if time.monotonic() < self._retry_at:
+                raise ConnectionError("Temporal was unreachable, retrying later")
+            self._client = asyncio.ensure_future(Client.connect(self.address))
+        client = self._client
+        try:
+            # A schedule that times out must not cancel the shared connect
+            return await asyncio.shield(client)
+        except Exception:
+            if self._client is client:
+                self._client = None
+                self._retry_at = time.monotonic() + TEMPORAL_RECONNECT_INTERVAL
+            raise
+
+    async def _start(self, task_id):
+        client = await self._get_client()
+        # The workflow id makes repeated schedules of one task a no-op
+        await client.start_workflow(
+            'PurgeTaskWorkflow',
+            task_id,
+            id=f'purge-task-{task_id}',
+            task_queue=PURGE_TASK_QUEUE,
+            rpc_timeout=timedelta(seconds=self.timeout)
+        )
+
+
+def create_purger():
+    """Pick the purge runner for this environment."""
+    address = get_config('temporal.server_address')
+    if get_config('temporal.enabled', False):
+        if address and workflow is not None:
+            # The workflows of tombstoned tasks are Temporal's to finish
+            return TemporalPurger(address, InProcessPurger(resume=False))
+        logger.warning("temporal.enabled is set, but %s; purging in-process",
+                       "temporalio is not installed" if address
+                       else "temporal.server_address is not configured")
+    return InProcessPurger()
+
+
+async def run_worker():
+    """Run the Temporal worker that executes purge workflows."""
+    client = await Client.connect(get_config('temporal.server_address'))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        worker = Worker(
+            client,
+            task_queue=PURGE_TASK_QUEUE,
+            workflows=[PurgeTaskWorkflow],
+            activities=[purge_task_activity],
+            activity_executor=executor,
+            # The workflow never touches the database; let these through
+            # the sandbox instead of re-importing them per workflow run
+            workflow_runner=SandboxedWorkflowRunner(
+                restrictions=SandboxRestrictions.default.with_passthrough_modules(
+                    'backend', 'pymongo', 'bson'
+                )
+            )
+        )
+        await worker.run()
@@ -0,0 +1,191 @@
+"""Batch endpoint: several API calls in one request.
+
+POST /api/batch takes a ``requests`` list of ``{method, path, body}``
+sub-requests and runs each through the task, comment and search views in this
+process, without another HTTP round trip. Runs of consecutive GETs are
+independent and execute concurrently; every other sub-request runs alone,
+in order, so later sub-requests see earlier writes.
+
+Each sub-request is charged to admission control like a request of its
+own: a rate-limit token of the client, and an in-flight slot of its class
+(so batched task deletes still count against the cascade cap) held while
+it runs. A rejected sub-request fails alone, with the rejection's status.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, current_app, request
+from werkzeug.exceptions import HTTPException
+from backend.admission import client_key, detached_context, route_class
+from backend.config import get_config
+from backend.utils import batch_error, batch_response, error_response, parse_batch
+
+
+logger = logging.getLogger(__name__)
+
+batch_bp = Blueprint('batch', __name__, url_prefix='/api')
+
+BATCH_METHODS = ('GET', 'POST', 'PATCH', 'DELETE')
+# Blueprints whose views a sub-request may call
+BATCH_BLUEPRINTS = ('tasks', 'comments', 'search')
+# Views that never finish inside a batch
+UNBATCHABLE_ENDPOINTS = ('comments.stream_comments',)
+# Sub-requests run at once per batch
+BATCH_CONCURRENCY = get_config('batch.concurrency', 8)
+
+_executor = None
+_pid = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    """Get this process's executor for concurrent sub-requests."""
+    global _executor, _pid
+    with _lock:
+        if _executor is None or _pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY,
+                                           thread_name_prefix='batch')
+            _pid = os.getpid()
+        return _executor
+
+
+def parse_sub_request(index, item, url_map):
+    """Validate a sub-request and match it to a view.
+    
+    Returns (sub_request, error); error is the item's batch result.
+    """
+    if not isinstance(item, dict):
+        return None, batch_error(index, "Request must be an object")
+    method = item.get('method', 'GET')
+    path = item.get('path')
+    if not isinstance(method, str) or method.upper() not in BATCH_METHODS:
+        return None, batch_error(index, "Invalid method")
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        return None, batch_error(index, "path must be an /api/ URL")
+    method = method.upper()
+    
+    try:
+        endpoint, view_args = url_map.bind('').match(path.split('?', 1)[0], method)
+    except HTTPException as e:
+        return None, batch_error(index, e.name, e.code)
+    if (endpoint.split('.', 1)[0] not in BATCH_BLUEPRINTS
+            or endpoint in UNBATCHABLE_ENDPOINTS):
+        return None, batch_error(index, "This request cannot be batched")
+    
+    return {
+        'index': index,
+        'method': method,
+        'path': path,
+        'body': item.get('body'),
+        'endpoint': endpoint,
+        'view_args': view_args
+    }, None
+
+
+def plan(sub_requests):
+    """Group sub-requests into steps: runs of GETs, or a single write."""
+    steps = []
+    for sub_request in sub_requests:
+        if (sub_request['method'] == 'GET' and steps
+                and steps[-1][0]['method'] == 'GET'):
+            steps[-1].append(sub_request)
+        else:
+            steps.append([sub_request])
+    return steps
+
+
+def sub_result(index, status, body):
+    """Create the batch result of a dispatched sub-request."""
+    if status >= 400:
+        message = body.get('error') if isinstance(body, dict) else None
+        return batch_error(index, message or "Request failed", status)
+    return {'index': index, 'status': status, 'body': body}
+
+
+def admit(controller, client, sub_request):
+    """Charge a sub-request to admission control.
+    
+    Returns (route_class, error): the class whose slot is held until
+    controller.release(), None if nothing is held, and the rejection as
+    the item's batch result.
+    """
+    if not controller.enabled:
+        return None, None
+    name = route_class(sub_request['method'], sub_request['endpoint'])
+    rejection = controller.admit(client, name)
+    if rejection is not None:
+        body, status, _ = rejection
+        return None, batch_error(sub_request['index'], body['error'], status)
+    return name, None
+
+
+def dispatch(app, sub_request, client):
+    """Admit and run one sub-request; return its batch result."""
+    controller = app.extensions['admission']
+    name, error = admit(controller, client, sub_request)
+    if error:
+        return error
+    try:
+        return run_view(app, sub_request)
+    finally:
+        if name is not None:
+            controller.release(name)
+
+
+def run_view(app, sub_request):
+    """Run one sub-request through its view; return its batch result."""
+    index = sub_request['index']
+    options = {'method': sub_request['method']}
+    if sub_request['body'] is not None:
+        options['json'] = sub_request['body']
+    try:
+        with app.test_request_context(sub_request['path'], **options):
+            view = app.view_functions[sub_request['endpoint']]
+            response = app.make_response(view(**sub_request['view_args']))
+            # Streamed listings are read to the end while the context is up
+            if response.is_json:
+                body = response.get_json()
+            else:
+                body = response.get_data(as_text=True) or None
+    except HTTPException as e:
+        return batch_error(index, e.description or e.name, e.code)
+    except Exception:
+        logger.exception("Batched %s %s failed", sub_request['method'], sub_request['path'])
+        return batch_error(index, "Internal server error", 500)
+    return sub_result(index, response.status_code, body)
+
+
+def run_batch(app, items, client):
+    """Validate and run the sub-requests of ``client``; return the per-item results."""
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        sub_request, error = parse_sub_request(index, item, app.url_map)
+        if error:
+            results[index] = error
+        else:
+            valid.append(sub_request)
+    
+    for step in plan(valid):
+        if len(step) == 1:
+            outcomes = [detached_context().run(dispatch, app, step[0], client)]
+        else:
+            futures = [get_executor().submit(detached_context().run, dispatch, app, sub, client)
+                       for sub in step]
+            outcomes = [future.result() for future in futures]
+        for sub_request, outcome in zip(step, outcomes):
+            results[sub_request['index']] = outcome
+    return results
+
+
+@batch_bp.route('/batch', methods=['POST'])
+def run_requests():
+    """Run several API calls from a ``requests`` list of ``{method, path, body}``."""
+    items, error = parse_batch(request, 'requests', current_app.config['MAX_BATCH_REQUESTS'])
+    if error:
+        return error_response(error, 400)
+    
+    return batch_response(
+        run_batch(current_app._get_current_object(), items, client_key(request))
+    )
@@ -1,103 +1,296 @@
-"""Comment CRUD endpoints."""
-from flask import Blueprint, request, jsonify
-from backend.models import Tasks, Comments
-
+"""Comment CRUD endpoints.
 
+As in backend.routes.tasks, the ``handle_*`` functions are shared with the
+Quart app (backend.aio.routes.comments).
+"""
+from flask import Blueprint, current_app, request
+from backend.events import Subscriber, comment_events, event_stream
+from backend.models import Tasks, Comments, COMMENT_LIST_VERSION_FIELDS
 from backend.utils import (
-    jsonify_comment, oid, parse_pagination, error_response
+    jsonify_comment, jsonify_comments, oid, parse_pagination, parse_cursor,
+    parse_fields, encode_cursor, make_etag, is_not_modified,
+    not_modified_response, with_validators, COMMENT_FIELD_CONVERTERS,
+    validate_batch, batch_error, batch_response, error_response, event_stream_response,
+    parse_since, is_sync_expired, sync_token
 )
 
 
 comments_bp = Blueprint('comments', __name__, url_prefix='/api')
 
 
-@comments_bp.route('/tasks/<task_id>/comments', methods=['POST'])
-def create_comment(task_id):
-    """Create a comment for a task."""
+def parse_new_comment(data):
+    """Validate the fields of a comment to create. Returns (fields, error)."""
+    body = data.get('body', '')
+    if not isinstance(body, str):
+        return None, "Body must be a string"
+    body = body.strip()
+    if not body:
+        return None, "Body is required and cannot be empty"
+    
+    author = data.get('author')
+    if author is not None and not isinstance(author, str):
+        return None, "Author must be a string"
+    return {'body': body, 'author': (author or '').strip() or None}, None
+
+
+def parse_comment_updates(data):
+    """Validate the fields of a comment update. Returns (updates, error)."""
+    updates = {}
+    
+    if 'body' in data:
+        if not isinstance(data['body'], str):
+            return None, "Body must be a string"
+        body = data['body'].strip()
+        if not body:
+            return None, "Body cannot be empty"
+        updates['body'] = body
+    
+    if 'author' in data:
+        author = data['author']
+        if author is not None and not isinstance(author, str):
+            return None, "Author must be a string"
+        updates['author'] = (author or '').strip() or None
+    
+    if not updates:
+        return None, "At least one field (body or author) is required"
+    
+    return updates, None
+
+
+def handle_create_comment(app, task_id, data):
+    """Create a comment from the decoded body of POST /api/tasks/<task_id>/comments."""
     task_oid = oid(task_id)
     if not task_oid:
         return error_response("Invalid task ID", 400)
     
-    # Verify task exists
-    task = Tasks.find_by_id(task_oid)
-    if not task:
-        return error_response("Task not found", 404)
-    
-    data = request.get_json()
     if not data:
         return error_response("Request body is required", 400)
+    if not isinstance(data, dict):
+        return error_response("Request body must be an object", 400)
     
-    body = data.get('body', '').strip()
-    if not body:
-        return error_response("Body is required and cannot be empty", 400)
+    fields, error = parse_new_comment(data)
+    if error:
+        return error_response(error, 400)
+    
+    comment = Comments.create(task_oid, **fields)
+    if not comment:
+        return error_response("Task not found", 404)
+    return app.json.response(jsonify_comment(comment)), 201
+
+
+@comments_bp.route('/tasks/<task_id>/comments', methods=['POST'])
+def create_comment(task_id):
+    """Create a comment for a task."""
+    return handle_create_comment(current_app, task_id, request.get_json())
+
+
+def run_create_batch(task_oid, items):
+    """Validate and create a batch of comments on a task.
+    
+    Returns the per-item results, or None if the task does not exist.
+    """
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = batch_error(index, "Comment must be an object")
+            continue
+        fields, error = parse_new_comment(item)
+        if error:
+            results[index] = batch_error(index, error)
+        else:
+            valid.append((index, fields))
     
-    author = data.get('author', '').strip() or None
+    if valid:
+        comments = Comments.create_batch(task_oid, [fields for _, fields in valid])
+        if comments is None:
+            return None
+    else:
+        comments = []
     
-    comment = Comments.create(task_oid, body, author)
-    return jsonify(jsonify_comment(comment)), 201
+    for (index, _), comment in zip(valid, comments):
+        if comment is None:
+            results[index] = batch_error(index, "Comment could not be created", 500)
+        else:
+            results[index] = {'index': index, 'status': 201,
+                              'comment': jsonify_comment(comment)}
+    return results
 
 
-@comments_bp.route('/tasks/<task_id>/comments', methods=['GET'])
-def list_comments(task_id):
-    """List comments for a task with pagination."""
+def handle_create_comments_batch(app, task_id, data):
+    """Run POST /api/tasks/<task_id>/comments:batch on its decoded body."""
     task_oid = oid(task_id)
     if not task_oid:
         return error_response("Invalid task ID", 400)
     
-    # Verify task exists
-    task = Tasks.find_by_id(task_oid)
+    items, error = validate_batch(data, 'comments', app.config['MAX_BATCH_SIZE'])
+    if error:
+        return error_response(error, 400)
+    
+    results = run_create_batch(task_oid, items)
+    if results is None:
+        return error_response("Task not found", 404)
+    return batch_response(results)
+
+
+@comments_bp.route('/tasks/<task_id>/comments:batch', methods=['POST'])
+def create_comments_batch(task_id):
+    """Create many comments on a task at once from a ``comments`` list."""
+    return handle_create_comments_batch(current_app, task_id, request.get_json(silent=True))
+
+
+def comment_changes(task_oid, since, fields=None):
+    """Build the delta sync body: comments of a task changed and deleted since ``since``."""
+    token = sync_token()
+    comments, deleted = Comments.changes_since(task_oid, since, fields)
+    return {
+        'comments': jsonify_comments(comments, fields),
+        'deleted': [str(comment_id) for comment_id in deleted],
+        'sync_token': token
+    }
+
+
+def handle_list_comments(app, request, task_id):
+    """Answer GET /api/tasks/<task_id>/comments."""
+    task_oid = oid(task_id)
+    if not task_oid:
+        return error_response("Invalid task ID", 400)
+    
+    # Verify task exists. The validators and count come from this read,
+    # not the task cache, which can lag comment writes of other workers
+    task = Tasks.find_versions(task_oid, COMMENT_LIST_VERSION_FIELDS)
     if not task:
         return error_response("Task not found", 404)
     
+    fields, error = parse_fields(request, COMMENT_FIELD_CONVERTERS)
+    if error:
+        return error_response(error, 400)
+    
+    since, error = parse_since(request)
+    if error:
+        return error_response(error, 400)
+    if since is not None:
+        if any(arg in request.args for arg in ('limit', 'offset', 'cursor')):
+            return error_response("since cannot be combined with paging", 400)
+        if is_sync_expired(since):
+            return error_response("Sync token expired; reload the full list", 410)
+        return app.json.response(comment_changes(task_oid, since, fields)), 200
+    
     limit, offset, error = parse_pagination(request)
     if error:
         return error_response(error, 400)
     
-    comments, total = Comments.find_by_task(task_oid, limit, offset)
+    cursor, error = parse_cursor(request)
+    if error:
+        return error_response(error, 400)
+    
+    # The task's comments_version changes with every comment write, so
+    # unchanged lists are answered without reading any comment
+    etag = last_modified = None
+    if task.get('comments_version') is not None:
+        etag = make_etag(task_oid, task['comments_version'], task.get('comment_count'),
+                         request.query_string)
+        last_modified = task.get('comments_updated_at')
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(app, etag, last_modified)
+    
+    # Counter is kept on the task; only legacy tasks need a count query
+    total = task.get('comment_count')
+    if total is None:
+        total = Comments.count_by_task(task_oid)
     
-    return jsonify({
-        'comments': [jsonify_comment(c) for c in comments],
+    # Fetch one extra comment to know whether another page exists
+    token = sync_token()
+    comments = Comments.find_by_task(task_oid, limit + 1, offset, cursor, fields)
+    has_more = len(comments) > limit
+    comments = comments[:limit]
+    
+    response = app.json.response({
+        'comments': jsonify_comments(comments, fields),
         'count': total,
         'limit': limit,
-        'offset': offset
-    }), 200
+        'offset': offset,
+        'next_cursor': encode_cursor(comments[-1]) if has_more else None
+    })
+    response.headers['X-Sync-Token'] = token
+    if etag:
+        with_validators(response, etag, last_modified)
+    return response, 200
 
 
-@comments_bp.route('/comments/<comment_id>', methods=['PATCH'])
-def update_comment(comment_id):
-    """Update a comment."""
+@comments_bp.route('/tasks/<task_id>/comments', methods=['GET'])
+def list_comments(task_id):
+    """List comments for a task with pagination.
+    
+    Pages carry an X-Sync-Token header; passing it back as ``since``
+    returns only the comments changed and deleted since.
+    """
+    return handle_list_comments(current_app, request, task_id)
+
+
+def subscribe_comments(request, subscriber):
+    """Subscribe to a task's comment events; return the events to replay first.
+    
+    Subscribes before replaying so nothing falls between the two.
+    """
+    comment_events.subscribe(subscriber)
+    last_event_id = request.headers.get('Last-Event-ID')
+    return comment_events.replay(subscriber.task_id, last_event_id) if last_event_id else []
+
+
+@comments_bp.route('/tasks/<task_id>/comments/stream', methods=['GET'])
+def stream_comments(task_id):
+    """Push created/updated/deleted comment events of a task (Server-Sent Events).
+    
+    Clients reconnecting with Last-Event-ID get the events they missed, or
+    a ``reset`` event when those are gone and the list must be refetched.
+    
+    Each open stream holds a worker thread here, so admission caps them at
+    ``admission.max_in_flight.sync_stream`` per worker. Deployments with
+    many open tabs serve streams from the async app (backend.aio.app).
+    """
+    task_oid = oid(task_id)
+    if not task_oid:
+        return error_response("Invalid task ID", 400)
+    
+    if not Tasks.find_by_id(task_oid):
+        return error_response("Task not found", 404)
+    
+    subscriber = Subscriber(task_oid)
+    replayed = subscribe_comments(request, subscriber)
+    return event_stream_response(event_stream(subscriber, replayed))
+
+
+def handle_update_comment(app, comment_id, data):
+    """Apply the decoded body of PATCH /api/comments/<comment_id>."""
     comment_oid = oid(comment_id)
     if not comment_oid:
         return error_response("Invalid comment ID", 400)
     
-    data = request.get_json()
     if not data:
         return error_response("Request body is required", 400)
+    if not isinstance(data, dict):
+        return error_response("Request body must be an object", 400)
     
-    updates = {}
-    
-    if 'body' in data:
-        body = data['body'].strip()
-        if not body:
-            return error_response("Body cannot be empty", 400)
-        updates['body'] = body
-    
-    if 'author' in data:
-        updates['author'] = data['author'].strip() or None
-    
-    if not updates:
-        return error_response("At least one field (body or author) is required", 400)
+    updates, error = parse_comment_updates(data)
+    if error:
+        return error_response(error, 400)
     
     comment = Comments.update(comment_oid, updates)
     if not comment:
         return error_response("Comment not found", 404)
     
-    return jsonify(jsonify_comment(comment)), 200
+    return app.json.response(jsonify_comment(comment)), 200
 
 
-@comments_bp.route('/comments/<comment_id>', methods=['DELETE'])
-def delete_comment(comment_id):
-    """Delete a comment."""
+@comments_bp.route('/comments/<comment_id>', methods=['PATCH'])
+def update_comment(comment_id):
+    """Update a comment."""
+    return handle_update_comment(current_app, comment_id, request.get_json())
+
+
+def handle_delete_comment(comment_id):
+    """Answer DELETE /api/comments/<comment_id>."""
     comment_oid = oid(comment_id)
     if not comment_oid:
         return error_response("Invalid comment ID", 400)
@@ -106,4 +299,88 @@ def delete_comment(comment_id):
     if not deleted:
         return error_response("Comment not found", 404)
     
-    return '', 204
\ No newline at end of file
+    return '', 204
+
+
+@comments_bp.route('/comments/<comment_id>', methods=['DELETE'])
+def delete_comment(comment_id):
+    """Delete a comment."""
+    return handle_delete_comment(comment_id)
+
+
+def run_update_batch(items):
+    """Validate and apply a batch of comment updates; return the per-item results."""
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        comment_oid = oid(item.get('_id')) if isinstance(item, dict) else None
+        if not comment_oid:
+            results[index] = batch_error(index, "Invalid comment ID")
+            continue
+        updates, error = parse_comment_updates(
+            {k: v for k, v in item.items() if k != '_id'}
+        )
+        if error:
+            results[index] = batch_error(index, error)
+        else:
+            valid.append((index, comment_oid, updates))
+    
+    comments = Comments.update_batch(
+        [(comment_oid, updates) for _, comment_oid, updates in valid]
+    )
+    for index, comment_oid, _ in valid:
+        comment = comments.get(comment_oid)
+        if comment_oid not in comments:
+            results[index] = batch_error(index, "Comment not found", 404)
+        elif comment is None:
+            results[index] = batch_error(index, "Comment could not be updated", 500)
+        else:
+            results[index] = {'index': index, 'status': 200,
+                              'comment': jsonify_comment(comment)}
+    return results
+
+
+def run_delete_batch(items):
+    """Delete a batch of comments; return the per-item results."""
+    comment_oids = [oid(item) if isinstance(item, str) else None for item in items]
+    deleted = Comments.delete_batch({c for c in comment_oids if c})
+    
+    results = []
+    for index, comment_oid in enumerate(comment_oids):
+        if not comment_oid:
+            results.append(batch_error(index, "Invalid comment ID"))
+        elif comment_oid in deleted:
+            results.append({'index': index, 'status': 204, '_id': str(comment_oid)})
+        else:
+            results.append(batch_error(index, "Comment not found", 404))
+    return results
+
+
+def handle_update_comments_batch(app, data):
+    """Run PATCH /api/comments:batch on its decoded body."""
+    items, error = validate_batch(data, 'comments', app.config['MAX_BATCH_SIZE'])
+    if error:
+        return error_response(error, 400)
+    
+    return batch_response(run_update_batch(items))
+
+
+def handle_delete_comments_batch(app, data):
+    """Run DELETE /api/comments:batch on its decoded body."""
+    items, error = validate_batch(data, 'ids', app.config['MAX_BATCH_SIZE'])
+    if error:
+        return error_response(error, 400)
+    
+    return batch_response(run_delete_batch(items))
+
+
+@comments_bp.route('/comments:batch', methods=['PATCH'])
+def update_comments_batch():
+    """Update many comments at once from a ``comments`` list of objects with ``_id``."""
+    return handle_update_comments_batch(current_app, request.get_json(silent=True))
+
+
+@comments_bp.route('/comments:batch', methods=['DELETE'])
+def delete_comments_batch():
+    """Delete many comments at once from an ``ids`` list."""
+    return handle_delete_comments_batch(current_app, request.get_json(silent=True))
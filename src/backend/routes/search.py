@@ -0,0 +1,97 @@
+"""Full-text search endpoint."""
+from flask import Blueprint, current_app, request
+from backend.routes.tasks import STATUSES
+from backend.search import SEARCH_TYPES, Query, hit_snippet
+from backend.utils import (
+    jsonify_task, jsonify_comment, parse_pagination, decode_score_cursor,
+    encode_score_cursor, error_response
+)
+
+
+search_bp = Blueprint('search', __name__, url_prefix='/api')
+
+# Longest query accepted, in characters
+MAX_QUERY_LENGTH = 200
+
+
+def parse_search(request):
+    """Validate the parameters of a search. Returns (options, error)."""
+    text = request.args.get('q', '').strip()
+    if not text:
+        return None, "q is required"
+    if len(text) > MAX_QUERY_LENGTH:
+        return None, f"q cannot be longer than {MAX_QUERY_LENGTH} characters"
+    
+    status = request.args.get('status')
+    if status is not None and status not in STATUSES:
+        return None, "Invalid status"
+    
+    types = SEARCH_TYPES
+    if 'type' in request.args:
+        if request.args['type'] not in SEARCH_TYPES:
+            return None, "Invalid type"
+        types = (request.args['type'],)
+    
+    if 'offset' in request.args:
+        return None, "Search results are paged with cursor, not offset"
+    limit, _, error = parse_pagination(request)
+    if error:
+        return None, error
+    
+    after = None
+    if request.args.get('cursor'):
+        after = decode_score_cursor(request.args['cursor'])
+        if after is None:
+            return None, "Invalid cursor"
+    
+    return {'text': text, 'status': status, 'types': types, 'after': after,
+            'limit': limit}, None
+
+
+def run_search(backend, text, status=None, types=SEARCH_TYPES, after=None, limit=20):
+    """Search with ``backend`` and build the page of results."""
+    # Fetch one extra hit to know whether another page exists
+    hits = backend.search(text, status, types, after, limit + 1)
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+    
+    query = Query(text)
+    results = []
+    for hit in hits:
+        result = {'type': hit['type'], '_id': str(hit['_id']), 'score': hit['score'],
+                  'snippet': hit_snippet(hit, query)}
+        if hit['type'] == 'task':
+            result['task'] = jsonify_task(hit['doc'])
+        else:
+            result['comment'] = jsonify_comment(hit['doc'])
+            result['task'] = {'_id': str(hit['task']['_id']), 'title': hit['task']['title'],
+                              'status': hit['task']['status']}
+        results.append(result)
+    return {
+        'results': results,
+        'limit': limit,
+        'next_cursor': encode_score_cursor(hits[-1]['score'], hits[-1]['_id'])
+                       if has_more else None
+    }
+
+
+def handle_search(app, request):
+    """Answer GET /api/search; shared with the Quart app."""
+    options, error = parse_search(request)
+    if error:
+        return error_response(error, 400)
+    
+    return app.json.response(run_search(app.extensions['search'], **options)), 200
+
+
+@search_bp.route('/search', methods=['GET'])
+def search():
+    """Search tasks and comments, most relevant first.
+    
+    ``q`` takes $text syntax (words, "phrases", -excluded words);
+    ``status`` keeps tasks, and comments on tasks, with that status and
+    ``type`` (task or comment) one kind of result. Each result carries an
+    HTML ``snippet`` with the matches in <mark>; pages continue with
+    ``cursor``.
+    """
+    return handle_search(current_app, request)
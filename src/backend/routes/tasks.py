@@ -1,95 +1,522 @@
-"""Task CRUD endpoints."""
-from flask import Blueprint, request, jsonify
-from bson.errors import InvalidId
-from backend.models import Tasks
-from backend.utils import jsonify_task, oid, error_response
+"""Task CRUD endpoints.
+
+The ``handle_*`` functions do the work of the views and are shared with
+the Quart app (backend.aio.routes.tasks). They take the app and request
+explicitly and block on the database, so the async views run them on the
+database executor.
+"""
+from functools import partial
+from flask import Blueprint, current_app, request
+from backend.models import Stats, Tasks, TASK_FILTERS, DEFAULT_TASK_SORT
+from backend.utils import (
+    jsonify_task, jsonify_tasks, oid, parse_pagination, parse_cursor,
+    parse_fields, parse_datetime, encode_cursor, make_etag, is_not_modified,
+    not_modified_response, with_validators, TASK_FIELD_CONVERTERS,
+    stream_json_array, stream_ndjson, validate_batch, batch_error,
+    batch_response, error_response, parse_since, is_sync_expired, sync_token,
+    parse_ids, parse_include, jsonify_tasks_with_comments, to_iso, EPOCH,
+    STREAM_BATCH_SIZE
+)
 
 
 tasks_bp = Blueprint('tasks', __name__, url_prefix='/api')
 
+STATUSES = ['todo', 'in_progress', 'done']
+SORT_FIELDS = ['created_at', 'updated_at']
+# Parameters a multi-get (?ids=) cannot be combined with
+SELECTION_ARGS = ['limit', 'offset', 'cursor', 'format', 'sort', *TASK_FILTERS]
+# Parameters a delta sync (?since=) cannot be combined with
+LISTING_ARGS = [*SELECTION_ARGS, 'ids', 'include', 'comments_limit']
+
+
+def parse_new_task(data):
+    """Validate the fields of a task to create. Returns (fields, error)."""
+    title = data.get('title', '')
+    if not isinstance(title, str):
+        return None, "Title must be a string"
+    title = title.strip()
+    if not title:
+        return None, "Title is required"
+    
+    description = data.get('description')
+    if description is not None and not isinstance(description, str):
+        return None, "Description must be a string"
+    description = (description or '').strip() or None
+    status = data.get('status', 'todo')
+    
+    if status not in STATUSES:
+        return None, "Invalid status"
+    
+    return {'title': title, 'description': description, 'status': status}, None
+
+
+def parse_task_updates(data):
+    """Validate the fields of a task update. Returns (updates, error)."""
+    updates = {}
+    
+    if 'title' in data:
+        if not isinstance(data['title'], str):
+            return None, "Title must be a string"
+        title = data['title'].strip()
+        if not title:
+            return None, "Title cannot be empty"
+        updates['title'] = title
+    
+    if 'description' in data:
+        description = data['description']
+        if description is not None and not isinstance(description, str):
+            return None, "Description must be a string"
+        updates['description'] = (description or '').strip() or None
+    
+    if 'status' in data:
+        if data['status'] not in STATUSES:
+            return None, "Invalid status"
+        updates['status'] = data['status']
+    
+    if not updates:
+        return None, "At least one field is required"
+    
+    return updates, None
+
+
+def parse_task_query(args):
+    """Validate the filter and sort parameters of a task listing.
+    
+    Returns (filters, sort, error). Combinations that no index serves are
+    rejected rather than answered with a collection scan.
+    """
+    filters = {}
+    for name in TASK_FILTERS:
+        value = args.get(name)
+        if value is None:
+            continue
+        if name == 'status':
+            if value not in STATUSES:
+                return None, None, "Invalid status"
+            filters[name] = value
+        else:
+            filters[name] = parse_datetime(value)
+            if filters[name] is None:
+                return None, None, f"Invalid {name} date"
+    
+    value = args.get('sort', '-created_at')
+    field = value.lstrip('-')
+    if field not in SORT_FIELDS or value.count('-') > 1:
+        return None, None, "Invalid sort"
+    sort = (field, -1 if value.startswith('-') else 1)
+    
+    if not Tasks.is_indexed(filters, sort):
+        return None, None, f"Cannot combine {', '.join(sorted(filters))} with sort={value}"
+    return filters, sort, None
+
+
+def handle_create_task(app, data):
+    """Create a task from the decoded body of POST /api/tasks."""
+    if not data:
+        return error_response("Request body is required", 400)
+    if not isinstance(data, dict):
+        return error_response("Request body must be an object", 400)
+    
+    fields, error = parse_new_task(data)
+    if error:
+        return error_response(error, 400)
+    
+    task = Tasks.create(**fields)
+    return app.json.response(jsonify_task(task)), 201
+
 
 @tasks_bp.route('/tasks', methods=['POST'])
 def create_task():
     """Create a new task."""
-    data = request.get_json()
-    if not data:
-        return error_response("Request body is required", 400)
+    return handle_create_task(current_app, request.get_json())
+
+
+def run_create_batch(items):
+    """Validate and create a batch of tasks; return the per-item results."""
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = batch_error(index, "Task must be an object")
+            continue
+        fields, error = parse_new_task(item)
+        if error:
+            results[index] = batch_error(index, error)
+        else:
+            valid.append((index, fields))
     
-    title = data.get('title', '').strip()
-    if not title:
-        return error_response("Title is required", 400)
+    tasks = Tasks.create_batch([fields for _, fields in valid])
+    for (index, _), task in zip(valid, tasks):
+        if task is None:
+            results[index] = batch_error(index, "Task could not be created", 500)
+        else:
+            results[index] = {'index': index, 'status': 201, 'task': jsonify_task(task)}
+    return results
+
+
+def run_update_batch(items):
+    """Validate and apply a batch of task updates; return the per-item results."""
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        task_oid = oid(item.get('_id')) if isinstance(item, dict) else None
+        if not task_oid:
+            results[index] = batch_error(index, "Invalid task ID")
+            continue
+        updates, error = parse_task_updates({k: v for k, v in item.items() if k != '_id'})
+        if error:
+            results[index] = batch_error(index, error)
+        else:
+            valid.append((index, task_oid, updates))
     
-    description = data.get('description', '').strip() or None
-    status = data.get('status', 'todo')
+    tasks = Tasks.update_batch([(task_oid, updates) for _, task_oid, updates in valid])
+    for index, task_oid, _ in valid:
+        task = tasks.get(task_oid)
+        if task_oid not in tasks:
+            results[index] = batch_error(index, "Task not found", 404)
+        elif task is None:
+            results[index] = batch_error(index, "Task could not be updated", 500)
+        else:
+            results[index] = {'index': index, 'status': 200, 'task': jsonify_task(task)}
+    return results
+
+
+def run_delete_batch(items, purger):
+    """Delete a batch of tasks, scheduling their purges; return the results."""
+    task_oids = [oid(item) if isinstance(item, str) else None for item in items]
+    deleted = Tasks.delete_batch({task_oid for task_oid in task_oids if task_oid})
+    for task_oid in deleted:
+        purger.schedule(task_oid)
     
-    if status not in ['todo', 'in_progress', 'done']:
-        return error_response("Invalid status", 400)
+    results = []
+    for index, task_oid in enumerate(task_oids):
+        if not task_oid:
+            results.append(batch_error(index, "Invalid task ID"))
+        elif task_oid in deleted:
+            results.append({'index': index, 'status': 204, '_id': str(task_oid)})
+        else:
+            results.append(batch_error(index, "Task not found", 404))
+    return results
+
+
+def handle_create_tasks_batch(app, data):
+    """Run POST /api/tasks:batch on its decoded body."""
+    items, error = validate_batch(data, 'tasks', app.config['MAX_BATCH_SIZE'])
+    if error:
+        return error_response(error, 400)
     
-    task = Tasks.create(title, description, status)
-    return jsonify(jsonify_task(task)), 201
+    return batch_response(run_create_batch(items))
+
+
+def handle_update_tasks_batch(app, data):
+    """Run PATCH /api/tasks:batch on its decoded body."""
+    items, error = validate_batch(data, 'tasks', app.config['MAX_BATCH_SIZE'])
+    if error:
+        return error_response(error, 400)
+    
+    return batch_response(run_update_batch(items))
+
+
+def handle_delete_tasks_batch(app, data):
+    """Run DELETE /api/tasks:batch on its decoded body."""
+    items, error = validate_batch(data, 'ids', app.config['MAX_BATCH_SIZE'])
+    if error:
+        return error_response(error, 400)
+    
+    return batch_response(run_delete_batch(items, app.extensions['task_purger']))
+
+
+@tasks_bp.route('/tasks:batch', methods=['POST'])
+def create_tasks_batch():
+    """Create many tasks at once from a ``tasks`` list."""
+    return handle_create_tasks_batch(current_app, request.get_json(silent=True))
+
+
+@tasks_bp.route('/tasks:batch', methods=['PATCH'])
+def update_tasks_batch():
+    """Update many tasks at once from a ``tasks`` list of objects with ``_id``."""
+    return handle_update_tasks_batch(current_app, request.get_json(silent=True))
+
+
+@tasks_bp.route('/tasks:batch', methods=['DELETE'])
+def delete_tasks_batch():
+    """Delete many tasks (and their comments) from an ``ids`` list."""
+    return handle_delete_tasks_batch(current_app, request.get_json(silent=True))
+
+
+def handle_list_tasks(app, request, stream_json_array=stream_json_array,
+                      stream_ndjson=stream_ndjson):
+    """Answer GET /api/tasks.
+    
+    Full listings stream through ``stream_json_array``/``stream_ndjson``;
+    the async app passes the variants that read the cursor off its loop.
+    """
+    fields, error = parse_fields(request, TASK_FIELD_CONVERTERS)
+    if error:
+        return error_response(error, 400)
+    
+    since, error = parse_since(request)
+    if error:
+        return error_response(error, 400)
+    if since is not None:
+        if any(arg in request.args for arg in LISTING_ARGS):
+            return error_response("since cannot be combined with paging, format, "
+                                  "filters or sort", 400)
+        if is_sync_expired(since):
+            return error_response("Sync token expired; reload the full list", 410)
+        return app.json.response(task_changes(since, fields)), 200
+    
+    comments_limit, error = parse_include(request)
+    if error:
+        return error_response(error, 400)
+    
+    ids, error = parse_ids(request, app.config['MAX_BATCH_SIZE'])
+    if error:
+        return error_response(error, 400)
+    if ids is not None:
+        if any(arg in request.args for arg in SELECTION_ARGS):
+            return error_response("ids cannot be combined with paging, format, "
+                                  "filters or sort", 400)
+        return list_tasks_by_ids(app, request, ids, fields, comments_limit)
+    
+    filters, sort, error = parse_task_query(request.args)
+    if error:
+        return error_response(error, 400)
+    
+    if any(arg in request.args for arg in ('limit', 'offset', 'cursor')):
+        return list_tasks_page(app, request, fields, filters, sort, comments_limit)
+    
+    fmt = request.args.get('format', 'json')
+    if fmt not in ['json', 'ndjson']:
+        return error_response("Invalid format", 400)
+    
+    # Validate against a summary of the collection before reading any task
+    stamp = Tasks.list_stamp()
+    etag = make_etag(sorted(stamp.items()), request.query_string)
+    if is_not_modified(request, etag):
+        return not_modified_response(app, etag)
+    
+    token = sync_token()
+    tasks = Tasks.iter_all(batch_size=STREAM_BATCH_SIZE, fields=fields,
+                           filters=filters, sort=sort, comments_limit=comments_limit)
+    serialize = partial(jsonify_tasks_with_comments if comments_limit else jsonify_tasks,
+                        fields=fields)
+    if fmt == 'ndjson':
+        response = app.response_class(stream_ndjson(tasks, serialize),
+                                      mimetype='application/x-ndjson')
+    else:
+        response = app.response_class(stream_json_array(tasks, serialize),
+                                      mimetype='application/json')
+    response.headers['X-Sync-Token'] = token
+    return with_validators(response, etag), 200
 
 
 @tasks_bp.route('/tasks', methods=['GET'])
 def list_tasks():
-    """List all tasks."""
-    tasks = Tasks.find_all()
-    return jsonify([jsonify_task(task) for task in tasks]), 200
+    """List tasks, newest first.
+    
+    With ``limit``/``offset``/``cursor`` a single page is returned. Otherwise
+    all tasks are streamed from the database cursor, as a JSON array or as
+    NDJSON when ``format=ndjson``. ``fields`` selects a sparse fieldset;
+    ``status``, ``created_after``, ``updated_after`` and ``sort`` (e.g.
+    ``-updated_at``) filter and order the tasks.
+    
+    ``ids`` (comma-separated) fetches just those tasks, in that order.
+    ``include=comments`` embeds each task's newest ``comments_limit``
+    comments, so a board renders in one round trip.
+    
+    Listings carry an X-Sync-Token header; passing it back as ``since``
+    returns only the tasks changed and deleted since (see task_changes).
+    """
+    return handle_list_tasks(current_app, request)
 
 
-@tasks_bp.route('/tasks/<task_id>', methods=['GET'])
-def get_task(task_id):
-    """Get a specific task."""
+def tasks_etag(tasks, query_string):
+    """ETag of a list of tasks: it changes when any task or its comments do."""
+    return make_etag(query_string, *(
+        (t['_id'], t['updated_at'], t.get('comment_count'), t.get('comments_version'))
+        for t in tasks
+    ))
+
+
+def list_tasks_by_ids(app, request, ids, fields=None, comments_limit=None):
+    """Return the live tasks among ``ids`` as a JSON array."""
+    tasks = Tasks.find_many(ids, fields, comments_limit)
+    etag = tasks_etag(tasks, request.query_string)
+    if is_not_modified(request, etag):
+        return not_modified_response(app, etag)
+    
+    serialize = jsonify_tasks_with_comments if comments_limit else jsonify_tasks
+    return with_validators(app.json.response(serialize(tasks, fields)), etag), 200
+
+
+def list_tasks_page(app, request, fields=None, filters=None, sort=DEFAULT_TASK_SORT,
+                    comments_limit=None):
+    """Return one page of tasks."""
+    limit, offset, error = parse_pagination(request)
+    if error:
+        return error_response(error, 400)
+    
+    cursor, error = parse_cursor(request, sort)
+    if error:
+        return error_response(error, 400)
+    
+    # Fetch one extra task to know whether another page exists
+    token = sync_token()
+    tasks = Tasks.find_all(limit + 1, offset, cursor, fields, filters, sort, comments_limit)
+    
+    # A page is unchanged if all its tasks (plus the lookahead) are
+    etag = tasks_etag(tasks, request.query_string)
+    if is_not_modified(request, etag):
+        return not_modified_response(app, etag)
+    
+    has_more = len(tasks) > limit
+    tasks = tasks[:limit]
+    
+    serialize = jsonify_tasks_with_comments if comments_limit else jsonify_tasks
+    response = app.json.response({
+        'tasks': serialize(tasks, fields),
+        'limit': limit,
+        'offset': offset,
+        'next_cursor': encode_cursor(tasks[-1], sort) if has_more else None
+    })
+    response.headers['X-Sync-Token'] = token
+    return with_validators(response, etag), 200
+
+
+def task_changes(since, fields=None):
+    """Build the delta sync body: tasks changed and deleted since ``since``."""
+    token = sync_token()
+    tasks, deleted = Tasks.changes_since(since, fields)
+    return {
+        'tasks': jsonify_tasks(tasks, fields),
+        'deleted': [str(task_id) for task_id in deleted],
+        'sync_token': token
+    }
+
+
+def parse_stats_query(args):
+    """Validate ``days`` and ``top`` of the stats endpoint. Returns (days, top, error)."""
+    try:
+        days = int(args.get('days', 30))
+        top = int(args.get('top', 10))
+    except ValueError:
+        return None, None, "Invalid stats parameters"
+    
+    if not 1 <= days <= 365:
+        return None, None, "days must be between 1 and 365"
+    if not 1 <= top <= 100:
+        return None, None, "top must be between 1 and 100"
+    
+    return days, top, None
+
+
+def task_stats(days, top):
+    """Build the dashboard statistics body from the task_stats collection."""
+    stats = Stats.read(days, top)
+    by_status = dict.fromkeys(STATUSES, 0)
+    by_status.update(stats['tasks'])
+    return {
+        'tasks': {'total': sum(by_status.values()), 'by_status': by_status},
+        'comments': {
+            'total': stats['comments'],
+            'per_day': [{'day': day, 'count': count}
+                        for day, count in stats['comments_per_day']]
+        },
+        'most_active': [
+            {
+                '_id': str(task['_id']),
+                'title': task['title'],
+                'status': task['status'],
+                'comment_count': task['comment_count'],
+                'last_comment_at': to_iso(task.get('last_comment_at'))
+            }
+            for task in stats['most_active']
+        ]
+    }
+
+
+def handle_get_task_stats(app, request):
+    """Answer GET /api/tasks/stats."""
+    days, top, error = parse_stats_query(request.args)
+    if error:
+        return error_response(error, 400)
+    
+    return app.json.response(task_stats(days, top)), 200
+
+
+@tasks_bp.route('/tasks/stats', methods=['GET'])
+def get_task_stats():
+    """Task counts by status, comments per day and the most commented tasks.
+    
+    Reads a few precomputed documents (see backend.models.Stats), whatever
+    the number of tasks and comments.
+    """
+    return handle_get_task_stats(current_app, request)
+
+
+def handle_get_task(app, request, task_id):
+    """Answer GET /api/tasks/<task_id>."""
     task_oid = oid(task_id)
     if not task_oid:
         return error_response("Invalid task ID", 400)
     
-    task = Tasks.find_by_id(task_oid)
+    fields, error = parse_fields(request, TASK_FIELD_CONVERTERS)
+    if error:
+        return error_response(error, 400)
+    
+    # Whole documents are cached, so the fieldset is applied on output;
+    # they are validated first so the ETag is never older than the task
+    task = Tasks.find_by_id(task_oid, validate=True)
     if not task:
         return error_response("Task not found", 404)
     
-    return jsonify(jsonify_task(task)), 200
+    etag = make_etag(task['_id'], task['updated_at'], task.get('comment_count'),
+                     task.get('comments_version'), request.query_string)
+    last_modified = max(task['updated_at'], task.get('comments_updated_at') or EPOCH)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(app, etag, last_modified)
+    
+    response = app.json.response(jsonify_task(task, fields))
+    return with_validators(response, etag, last_modified), 200
 
 
-@tasks_bp.route('/tasks/<task_id>', methods=['PATCH'])
-def update_task(task_id):
-    """Update a task."""
+@tasks_bp.route('/tasks/<task_id>', methods=['GET'])
+def get_task(task_id):
+    """Get a specific task."""
+    return handle_get_task(current_app, request, task_id)
+
+
+def handle_update_task(app, task_id, data):
+    """Apply the decoded body of PATCH /api/tasks/<task_id>."""
     task_oid = oid(task_id)
     if not task_oid:
         return error_response("Invalid task ID", 400)
     
-    data = request.get_json()
     if not data:
         return error_response("Request body is required", 400)
+    if not isinstance(data, dict):
+        return error_response("Request body must be an object", 400)
     
-    updates = {}
-    
-    if 'title' in data:
-        title = data['title'].strip()
-        if not title:
-            return error_response("Title cannot be empty", 400)
-        updates['title'] = title
-    
-    if 'description' in data:
-        updates['description'] = data['description'].strip() or None
-    
-    if 'status' in data:
-        if data['status'] not in ['todo', 'in_progress', 'done']:
-            return error_response("Invalid status", 400)
-        updates['status'] = data['status']
-    
-    if not updates:
-        return error_response("At least one field is required", 400)
+    updates, error = parse_task_updates(data)
+    if error:
+        return error_response(error, 400)
     
     task = Tasks.update(task_oid, updates)
     if not task:
         return error_response("Task not found", 404)
     
-    return jsonify(jsonify_task(task)), 200
+    return app.json.response(jsonify_task(task)), 200
 
 
-@tasks_bp.route('/tasks/<task_id>', methods=['DELETE'])
-def delete_task(task_id):
-    """Delete a task and its comments."""
+@tasks_bp.route('/tasks/<task_id>', methods=['PATCH'])
+def update_task(task_id):
+    """Update a task."""
+    return handle_update_task(current_app, task_id, request.get_json())
+
+
+def handle_delete_task(app, task_id):
+    """Answer DELETE /api/tasks/<task_id>."""
     task_oid = oid(task_id)
     if not task_oid:
         return error_response("Invalid task ID", 400)
@@ -98,4 +525,11 @@ def delete_task(task_id):
     if not deleted:
         return error_response("Task not found", 404)
     
-    return '', 204
\ No newline at end of file
+    app.extensions['task_purger'].schedule(task_oid)
+    return '', 204
+
+
+@tasks_bp.route('/tasks/<task_id>', methods=['DELETE'])
+def delete_task(task_id):
+    """Delete a task and its comments."""
+    return handle_delete_task(current_app, task_id)
@@ -0,0 +1,263 @@
+"""Full-text search over task titles and descriptions and comment bodies.
+
+GET /api/search ranks tasks and comments by relevance with one of two
+backends, picked by the ``search.backend`` setting:
+
+- ``mongo``: $text queries on the text indexes of the manifest
+  (backend.indexes), scored by MongoDB.
+- ``memory``: an inverted index in the web process, for deployments and
+  tests without text index support. It is loaded from the database on
+  first use and then kept current with the delta sync queries
+  (Tasks.changes_since), so it trails other workers' writes by at most
+  ``refresh_s``.
+
+Queries use the $text syntax: words match any of them, "quoted phrases"
+must all appear and -words exclude. Both backends return hits in (score,
+_id) descending order, so pages continue from a keyset cursor on the two.
+"""
+import html
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from backend.config import get_config
+from backend.indexes import COMMENT_TEXT_WEIGHTS, TASK_TEXT_WEIGHTS, TOMBSTONE_RETENTION
+from backend.models import Tasks, Comments
+from backend.utils import SYNC_OVERLAP
+
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TYPES = ('task', 'comment')
+# Characters of context shown around the first match
+SNIPPET_WIDTH = 160
+
+_WORD = re.compile(r'\w+')
+_PHRASE = re.compile(r'"([^"]*)"')
+# Words too common to narrow a search, as in MongoDB's English stop list
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have he in is it its of on or '
+    'she that the their they this to was were will with'.split()
+)
+_SUFFIXES = ('ingly', 'edly', 'ing', 'ies', 'ied', 'ed', 'es', 's')
+
+
+def stem(word):
+    """Reduce a lower-case word to a crude stem, so plurals and tenses match."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """Return the stems of the words of ``text`` that are not stop words."""
+    return [stem(word) for word in _WORD.findall((text or '').lower())
+            if word not in STOP_WORDS]
+
+
+class Query:
+    """A parsed $text search string."""
+
+    def __init__(self, text):
+        phrases = _PHRASE.findall(text)
+        rest = _PHRASE.sub(' ', text)
+        excluded = [word[1:] for word in rest.split() if word.startswith('-')]
+        words = ' '.join(word for word in rest.split() if not word.startswith('-'))
+        self.phrases = [phrase.lower() for phrase in phrases if phrase.strip()]
+        self.excluded = set(tokenize(' '.join(excluded)))
+        self.terms = list(dict.fromkeys(tokenize(words + ' ' + ' '.join(phrases))))
+
+
+def snippet(text, query, width=SNIPPET_WIDTH):
+    """Cut ``text`` around the first query match, HTML-escaped, matches in <mark>.
+
+    Returns None if no query term occurs in the text.
+    """
+    if not text or not query.terms:
+        return None
+    pattern = re.compile(r'\b(?:%s)\w*' % '|'.join(map(re.escape, query.terms)), re.I)
+    first = pattern.search(text)
+    if first is None:
+        return None
+    start = max(0, min(first.start() - width // 4, len(text) - width))
+    end = min(len(text), start + width)
+    parts, position = [], start
+    for match in pattern.finditer(text, start, end):
+        parts.append(html.escape(text[position:match.start()]))
+        parts.append(f'<mark>{html.escape(match.group())}</mark>')
+        position = match.end()
+    parts.append(html.escape(text[position:end]))
+    return ('…' if start else '') + ''.join(parts) + ('…' if end < len(text) else '')
+
+
+def hit_snippet(hit, query):
+    """Snippet of the first searched field of a hit that matches."""
+    fields = TASK_TEXT_WEIGHTS if hit['type'] == 'task' else COMMENT_TEXT_WEIGHTS
+    for field in fields:
+        text = snippet(hit['doc'].get(field), query)
+        if text is not None:
+            return text
+    field = next(iter(fields))
+    return html.escape((hit['doc'].get(field) or '')[:SNIPPET_WIDTH])
+
+
+def _hit(hit_type, doc, score, task=None):
+    return {'type': hit_type, '_id': doc['_id'], 'score': score, 'doc': doc, 'task': task}
+
+
+def _rank(hit):
+    return hit['score'], hit['_id']
+
+
+class MongoTextSearch:
+    """Search with MongoDB $text queries."""
+
+    def search(self, text, status=None, types=SEARCH_TYPES, after=None, limit=20):
+        """Return up to ``limit`` hits after the (score, _id) ``after``, best first."""
+        hits = []
+        if 'task' in types:
+            hits += [_hit('task', task, task.pop('score'))
+                     for task in Tasks.search(text, status, after, limit)]
+        if 'comment' in types:
+            hits += [_hit('comment', comment, comment.pop('score'), comment.pop('task'))
+                     for comment in Comments.search(text, status, after, limit)]
+        hits.sort(key=_rank, reverse=True)
+        return hits[:limit]
+
+
+class InvertedIndexSearch:
+    """Search an inverted index of all live tasks and comments held in memory.
+
+    Scores add up, per query term, the weighted occurrences of the term in
+    each field times its inverse document frequency, like $text scores
+    with the same field weights.
+    """
+
+    def __init__(self, refresh=1.0):
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self._postings = defaultdict(dict)  # term -> {_id: weighted count}
+        self._entries = {}                  # _id -> (type, doc, term weights, text)
+        self._tasks = {}                    # task _id -> task
+        self._comments = defaultdict(set)   # task _id -> comment _ids
+        self._synced = None
+        self._checked = 0
+
+    def search(self, text, status=None, types=SEARCH_TYPES, after=None, limit=20):
+        """Return up to ``limit`` hits after the (score, _id) ``after``, best first."""
+        query = Query(text)
+        with self._lock:
+            self._refresh()
+            scores = defaultdict(float)
+            for term in query.terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + len(self._entries) / len(postings))
+                for doc_id, weight in postings.items():
+                    scores[doc_id] += weight * idf
+
+            hits = []
+            for doc_id, score in scores.items():
+                hit_type, doc, terms, content = self._entries[doc_id]
+                task = doc if hit_type == 'task' else self._tasks[doc['task_id']]
+                if (hit_type not in types
+                        or (status and task['status'] != status)
+                        or (after is not None and (score, doc_id) >= after)
+                        or not query.excluded.isdisjoint(terms)
+                        or not all(phrase in content for phrase in query.phrases)):
+                    continue
+                hits.append(_hit(hit_type, doc, score, None if hit_type == 'task' else {
+                    '_id': task['_id'], 'title': task['title'], 'status': task['status']
+                }))
+        hits.sort(key=_rank, reverse=True)
+        return hits[:limit]
+
+    def _refresh(self):
+        """Catch up with the database if the last check is older than ``refresh``."""
+        if self._pid != os.getpid():
+            # Forked workers build their own index
+            self._reset()
+            self._pid = os.getpid()
+        now = time.monotonic()
+        if now - self._checked < self.refresh:
+            return
+        # Reach back like sync tokens do; re-indexing a document is harmless
+        synced = datetime.utcnow() - SYNC_OVERLAP
+        if self._synced is None or self._synced < synced - TOMBSTONE_RETENTION:
+            self._load()
+        else:
+            self._catch_up(self._synced)
+        self._synced = synced
+        self._checked = now
+
+    def _load(self):
+        self._reset()
+        for task in Tasks.iter_all():
+            self._add_task(task)
+        for comment in Comments.iter_all():
+            if comment['task_id'] in self._tasks:
+                self._add('comment', comment, COMMENT_TEXT_WEIGHTS)
+                self._comments[comment['task_id']].add(comment['_id'])
+        logger.info("Loaded the search index: %d tasks, %d entries",
+                    len(self._tasks), len(self._entries))
+
+    def _catch_up(self, since):
+        tasks, deleted = Tasks.changes_since(since)
+        for task in tasks:
+            self._add_task(task)
+            if task.get('comments_updated_at') and task['comments_updated_at'] >= since:
+                comments, deleted_comments = Comments.changes_since(task['_id'], since)
+                for comment in comments:
+                    self._add('comment', comment, COMMENT_TEXT_WEIGHTS)
+                    self._comments[task['_id']].add(comment['_id'])
+                for comment_id in deleted_comments:
+                    self._remove(comment_id)
+                    self._comments[task['_id']].discard(comment_id)
+        for task_id in deleted:
+            self._tasks.pop(task_id, None)
+            self._remove(task_id)
+            for comment_id in self._comments.pop(task_id, ()):
+                self._remove(comment_id)
+
+    def _add_task(self, task):
+        self._tasks[task['_id']] = task
+        self._add('task', task, TASK_TEXT_WEIGHTS)
+
+    def _add(self, hit_type, doc, weights):
+        self._remove(doc['_id'])
+        terms = defaultdict(float)
+        for field, weight in weights.items():
+            for term in tokenize(doc.get(field)):
+                terms[term] += weight
+        for term, weight in terms.items():
+            self._postings[term][doc['_id']] = weight
+        content = ' '.join((doc.get(field) or '').lower() for field in weights)
+        self._entries[doc['_id']] = (hit_type, doc, terms, content)
+
+    def _remove(self, doc_id):
+        entry = self._entries.pop(doc_id, None)
+        if entry is None:
+            return
+        for term in entry[2]:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+
+
+def create_search():
+    """Pick the search backend configured for this environment."""
+    settings = get_config('search', {})
+    if settings.get('backend', 'mongo') == 'memory':
+        return InvertedIndexSearch(refresh=settings.get('refresh_s', 1))
+    return MongoTextSearch()
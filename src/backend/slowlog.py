@@ -0,0 +1,229 @@
+"""Slow-query log: MongoDB commands above a threshold, with explain summaries.
+
+SlowQueryListener notices commands slower than
+``mongodb.slow_queries.threshold_ms`` and hands them to a background
+thread. That thread explains each query shape at most once per
+``explain_interval_s`` and stores the entries in the ``slow_queries``
+collection (expired by a TTL index), so every worker's slow queries can be
+reported by /debug/slow-queries and ``flask slow-queries``.
+"""
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from bson.son import SON
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+from backend.config import get_config
+
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = 'slow_queries'
+
+# Commands explain() accepts, and where each keeps its filter
+_FILTER_KEYS = {
+    'find': 'filter',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'aggregate': 'pipeline',
+    'update': 'updates',
+    'delete': 'deletes',
+}
+# Session and routing fields explain() must not be sent
+_INTERNAL_KEYS = ('lsid', 'txnNumber', 'autocommit', 'startTransaction')
+
+
+def _shape(value):
+    """Replace the values in a query with '?', keeping fields and operators."""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+        return [_shape(item) for item in value]
+    return '?'
+
+
+def query_shape(command_name, command):
+    """Normalize a command to the shape shared by all its executions."""
+    shape = {'op': command_name, 'collection': command.get(command_name)}
+    key = _FILTER_KEYS[command_name]
+    value = command.get(key)
+    if command_name in ('update', 'delete'):
+        # Bulk writes: the first statement's filter stands for the batch
+        value = (value or [{}])[0].get('q')
+        key = 'filter'
+    shape[key] = _shape(value or {})
+    if command.get('sort'):
+        shape['sort'] = dict(command['sort'])
+    for option in ('skip', 'limit'):
+        if command.get(option):
+            shape[option] = '?'
+    return shape
+
+
+def summarize_explain(explain):
+    """Reduce explain(executionStats) output to what points at a problem."""
+    if 'stages' in explain:
+        # Aggregations nest the query's explain in their $cursor stage
+        explain = explain['stages'][0].get('$cursor', {})
+    plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+    plan = plan.get('queryPlan', plan)
+    stages, indexes = [], []
+    pending = [plan]
+    while pending:
+        stage = pending.pop()
+        if not stage:
+            continue
+        stages.append(stage.get('stage'))
+        if stage.get('indexName'):
+            indexes.append(stage['indexName'])
+        pending.append(stage.get('inputStage'))
+        pending.extend(stage.get('inputStages', []))
+    stats = explain.get('executionStats', {})
+    return {
+        'stages': stages,
+        'collscan': 'COLLSCAN' in stages,
+        'in_memory_sort': 'SORT' in stages,
+        'indexes': indexes,
+        'keys_examined': stats.get('totalKeysExamined'),
+        'docs_examined': stats.get('totalDocsExamined'),
+        'returned': stats.get('nReturned'),
+        'execution_ms': stats.get('executionTimeMillis')
+    }
+
+
+def _caller():
+    """Name the app function (e.g. Tasks.find_all) that issued the command."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.startswith('backend.') and module != __name__:
+            code = frame.f_code
+            return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+        frame = frame.f_back
+    return None
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Queue commands slower than the threshold for explain and storage."""
+
+    def __init__(self):
+        settings = get_config('mongodb.slow_queries', {})
+        self.enabled = settings.get('enabled', True)
+        self.threshold_ms = settings.get('threshold_ms', 100)
+        self.explain_interval = settings.get('explain_interval_s', 300)
+        self._commands = {}
+        self._queue = queue.Queue(maxsize=1000)
+        self._explained = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if (self.enabled and event.command_name in _FILTER_KEYS
+                and event.command.get(event.command_name) != COLLECTION):
+            self._commands[(event.connection_id, event.request_id)] = event.command
+
+    def succeeded(self, event):
+        command = self._commands.pop((event.connection_id, event.request_id), None)
+        if command is None or event.duration_micros < self.threshold_ms * 1000:
+            return
+        entry = {
+            'database': event.database_name,
+            'command': event.command_name,
+            # Stored as JSON: shapes contain operator keys such as $in
+            'shape': json.dumps(query_shape(event.command_name, command), default=str),
+            'caller': _caller(),
+            'duration_ms': event.duration_micros / 1000,
+            'skip': command.get('skip'),
+            'recorded_at': datetime.utcnow()
+        }
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((entry, command))
+        except queue.Full:
+            pass
+
+    def failed(self, event):
+        self._commands.pop((event.connection_id, event.request_id), None)
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked child starts with its own queue and worker
+                self._queue = queue.Queue(maxsize=1000)
+                self._pid = os.getpid()
+                threading.Thread(target=self._work, name='slow-query-log',
+                                 daemon=True).start()
+
+    def _work(self):
+        from backend.db import get_client
+        while True:
+            entry, command = self._queue.get()
+            try:
+                db = get_client()[entry['database']]
+                try:
+                    entry['explain'] = self._explain(db, entry, command)
+                except PyMongoError as e:
+                    entry['explain'] = None
+                    logger.warning("Cannot explain slow query %s: %s", entry['shape'], e)
+                db[COLLECTION].insert_one(entry)
+            except PyMongoError as e:
+                logger.warning("Cannot record slow query: %s", e)
+
+    def _explain(self, db, entry, command):
+        """Explain a shape at most once per explain_interval; reuse it otherwise."""
+        shape = entry['shape']
+        cached = self._explained.get(shape)
+        if cached and time.monotonic() - cached[0] < self.explain_interval:
+            return cached[1]
+        body = SON((k, v) for k, v in command.items()
+                   if not k.startswith('$') and k not in _INTERNAL_KEYS)
+        if entry['command'] in ('update', 'delete'):
+            # explain() takes a single write statement
+            statements = _FILTER_KEYS[entry['command']]
+            body[statements] = body[statements][:1]
+        summary = summarize_explain(db.command(
+            SON([('explain', body), ('verbosity', 'executionStats')])
+        ))
+        self._explained[shape] = (time.monotonic(), summary)
+        return summary
+
+
+slow_query_listener = SlowQueryListener()
+
+
+def report(db, limit=20):
+    """Group the logged slow queries by shape, most total time first."""
+    rows = db[COLLECTION].aggregate([
+        {'$sort': {'recorded_at': 1}},
+        {'$group': {
+            '_id': '$shape',
+            'count': {'$sum': 1},
+            'total_ms': {'$sum': '$duration_ms'},
+            'max_ms': {'$max': '$duration_ms'},
+            'callers': {'$addToSet': '$caller'},
+            'last_seen': {'$last': '$recorded_at'},
+            'explain': {'$last': '$explain'}
+        }},
+        {'$sort': {'total_ms': -1}},
+        {'$limit': limit}
+    ])
+    return [
+        {
+            'shape': json.loads(row['_id']),
+            'count': row['count'],
+            'avg_ms': round(row['total_ms'] / row['count'], 3),
+            'max_ms': row['max_ms'],
+            'callers': sorted(caller for caller in row['callers'] if caller),
+            'last_seen': row['last_seen'],
+            'explain': row.get('explain')
+        }
+        for row in rows
+    ]
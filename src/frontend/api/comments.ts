@@ -17,8 +17,11 @@ export interface CommentsResponse {
   count: number;
   limit: number;
   offset: number;
+  next_cursor: string | null;
 }
 
+export type CommentEventType = 'created' | 'updated' | 'deleted' | 'reset';
+
 export interface CreateCommentDto {
   body: string;
   author?: string;
@@ -35,6 +38,11 @@ export const commentsApi = {
     http.get<CommentsResponse>(
       `/api/tasks/${taskId}/comments?limit=${limit}&offset=${offset}`
     ),
+
+  listAfter: (taskId: string, cursor: string, limit = 20) =>
+    http.get<CommentsResponse>(
+      `/api/tasks/${taskId}/comments?limit=${limit}&cursor=${encodeURIComponent(cursor)}`
+    ),
   
   create: (taskId: string, data: CreateCommentDto) =>
     http.post<Comment>(`/api/tasks/${taskId}/comments`, data),
@@ -43,4 +51,12 @@ export const commentsApi = {
     http.patch<Comment>(`/api/comments/${id}`, data),
   
   delete: (id: string) => http.delete<void>(`/api/comments/${id}`),
+
+  /** Call `onEvent` for every comment change on a task; returns an unsubscribe function. */
+  subscribe: (taskId: string, onEvent: (type: CommentEventType) => void) => {
+    const source = http.events(`/api/tasks/${taskId}/comments/stream`);
+    const types: CommentEventType[] = ['created', 'updated', 'deleted', 'reset'];
+    types.forEach((type) => source.addEventListener(type, () => onEvent(type)));
+    return () => source.close();
+  },
 };
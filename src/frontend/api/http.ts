@@ -14,20 +14,35 @@ export class HttpError extends Error {
   }
 }
 
+interface CachedResponse {
+  etag: string;
+  data: unknown;
+}
+
+// Last good GET response per URL, revalidated with If-None-Match
+const etagCache = new Map<string, CachedResponse>();
+
 async function request<T>(
   endpoint: string,
   options?: RequestInit
 ): Promise<T> {
   const url = `${API_BASE}${endpoint}`;
+  const isGet = !options?.method || options.method === 'GET';
+  const cached = isGet ? etagCache.get(url) : undefined;
   
   const response = await fetch(url, {
     ...options,
     headers: {
       'Content-Type': 'application/json',
+      ...(cached ? { 'If-None-Match': cached.etag } : {}),
       ...options?.headers,
     },
   });
 
+  if (response.status === 304 && cached) {
+    return cached.data as T;
+  }
+
   if (response.status === 204) {
     return undefined as T;
   }
@@ -38,6 +53,11 @@ async function request<T>(
     throw new HttpError(response.status, data);
   }
 
+  const etag = response.headers.get('ETag');
+  if (isGet && etag) {
+    etagCache.set(url, { etag, data });
+  }
+
   return data;
 }
 
@@ -58,4 +78,7 @@ export const http = {
   
   delete: <T>(endpoint: string) =>
     request<T>(endpoint, { method: 'DELETE' }),
+  
+  // Server-Sent Events; the browser reconnects with Last-Event-ID itself
+  events: (endpoint: string) => new EventSource(`${API_BASE}${endpoint}`),
 };
\ No newline at end of file
@@ -2,16 +2,38 @@
  * Tasks API client
  */
 import { http } from './http';
+import { Comment } from './comments';
 
 export interface Task {
   _id: string;
   title: string;
   description: string | null;
   status: 'todo' | 'in_progress' | 'done';
+  comment_count: number;
+  last_comment_at: string | null;
   created_at: string;
   updated_at: string;
 }
 
+// A task with its newest comments embedded (?include=comments)
+export interface TaskWithComments extends Task {
+  comments: Comment[];
+}
+
+export interface TasksPage {
+  tasks: Task[];
+  limit: number;
+  offset: number;
+  next_cursor: string | null;
+}
+
+// Dashboard statistics, precomputed on the server (GET /api/tasks/stats)
+export interface TaskStats {
+  tasks: { total: number; by_status: Record<Task['status'], number> };
+  comments: { total: number; per_day: { day: string; count: number }[] };
+  most_active: Pick<Task, '_id' | 'title' | 'status' | 'comment_count' | 'last_comment_at'>[];
+}
+
 export interface CreateTaskDto {
   title: string;
   description?: string;
@@ -27,6 +49,24 @@ export interface UpdateTaskDto {
 // ✅ Fixed endpoints to match Flask blueprint prefix `/api/tasks`
 export const tasksApi = {
   list: () => http.get<Task[]>('/api/tasks'),
+
+  // One request for the whole board: every task with its newest comments
+  listWithComments: (commentsLimit = 20) =>
+    http.get<TaskWithComments[]>(
+      `/api/tasks?include=comments&comments_limit=${commentsLimit}`
+    ),
+
+  getMany: (ids: string[]) =>
+    http.get<Task[]>(`/api/tasks?ids=${ids.map(encodeURIComponent).join(',')}`),
+
+  listPage: (limit = 20, cursor?: string) =>
+    http.get<TasksPage>(
+      `/api/tasks?limit=${limit}` +
+        (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '')
+    ),
+  
+  stats: (days = 30, top = 10) =>
+    http.get<TaskStats>(`/api/tasks/stats?days=${days}&top=${top}`),
   
   get: (id: string) => http.get<Task>(`/api/tasks/${id}`),
   
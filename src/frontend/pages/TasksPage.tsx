@@ -2,15 +2,18 @@
  * Main tasks page with comments
  */
 import { useState, useEffect } from 'react';
-import { Task, tasksApi } from '../api/tasks';
+import { TaskWithComments, tasksApi } from '../api/tasks';
 import { commentsApi, CommentsResponse } from '../api/comments';
 import { TaskForm } from '../components/TaskForm';
 import { TaskList } from '../components/TaskList';
 import { CommentForm } from '../components/CommentForm';
 import { CommentList } from '../components/CommentList';
 
+// Comments shown per task; the board embeds as many (see loadTasks)
+const COMMENTS_LIMIT = 20;
+
 export function TasksPage() {
-  const [tasks, setTasks] = useState<Task[]>([]);
+  const [tasks, setTasks] = useState<TaskWithComments[]>([]);
   const [selectedTaskId, setSelectedTaskId] = useState<string | null>(null);
   const [comments, setComments] = useState<CommentsResponse | null>(null);
   const [loadingTasks, setLoadingTasks] = useState(true);
@@ -22,7 +25,7 @@ export function TasksPage() {
     setError('');
 
     try {
-      const data = await tasksApi.list();
+      const data = await tasksApi.listWithComments(COMMENTS_LIMIT);
       setTasks(data);
     } catch (err: any) {
       setError(err.message || 'Failed to load tasks');
@@ -31,13 +34,25 @@ export function TasksPage() {
     }
   };
 
+  // Show fetched comments and keep the task's embedded copy current
+  const showComments = (taskId: string, data: CommentsResponse) => {
+    setComments(data);
+    setTasks((prev) =>
+      prev.map((task) =>
+        task._id === taskId
+          ? { ...task, comments: data.comments, comment_count: data.count }
+          : task
+      )
+    );
+  };
+
   const loadComments = async (taskId: string) => {
     setLoadingComments(true);
     setError('');
 
     try {
-      const data = await commentsApi.list(taskId);
-      setComments(data);
+      const data = await commentsApi.list(taskId, COMMENTS_LIMIT);
+      showComments(taskId, data);
     } catch (err: any) {
       setError(err.message || 'Failed to load comments');
     } finally {
@@ -50,11 +65,34 @@ export function TasksPage() {
   }, []);
 
   useEffect(() => {
-    if (selectedTaskId) {
-      loadComments(selectedTaskId);
-    } else {
+    if (!selectedTaskId) {
       setComments(null);
+      return;
     }
+    // The board already carries the first page of comments
+    const task = tasks.find((t) => t._id === selectedTaskId);
+    if (task) {
+      setComments({
+        comments: task.comments,
+        count: task.comment_count,
+        limit: COMMENTS_LIMIT,
+        offset: 0,
+        next_cursor: null,
+      });
+    } else {
+      loadComments(selectedTaskId);
+    }
+  }, [selectedTaskId]);
+
+  // Pick up comments written elsewhere; the list request revalidates by ETag
+  useEffect(() => {
+    if (!selectedTaskId) return;
+    return commentsApi.subscribe(selectedTaskId, () => {
+      commentsApi
+        .list(selectedTaskId, COMMENTS_LIMIT)
+        .then((data) => showComments(selectedTaskId, data))
+        .catch(() => {});
+    });
   }, [selectedTaskId]);
 
   const handleTaskSelect = (taskId: string) => {
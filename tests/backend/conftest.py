@@ -1,10 +1,157 @@
-"""Pytest fixtures for backend tests."""
+"""Pytest fixtures for backend tests.
+
+API tests run against both the Flask app and the Quart app of the async
+serving mode; tests of Flask-only features are marked ``flask_only``.
+"""
+import asyncio
 import os
 import random
 import string
+import threading
 import pytest
+from pymongo import monitoring
+from quart.testing import QuartClient
+from werkzeug.datastructures import Headers
+from werkzeug.wrappers import Response
 from src.backend.app import create_app
 from src.backend.db import get_client, close_db
+from backend.aio.app import create_app as create_async_app
+from backend.db import get_db
+from backend.events import ensure_event_log
+from backend.indexes import sync_indexes
+from backend.models import Tasks
+from backend.purge import InProcessPurger
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Record the names of database commands sent to MongoDB.
+    
+    Appends to the comment event log, which backend.events makes off the
+    request path, go to ``event_log_writes`` instead.
+    """
+    
+    def __init__(self):
+        self.commands = []
+        self.event_log_writes = []
+    
+    def started(self, event):
+        # Ignore the task cache's change stream listener
+        if event.command_name == 'getMore':
+            return
+        pipeline = event.command.get('pipeline') or [{}]
+        if event.command_name == 'aggregate' and '$changeStream' in pipeline[0]:
+            return
+        # ...and one-off collection checks and the comment event log's tail
+        # thread (backend.events)
+        if (event.command_name == 'listCollections'
+                or (event.command_name == 'find'
+                    and event.command.get('find') == 'comment_events')):
+            return
+        if event.command_name == 'insert' and event.command.get('insert') == 'comment_events':
+            self.event_log_writes.append(event.command_name)
+            return
+        self.commands.append(event.command_name)
+    
+    def succeeded(self, event):
+        pass
+    
+    def failed(self, event):
+        pass
+
+
+# Must be registered before the first MongoClient is created
+_recorder = CommandRecorder()
+monitoring.register(_recorder)
+
+# Longest wait for a chunk of a Quart response
+RESPONSE_TIMEOUT = 10
+
+
+class SyncQuartClient:
+    """Drive a Quart app from synchronous tests, like Flask's test client.
+    
+    Requests run on the app's event loop thread (``app.extensions['test_loop']``).
+    Bodies are buffered, except Server-Sent Events, which are read chunk by
+    chunk as the test iterates them.
+    """
+    
+    def __init__(self, app, use_cookies=True):
+        self.app = app
+        self.loop = app.extensions['test_loop']
+        self._client = QuartClient(app, use_cookies=use_cookies)
+    
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+    
+    def open(self, path, method='GET', data=None, content_type=None, headers=None):
+        headers = Headers(headers)
+        if content_type:
+            headers['Content-Type'] = content_type
+        if isinstance(data, str):
+            data = data.encode()
+        return self._run(self._open(path, method, headers, data or b''))
+    
+    def get(self, path, **kwargs):
+        return self.open(path, 'GET', **kwargs)
+    
+    def post(self, path, **kwargs):
+        return self.open(path, 'POST', **kwargs)
+    
+    def patch(self, path, **kwargs):
+        return self.open(path, 'PATCH', **kwargs)
+    
+    def delete(self, path, **kwargs):
+        return self.open(path, 'DELETE', **kwargs)
+    
+    async def _open(self, path, method, headers, data):
+        connection = self._client.request(path, method=method, headers=headers)
+        await connection.__aenter__()
+        await connection.send(data)
+        await connection.send_complete()
+        # The first chunk follows the status and headers; with TESTING
+        # set, a failing view ends the app task without sending any
+        first = asyncio.ensure_future(connection.receive())
+        await asyncio.wait([first, connection._task], timeout=RESPONSE_TIMEOUT,
+                           return_when=asyncio.FIRST_COMPLETED)
+        if not first.done():
+            first.cancel()
+            await connection.__aexit__(None, None, None)
+            raise TimeoutError(f"No response to {method} {path}")
+        first = first.result()
+        if connection.headers.get('Content-Type', '').startswith('text/event-stream'):
+            response = Response(self._chunks(connection, first), connection.status_code,
+                                connection.headers)
+            # Also disconnects streams that were never read
+            response.call_on_close(lambda: self._run(self._disconnect(connection)))
+            return response
+        await connection.__aexit__(None, None, None)
+        return Response(first + bytes(connection.response_data), connection.status_code,
+                        connection.headers)
+    
+    def _chunks(self, connection, first):
+        if first:
+            yield first
+        while True:
+            chunk = self._run(asyncio.wait_for(connection.receive(), RESPONSE_TIMEOUT))
+            if chunk:
+                yield chunk
+    
+    @staticmethod
+    async def _disconnect(connection):
+        await connection.disconnect()
+        await asyncio.wait_for(connection.__aexit__(None, None, None), RESPONSE_TIMEOUT)
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'flask_only: test a feature of the Flask app only')
+
+
+def pytest_generate_tests(metafunc):
+    if 'app_kind' in metafunc.fixturenames:
+        kinds = ['flask']
+        if not metafunc.definition.get_closest_marker('flask_only'):
+            kinds.append('quart')
+        metafunc.parametrize('app_kind', kinds, scope='session')
 
 
 @pytest.fixture(scope='session')
@@ -15,16 +162,38 @@ def test_db_name():
 
 
 @pytest.fixture(scope='session')
-def app(test_db_name):
-    """Create Flask app for testing."""
+def app(app_kind, test_db_name):
+    """Create the Flask or Quart app for testing."""
     os.environ['DB_NAME'] = test_db_name
     os.environ['MONGO_URI'] = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
     
-    app = create_app()
+    if app_kind == 'quart':
+        app = create_async_app()
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        app.extensions['test_loop'] = loop
+        app.test_client_class = SyncQuartClient
+        asyncio.run_coroutine_threadsafe(app.startup(), loop).result()
+    else:
+        app = create_app()
     app.config['TESTING'] = True
+    # The suite drives the API from one client; test_admission_control
+    # installs controllers of its own
+    app.extensions['admission'].enabled = False
+    # Tests wait for purges with join(), which only sees in-process ones;
+    # the resume pass has a test of its own
+    app.extensions['task_purger'] = InProcessPurger(resume=False)
+    # The app only verifies indexes; build them and the comment event log
+    # like a deploy (`flask sync-indexes`) would
+    sync_indexes(get_db())
+    ensure_event_log(get_db())
     
     yield app
     
+    if app_kind == 'quart':
+        asyncio.run_coroutine_threadsafe(app.shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+    
     # Cleanup: drop test database
     client = get_client()
     client.drop_database(test_db_name)
@@ -46,9 +215,28 @@ def clean_db(app, test_db_name):
     # Clear collections
     db.tasks.delete_many({})
     db.comments.delete_many({})
+    db.tombstones.delete_many({})
+    db.task_stats.delete_many({})
+    Tasks.cache_clear()
     
     yield
     
     # Cleanup after test
     db.tasks.delete_many({})
-    db.comments.delete_many({})
\ No newline at end of file
+    db.comments.delete_many({})
+    db.tombstones.delete_many({})
+    db.task_stats.delete_many({})
+
+
+@pytest.fixture
+def db_commands():
+    """Return a list collecting the MongoDB commands issued from now on."""
+    _recorder.commands = []
+    return _recorder.commands
+
+
+@pytest.fixture
+def event_log_writes():
+    """Return a list collecting the comment event log appends from now on."""
+    _recorder.event_log_writes = []
+    return _recorder.event_log_writes
@@ -0,0 +1,79 @@
+"""Tests for the batch API endpoint."""
+import json
+
+
+def post_batch(client, requests):
+    """Helper to send a batch of sub-requests."""
+    return client.post('/api/batch', data=json.dumps({'requests': requests}),
+                       content_type='application/json')
+
+
+def test_batch_runs_sub_requests_in_order(client):
+    """Test writes run in order and later reads see them."""
+    task = client.post('/api/tasks', data=json.dumps({'title': 'Batched'}),
+                       content_type='application/json').get_json()
+    
+    response = post_batch(client, [
+        {'method': 'POST', 'path': f"/api/tasks/{task['_id']}/comments",
+         'body': {'body': 'Hello'}},
+        {'method': 'GET', 'path': f"/api/tasks/{task['_id']}"},
+        {'method': 'GET', 'path': f"/api/tasks/{task['_id']}/comments?limit=5"},
+        {'method': 'PATCH', 'path': f"/api/tasks/{task['_id']}", 'body': {'title': ''}},
+        {'method': 'DELETE', 'path': '/api/comments/nope'},
+    ])
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['succeeded'] == 3 and data['failed'] == 2
+    
+    created, fetched, listed, invalid, missing = data['results']
+    assert created['status'] == 201 and created['body']['body'] == 'Hello'
+    assert fetched['body']['comment_count'] == 1
+    assert listed['body']['count'] == 1
+    assert listed['body']['comments'][0]['_id'] == created['body']['_id']
+    assert invalid == {'index': 3, 'status': 400, 'error': 'Title cannot be empty'}
+    assert missing['status'] == 400 and missing['error'] == 'Invalid comment ID'
+
+
+def test_batch_rejects_invalid_sub_requests(client, app, monkeypatch):
+    """Test unknown, unbatchable and oversized batches are rejected."""
+    results = post_batch(client, [
+        {'method': 'GET', 'path': '/health'},
+        {'method': 'PUT', 'path': '/api/tasks'},
+        {'method': 'GET', 'path': '/api/nothing'},
+        {'method': 'POST', 'path': '/api/batch', 'body': {'requests': []}},
+        {'method': 'GET', 'path': '/api/tasks/abc/comments/stream'},
+        'GET /api/tasks',
+    ]).get_json()['results']
+    assert [result['status'] for result in results] == [400, 400, 404, 400, 400, 400]
+    
+    assert post_batch(client, []).status_code == 400
+    monkeypatch.setitem(app.config, 'MAX_BATCH_REQUESTS', 1)
+    response = post_batch(client, [{'path': '/api/tasks'}] * 2)
+    assert response.status_code == 400
+
+
+def test_batch_sub_requests_are_admitted(app, client, monkeypatch):
+    """Test each sub-request costs a token and a slot of its own class."""
+    from backend.admission import AdmissionController
+    
+    task = client.post('/api/tasks', data=json.dumps({'title': 'Batched'}),
+                       content_type='application/json').get_json()
+    
+    def use(**settings):
+        controller = AdmissionController(dict({'enabled': True}, **settings))
+        monkeypatch.setitem(app.extensions, 'admission', controller)
+        return controller
+    
+    # The batch itself takes the first token, its sub-requests the rest
+    controller = use(rate_limit={'requests_per_second': 1, 'burst': 3})
+    results = post_batch(client, [{'path': '/api/tasks?limit=1'}] * 3).get_json()['results']
+    assert [result['status'] for result in results] == [200, 200, 429]
+    
+    # Batched task deletes are held to the cascade cap
+    controller = use(rate_limit={'requests_per_second': 0}, max_in_flight={'cascade': 0})
+    results = post_batch(client, [
+        {'method': 'DELETE', 'path': f"/api/tasks/{task['_id']}"},
+        {'path': f"/api/tasks/{task['_id']}"},
+    ]).get_json()['results']
+    assert [result['status'] for result in results] == [503, 200]
+    assert all(count == 0 for count in controller.in_flight.values())
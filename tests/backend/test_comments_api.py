@@ -1,5 +1,6 @@
 """Tests for comments API endpoints."""
 import json
+import pytest
 from src.backend.models import Tasks
 
 
@@ -417,4 +418,478 @@ def test_cascade_delete_task_deletes_comments(client):
     
     # Verify task is deleted
     response = client.get(f'/api/tasks/{task_id}')
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_list_comments_cursor_pagination(client):
+    """Test walking comments with keyset cursors."""
+    task = create_task(client)
+    task_id = task['_id']
+    
+    created = []
+    for i in range(25):
+        response = client.post(f'/api/tasks/{task_id}/comments',
+                              data=json.dumps({'body': f'Comment {i}'}),
+                              content_type='application/json')
+        created.append(response.get_json()['_id'])
+    
+    seen = []
+    response = client.get(f'/api/tasks/{task_id}/comments?limit=10')
+    data = response.get_json()
+    seen.extend(c['_id'] for c in data['comments'])
+    
+    while data['next_cursor']:
+        response = client.get(
+            f'/api/tasks/{task_id}/comments?limit=10&cursor={data["next_cursor"]}'
+        )
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['count'] == 25
+        seen.extend(c['_id'] for c in data['comments'])
+    
+    # Every comment exactly once, newest first
+    assert seen == list(reversed(created))
+
+
+def test_list_comments_last_page_has_no_cursor(client):
+    """Test next_cursor is null when there are no more comments."""
+    task = create_task(client)
+    task_id = task['_id']
+    
+    for i in range(3):
+        client.post(f'/api/tasks/{task_id}/comments',
+                   data=json.dumps({'body': f'Comment {i}'}),
+                   content_type='application/json')
+    
+    response = client.get(f'/api/tasks/{task_id}/comments?limit=3')
+    assert response.get_json()['next_cursor'] is None
+
+
+def test_list_comments_invalid_cursor(client):
+    """Test malformed cursors and cursor+offset combinations are rejected."""
+    task = create_task(client)
+    task_id = task['_id']
+    
+    response = client.get(f'/api/tasks/{task_id}/comments?cursor=not-a-cursor')
+    assert response.status_code == 400
+    
+    response = client.get(f'/api/tasks/{task_id}/comments?cursor=abc&offset=10')
+    assert response.status_code == 400
+
+
+def test_comment_counters_on_task(client):
+    """Test comment_count/last_comment_at follow creates and deletes."""
+    task = create_task(client)
+    task_id = task['_id']
+    assert task['comment_count'] == 0
+    assert task['last_comment_at'] is None
+    
+    ids = []
+    for i in range(3):
+        response = client.post(f'/api/tasks/{task_id}/comments',
+                              data=json.dumps({'body': f'Comment {i}'}),
+                              content_type='application/json')
+        ids.append(response.get_json())
+    
+    data = client.get(f'/api/tasks/{task_id}').get_json()
+    assert data['comment_count'] == 3
+    assert data['last_comment_at'] == ids[-1]['created_at']
+    
+    client.delete(f'/api/comments/{ids[-1]["_id"]}')
+    data = client.get(f'/api/tasks/{task_id}').get_json()
+    assert data['comment_count'] == 2
+    assert data['last_comment_at'] == ids[1]['created_at']
+    
+    response = client.get('/api/tasks?limit=10')
+    assert response.get_json()['tasks'][0]['comment_count'] == 2
+
+
+@pytest.mark.flask_only
+def test_recount_comments_repairs_drift(app, client, test_db_name):
+    """Test the recount-comments command fixes drifted counters."""
+    from src.backend.db import get_client
+    
+    task = create_task(client)
+    task_id = task['_id']
+    for i in range(2):
+        client.post(f'/api/tasks/{task_id}/comments',
+                   data=json.dumps({'body': f'Comment {i}'}),
+                   content_type='application/json')
+    
+    db = get_client()[test_db_name]
+    db.tasks.update_many({}, {'$set': {'comment_count': 7},
+                              '$unset': {'last_comment_at': ''}})
+    
+    result = app.test_cli_runner().invoke(args=['recount-comments'])
+    assert 'Fixed comment counters on 1 task(s)' in result.output
+    
+    data = client.get(f'/api/tasks/{task_id}').get_json()
+    assert data['comment_count'] == 2
+    assert data['last_comment_at'] is not None
+
+
+def test_comment_writes_round_trips(client, db_commands, event_log_writes):
+    """Test each comment write endpoint issues the minimum of commands."""
+    from backend.events import comment_events
+    
+    task_id = create_task(client)['_id']
+    comment_events.flush()
+    
+    db_commands.clear()
+    event_log_writes.clear()
+    response = client.post(f'/api/tasks/{task_id}/comments',
+                          data=json.dumps({'body': 'First'}),
+                          content_type='application/json')
+    comment_id = response.get_json()['_id']
+    # Task counters, the comment, and stats with the task list version; the
+    # event log append is made off the request path
+    assert db_commands == ['update', 'insert', 'update']
+    assert comment_events.flush(10)
+    assert event_log_writes == ['insert']
+    
+    db_commands.clear()
+    event_log_writes.clear()
+    client.post('/api/tasks/507f1f77bcf86cd799439011/comments',
+               data=json.dumps({'body': 'Orphan'}),
+               content_type='application/json')
+    assert db_commands == ['update']
+    assert comment_events.flush(10)
+    assert event_log_writes == []
+    
+    # The edit also bumps the task's comments_version and the task list
+    # version for ETags
+    db_commands.clear()
+    client.patch(f'/api/comments/{comment_id}',
+                data=json.dumps({'body': 'Edited'}),
+                content_type='application/json')
+    assert db_commands == ['findAndModify', 'update', 'update']
+    assert comment_events.flush(10)
+    assert event_log_writes == ['insert']
+
+
+def test_comment_events_are_logged_off_the_request_path(client, monkeypatch):
+    """Test writes do not wait for the event log, and queued events share an append."""
+    import threading
+    from bson import ObjectId
+    from backend.db import get_db
+    from backend.events import COLLECTION as EVENT_LOG, comment_events
+    
+    task_id = create_task(client)['_id']
+    comment_events.flush()
+    collection_class = type(get_db()[EVENT_LOG])
+    insert_many = collection_class.insert_many
+    appending = threading.Event()
+    release = threading.Event()
+    appended = []
+    
+    def slow_insert_many(self, documents, *args, **kwargs):
+        if self.name == EVENT_LOG:
+            appended.append(len(documents))
+            appending.set()
+            release.wait(10)
+        return insert_many(self, documents, *args, **kwargs)
+    
+    monkeypatch.setattr(collection_class, 'insert_many', slow_insert_many)
+    url = f'/api/tasks/{task_id}/comments'
+    try:
+        response = client.post(url, data=json.dumps({'body': 'First'}),
+                               content_type='application/json')
+        assert response.status_code == 201
+        assert appending.wait(10)
+        # The first append is stuck; these writes still answer
+        for body in ('Second', 'Third', 'Fourth'):
+            response = client.post(url, data=json.dumps({'body': body}),
+                                   content_type='application/json')
+            assert response.status_code == 201
+    finally:
+        release.set()
+    assert comment_events.flush(10)
+    assert appended == [1, 3]
+    assert [e['comment']['body'] for e in get_db()[EVENT_LOG].find(
+        {'task_id': ObjectId(task_id)}).sort('_id', 1)] == ['First', 'Second', 'Third', 'Fourth']
+
+
+def test_comments_batch(client):
+    """Test batch create, update and delete of comments keep counters right."""
+    task_id = create_task(client)['_id']
+    
+    response = client.post(f'/api/tasks/{task_id}/comments:batch',
+                          data=json.dumps({'comments': [
+                              {'body': 'One', 'author': 'Ann'},
+                              {'body': ''},
+                              {'body': 'Two'},
+                              {'body': 7}
+                          ]}),
+                          content_type='application/json')
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == [201, 400, 201, 400]
+    ids = [results[0]['comment']['_id'], results[2]['comment']['_id']]
+    assert client.get(f'/api/tasks/{task_id}').get_json()['comment_count'] == 2
+    
+    response = client.patch('/api/comments:batch',
+                           data=json.dumps({'comments': [
+                               {'_id': ids[0], 'body': 'Edited'},
+                               {'_id': '507f1f77bcf86cd799439011', 'body': 'Nope'},
+                               {'_id': ids[1], 'author': 3}
+                           ]}),
+                           content_type='application/json')
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == [200, 404, 400]
+    assert results[0]['comment']['body'] == 'Edited'
+    
+    response = client.delete('/api/comments:batch',
+                            data=json.dumps({'ids': ids}),
+                            content_type='application/json')
+    assert response.get_json()['succeeded'] == 2
+    task = client.get(f'/api/tasks/{task_id}').get_json()
+    assert task['comment_count'] == 0
+    assert task['last_comment_at'] is None
+
+
+def test_comments_batch_task_not_found(client):
+    """Test batch comment creation on a missing task returns 404."""
+    response = client.post('/api/tasks/507f1f77bcf86cd799439011/comments:batch',
+                          data=json.dumps({'comments': [{'body': 'Hi'}]}),
+                          content_type='application/json')
+    assert response.status_code == 404
+
+
+def test_list_comments_sparse_fieldset(client):
+    """Test ?fields= limits comment payloads."""
+    task_id = create_task(client)['_id']
+    client.post(f'/api/tasks/{task_id}/comments',
+               data=json.dumps({'body': 'Long body', 'author': 'Ann'}),
+               content_type='application/json')
+    
+    data = client.get(f'/api/tasks/{task_id}/comments?fields=author').get_json()
+    assert data['count'] == 1
+    assert list(data['comments'][0]) == ['_id', 'author']
+    
+    response = client.get(f'/api/tasks/{task_id}/comments?fields=nope')
+    assert response.status_code == 400
+
+
+def test_list_comments_conditional(client):
+    """Test comment lists answer 304 until a comment is added or edited."""
+    task_id = create_task(client)['_id']
+    response = client.post(f'/api/tasks/{task_id}/comments',
+                          data=json.dumps({'body': 'First'}),
+                          content_type='application/json')
+    comment_id = response.get_json()['_id']
+    url = f'/api/tasks/{task_id}/comments'
+    
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    
+    client.patch(f'/api/comments/{comment_id}',
+                data=json.dumps({'body': 'Edited'}),
+                content_type='application/json')
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['comments'][0]['body'] == 'Edited'
+
+
+def test_conditional_gets_see_writes_the_task_cache_missed(client, db_commands, test_db_name):
+    """Test validators are read fresh, not from a task cache lagging other workers."""
+    from datetime import datetime
+    from bson import ObjectId
+    from src.backend.db import get_client
+
+    task_id = create_task(client)['_id']
+    url = f'/api/tasks/{task_id}/comments'
+    # Caches the task
+    task_etag = client.get(f'/api/tasks/{task_id}').headers['ETag']
+    etag = client.get(url).headers['ETag']
+    db_commands.clear()
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    assert db_commands == ['find']
+
+    # Another worker adds a comment; its invalidation has not arrived
+    now = datetime.utcnow()
+    db = get_client()[test_db_name]
+    db.comments.insert_one({'task_id': ObjectId(task_id), 'body': 'Elsewhere',
+                            'author': None, 'created_at': now, 'updated_at': now})
+    db.tasks.update_one({'_id': ObjectId(task_id)},
+                        {'$inc': {'comment_count': 1, 'comments_version': 1},
+                         '$max': {'last_comment_at': now, 'comments_updated_at': now}})
+
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 1
+    assert response.get_json()['comments'][0]['body'] == 'Elsewhere'
+    response = client.get(f'/api/tasks/{task_id}', headers={'If-None-Match': task_etag})
+    assert response.status_code == 200
+    assert response.get_json()['comment_count'] == 1
+
+
+def test_list_comments_since_sync_token(client, test_db_name):
+    """Test ?since= returns only comments changed or deleted after the token."""
+    from datetime import datetime, timedelta
+    from src.backend.db import get_client
+    
+    task_id = create_task(client)['_id']
+    url = f'/api/tasks/{task_id}/comments'
+    ids = [
+        client.post(url, data=json.dumps({'body': body}),
+                    content_type='application/json').get_json()['_id']
+        for body in ('Kept', 'Edited', 'Deleted')
+    ]
+    # Age the comments past the token's overlap window
+    db = get_client()[test_db_name]
+    an_hour_ago = datetime.utcnow() - timedelta(hours=1)
+    db.comments.update_many({}, {'$set': {'created_at': an_hour_ago, 'updated_at': an_hour_ago}})
+    
+    token = client.get(url).headers['X-Sync-Token']
+    client.patch(f'/api/comments/{ids[1]}', data=json.dumps({'body': 'Changed'}),
+                content_type='application/json')
+    client.delete(f'/api/comments/{ids[2]}')
+    added = client.post(url, data=json.dumps({'body': 'New'}),
+                        content_type='application/json').get_json()['_id']
+    
+    data = client.get(f'{url}?since={token}').get_json()
+    assert sorted(c['_id'] for c in data['comments']) == sorted([ids[1], added])
+    assert data['deleted'] == [ids[2]]
+    
+    assert client.get(f'{url}?since={token}&limit=5').status_code == 400
+    assert client.get(f'{url}?since=nope').status_code == 400
+
+
+def test_stream_comment_events(client):
+    """Test the comment stream pushes created, updated and deleted events."""
+    task_id = create_task(client)['_id']
+    assert client.get('/api/tasks/invalid/comments/stream').status_code == 400
+    assert client.get('/api/tasks/507f1f77bcf86cd799439011/comments/stream').status_code == 404
+    
+    response = client.get(f'/api/tasks/{task_id}/comments/stream')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    chunks = response.iter_encoded()
+    assert next(chunks) == b'retry: 3000\n\n'
+    
+    other_task_id = create_task(client, title="Other")['_id']
+    client.post(f'/api/tasks/{other_task_id}/comments',
+               data=json.dumps({'body': 'Elsewhere'}),
+               content_type='application/json')
+    comment_id = client.post(f'/api/tasks/{task_id}/comments',
+                            data=json.dumps({'body': 'First'}),
+                            content_type='application/json').get_json()['_id']
+    client.patch(f'/api/comments/{comment_id}',
+                data=json.dumps({'body': 'Edited'}),
+                content_type='application/json')
+    client.delete(f'/api/comments/{comment_id}')
+    
+    events = []
+    for _ in range(3):
+        lines = next(chunks).decode().strip().split('\n')
+        fields = dict(line.split(': ', 1) for line in lines)
+        events.append((fields['event'], json.loads(fields['data'])))
+    response.close()
+    
+    assert [event for event, _ in events] == ['created', 'updated', 'deleted']
+    assert events[0][1]['body'] == 'First'
+    assert events[1][1]['body'] == 'Edited'
+    assert events[2][1] == {'_id': comment_id, 'task_id': task_id}
+
+
+def test_open_streams_hold_admission_slots(app, client, monkeypatch):
+    """Test a comment stream keeps its slot and is timed until it closes."""
+    from backend.admission import AdmissionController
+    from backend.metrics import request_metrics
+
+    controller = AdmissionController({
+        'enabled': True, 'rate_limit': {'requests_per_second': 0},
+        'max_in_flight': {'stream': 2, 'sync_stream': 2}
+    })
+    monkeypatch.setitem(app.extensions, 'admission', controller)
+    url = f"/api/tasks/{create_task(client)['_id']}/comments/stream"
+
+    def timed_streams():
+        return sum(count for (_, route, _), count in request_metrics.requests.items()
+                   if route == '/api/tasks/<task_id>/comments/stream')
+
+    timed = timed_streams()
+    streams = []
+    for _ in range(2):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert next(response.iter_encoded()) == b'retry: 3000\n\n'
+        streams.append(response)
+    assert controller.in_flight['stream'] == 2
+    response = client.get(url)
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+    assert timed_streams() == timed + 1
+
+    streams.pop().close()
+    assert controller.in_flight['stream'] == 1
+    assert timed_streams() == timed + 2
+    response = client.get(url)
+    assert response.status_code == 200
+    streams.append(response)
+
+    for response in streams:
+        response.close()
+    assert controller.in_flight['stream'] == 0
+
+
+def test_comment_group_commit(app, client, monkeypatch):
+    """Test concurrent creates are written together but answered separately."""
+    from concurrent.futures import ThreadPoolExecutor
+    from backend import models
+    from backend.groupcommit import GroupCommitter
+    
+    sizes = []
+    monkeypatch.setattr(models, '_comment_commits', GroupCommitter(
+        models._create_comments, window=0.2, max_batch=4, on_flush=sizes.append
+    ))
+    task_id = create_task(client)['_id']
+    
+    def post(target):
+        return app.test_client().post(f'/api/tasks/{target}/comments',
+                                      data=json.dumps({'body': f'On {target}'}),
+                                      content_type='application/json')
+    
+    targets = [task_id] * 5 + ['507f1f77bcf86cd799439011']
+    with ThreadPoolExecutor(len(targets)) as pool:
+        responses = list(pool.map(post, targets))
+    
+    assert [r.status_code for r in responses] == [201] * 5 + [404]
+    assert len({r.get_json()['_id'] for r in responses[:5]}) == 5
+    assert sum(sizes) == 6 and max(sizes) <= 4 and len(sizes) < 6
+    assert client.get(f'/api/tasks/{task_id}').get_json()['comment_count'] == 5
+
+
+def test_failed_comment_inserts_are_uncounted(client, monkeypatch):
+    """Test a comment insert that fails outright leaves the task's count alone."""
+    from datetime import datetime
+    from bson import ObjectId
+    from pymongo.errors import AutoReconnect
+    from backend import models
+    from backend.db import get_db
+    
+    task_id = create_task(client)['_id']
+    collection_class = type(get_db().comments)
+    
+    def fail(self, *args, **kwargs):
+        raise AutoReconnect("connection reset")
+    
+    monkeypatch.setattr(collection_class, 'insert_one', fail)
+    monkeypatch.setattr(collection_class, 'insert_many', fail)
+    with pytest.raises(AutoReconnect):
+        client.post(f'/api/tasks/{task_id}/comments',
+                   data=json.dumps({'body': 'Lost'}),
+                   content_type='application/json')
+    with pytest.raises(AutoReconnect):
+        client.post(f'/api/tasks/{task_id}/comments:batch',
+                   data=json.dumps({'comments': [{'body': 'Lost'}, {'body': 'Too'}]}),
+                   content_type='application/json')
+    # The group commit path, as flushed for concurrent creates
+    now = datetime.utcnow()
+    with pytest.raises(AutoReconnect):
+        models._create_comments([
+            {'task_id': ObjectId(task_id), 'body': body, 'author': None,
+             'created_at': now, 'updated_at': now}
+            for body in ('One', 'Two', 'Three')
+        ])
+    
+    assert client.get(f'/api/tasks/{task_id}').get_json()['comment_count'] == 0
@@ -0,0 +1,87 @@
+"""Tests for the search API endpoint."""
+import json
+import pytest
+
+
+def create_task(client, title, description='', status='todo'):
+    """Helper to create a task."""
+    response = client.post('/api/tasks',
+                          data=json.dumps({'title': title, 'description': description,
+                                           'status': status}),
+                          content_type='application/json')
+    return response.get_json()
+
+
+def create_comment(client, task_id, body):
+    """Helper to create a comment."""
+    response = client.post(f'/api/tasks/{task_id}/comments',
+                          data=json.dumps({'body': body}),
+                          content_type='application/json')
+    return response.get_json()
+
+
+@pytest.fixture
+def memory_search(app, monkeypatch):
+    """Serve searches from an in-process index refreshed on every search."""
+    from src.backend.search import InvertedIndexSearch
+    monkeypatch.setitem(app.extensions, 'search', InvertedIndexSearch(refresh=0))
+
+
+def test_search_with_inverted_index(client, memory_search):
+    """Test ranking, filters, snippets and paging of the in-process backend."""
+    deploy = create_task(client, 'Deploy the release', 'Roll out to production')
+    docs = create_task(client, 'Write docs', 'Explain deploying', status='done')
+    create_task(client, 'Unrelated chore')
+    comment = create_comment(client, docs['_id'], 'Deployed <b>twice</b> yesterday')
+    
+    data = client.get('/api/search?q=deploy').get_json()
+    assert [r['_id'] for r in data['results']] == [deploy['_id'], docs['_id'], comment['_id']]
+    assert data['results'][0]['snippet'] == '<mark>Deploy</mark> the release'
+    assert data['results'][0]['task']['title'] == 'Deploy the release'
+    assert data['results'][2]['type'] == 'comment'
+    assert data['results'][2]['task'] == {'_id': docs['_id'], 'title': 'Write docs',
+                                          'status': 'done'}
+    assert data['results'][2]['snippet'] == ('<mark>Deployed</mark> &lt;b&gt;twice&lt;/b&gt; '
+                                             'yesterday')
+    assert data['next_cursor'] is None
+    
+    data = client.get('/api/search?q=deploy&status=done').get_json()
+    assert [r['_id'] for r in data['results']] == [docs['_id'], comment['_id']]
+    data = client.get('/api/search?q=deploy&type=comment').get_json()
+    assert [r['_id'] for r in data['results']] == [comment['_id']]
+    data = client.get('/api/search?q=deploy -docs').get_json()
+    assert docs['_id'] not in [r['_id'] for r in data['results']]
+    data = client.get('/api/search?q="roll out"').get_json()
+    assert [r['_id'] for r in data['results']] == [deploy['_id']]
+    
+    first = client.get('/api/search?q=deploy&limit=2').get_json()
+    assert len(first['results']) == 2 and first['next_cursor']
+    rest = client.get(f"/api/search?q=deploy&limit=2&cursor={first['next_cursor']}").get_json()
+    assert [r['_id'] for r in rest['results']] == [comment['_id']]
+    
+    # Writes are picked up by the next search
+    client.delete(f"/api/tasks/{docs['_id']}")
+    data = client.get('/api/search?q=deploy').get_json()
+    assert [r['_id'] for r in data['results']] == [deploy['_id']]
+
+
+def test_search_with_text_indexes(client):
+    """Test the MongoDB $text backend ranks titles over comments."""
+    task = create_task(client, 'Deploy the release')
+    other = create_task(client, 'Write docs')
+    comment = create_comment(client, other['_id'], 'Deploy after review')
+    
+    data = client.get('/api/search?q=deploy').get_json()
+    assert [r['_id'] for r in data['results']] == [task['_id'], comment['_id']]
+    assert data['results'][1]['task']['title'] == 'Write docs'
+    data = client.get('/api/search?q=deploy&status=done').get_json()
+    assert data['results'] == []
+
+
+def test_search_invalid_parameters(client):
+    """Test invalid search parameters are rejected."""
+    assert client.get('/api/search').status_code == 400
+    assert client.get('/api/search?q=x&status=nope').status_code == 400
+    assert client.get('/api/search?q=x&type=user').status_code == 400
+    assert client.get('/api/search?q=x&cursor=nope').status_code == 400
+    assert client.get('/api/search?q=x&offset=5').status_code == 400
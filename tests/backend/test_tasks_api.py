@@ -0,0 +1,976 @@
+"""Tests for tasks API endpoints."""
+import json
+import os
+import pytest
+
+
+def create_task(client, title="Test Task", description="Test Description", status="todo"):
+    """Helper to create a task."""
+    response = client.post('/api/tasks',
+                          data=json.dumps({
+                              'title': title,
+                              'description': description,
+                              'status': status
+                          }),
+                          content_type='application/json')
+    return response.get_json()
+
+
+def test_list_tasks_streams_all_newest_first(client):
+    """Test listing all tasks returns a JSON array, newest first."""
+    created = [create_task(client, title=f'Task {i}')['_id'] for i in range(5)]
+    
+    response = client.get('/api/tasks')
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    data = response.get_json()
+    assert [t['_id'] for t in data] == list(reversed(created))
+    assert data[0]['title'] == 'Task 4'
+
+
+def test_list_tasks_empty(client):
+    """Test listing tasks with no tasks returns an empty array."""
+    response = client.get('/api/tasks')
+    
+    assert response.status_code == 200
+    assert response.get_json() == []
+
+
+def test_list_tasks_ndjson(client):
+    """Test streaming tasks as NDJSON."""
+    created = [create_task(client, title=f'Task {i}')['_id'] for i in range(3)]
+    
+    response = client.get('/api/tasks?format=ndjson')
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['_id'] for line in lines] == list(reversed(created))
+
+
+def test_list_tasks_invalid_format(client):
+    """Test an unknown stream format is rejected."""
+    response = client.get('/api/tasks?format=xml')
+    assert response.status_code == 400
+
+
+def test_list_tasks_cursor_pagination(client):
+    """Test walking tasks with keyset cursors."""
+    created = [create_task(client, title=f'Task {i}')['_id'] for i in range(7)]
+    
+    seen = []
+    response = client.get('/api/tasks?limit=3')
+    data = response.get_json()
+    assert data['limit'] == 3
+    seen.extend(t['_id'] for t in data['tasks'])
+    
+    while data['next_cursor']:
+        response = client.get(f'/api/tasks?limit=3&cursor={data["next_cursor"]}')
+        assert response.status_code == 200
+        data = response.get_json()
+        seen.extend(t['_id'] for t in data['tasks'])
+    
+    assert seen == list(reversed(created))
+
+
+def test_list_tasks_cursor_rejects_other_sort(client):
+    """Test that a cursor only continues the sort it was issued for."""
+    for i in range(3):
+        create_task(client, title=f'Task {i}')
+
+    cursor = client.get('/api/tasks?sort=-updated_at&limit=1').get_json()['next_cursor']
+
+    response = client.get(f'/api/tasks?sort=-updated_at&limit=1&cursor={cursor}')
+    assert response.status_code == 200
+
+    response = client.get(f'/api/tasks?limit=1&cursor={cursor}')
+    assert response.status_code == 400
+    assert 'sort=-updated_at' in response.get_json()['error']
+
+    response = client.get(f'/api/tasks?sort=updated_at&limit=1&cursor={cursor}')
+    assert response.status_code == 400
+
+
+def test_list_tasks_invalid_pagination(client):
+    """Test invalid task pagination parameters."""
+    response = client.get('/api/tasks?limit=abc')
+    assert response.status_code == 400
+    
+    response = client.get('/api/tasks?cursor=garbage')
+    assert response.status_code == 400
+
+
+def test_list_tasks_filter_by_status(client):
+    """Test status= filters both the stream and pages."""
+    create_task(client, title="A", status="todo")
+    create_task(client, title="B", status="in_progress")
+    create_task(client, title="C", status="in_progress")
+    
+    data = client.get('/api/tasks?status=in_progress').get_json()
+    assert [t['title'] for t in data] == ['C', 'B']
+    
+    data = client.get('/api/tasks?status=in_progress&limit=1').get_json()
+    assert [t['title'] for t in data['tasks']] == ['C']
+    data = client.get('/api/tasks?status=in_progress&limit=1'
+                      f"&cursor={data['next_cursor']}").get_json()
+    assert [t['title'] for t in data['tasks']] == ['B']
+    assert data['next_cursor'] is None
+
+
+def test_list_tasks_sort_and_date_filters(app, client, test_db_name):
+    """Test sort= and *_after= with keyset pages on the sort field."""
+    from datetime import datetime
+    from src.backend.db import get_client
+    
+    for title in ('A', 'B', 'C'):
+        create_task(client, title=title)
+    db = get_client()[test_db_name]
+    # Most recently updated: A, then B, then C
+    db.tasks.update_one({'title': 'B'}, {'$set': {'updated_at': datetime(2030, 1, 1, 0, 0, 0)}})
+    db.tasks.update_one({'title': 'A'}, {'$set': {'updated_at': datetime(2030, 1, 1, 0, 0, 1)}})
+    
+    data = client.get('/api/tasks?sort=-updated_at').get_json()
+    assert [t['title'] for t in data] == ['A', 'B', 'C']
+    data = client.get('/api/tasks?sort=created_at').get_json()
+    assert [t['title'] for t in data] == ['A', 'B', 'C']
+    
+    page = client.get('/api/tasks?sort=-updated_at&limit=2').get_json()
+    assert [t['title'] for t in page['tasks']] == ['A', 'B']
+    page = client.get('/api/tasks?sort=-updated_at&limit=2'
+                      f"&cursor={page['next_cursor']}").get_json()
+    assert [t['title'] for t in page['tasks']] == ['C']
+    
+    data = client.get('/api/tasks?updated_after=2030-01-01T00:00:00Z&sort=-updated_at').get_json()
+    assert [t['title'] for t in data] == ['A']
+    data = client.get('/api/tasks?created_after=2000-01-01').get_json()
+    assert len(data) == 3
+
+
+def test_list_tasks_since_sync_token(client, test_db_name):
+    """Test ?since= returns only tasks changed or deleted after the token."""
+    from datetime import datetime, timedelta
+    from src.backend.db import get_client
+    from src.backend.models import Tasks
+    from src.backend.utils import encode_sync_token
+    
+    ids = {title: create_task(client, title=title)['_id'] for title in 'ABCD'}
+    # Age the tasks past the token's overlap window
+    db = get_client()[test_db_name]
+    an_hour_ago = datetime.utcnow() - timedelta(hours=1)
+    db.tasks.update_many({}, {'$set': {'created_at': an_hour_ago, 'updated_at': an_hour_ago}})
+    
+    response = client.get('/api/tasks')
+    token = response.headers['X-Sync-Token']
+    client.patch(f"/api/tasks/{ids['A']}", data=json.dumps({'status': 'done'}),
+                content_type='application/json')
+    client.post(f"/api/tasks/{ids['B']}/comments", data=json.dumps({'body': 'Hi'}),
+               content_type='application/json')
+    client.delete(f"/api/tasks/{ids['C']}")
+    new_id = create_task(client, title='E')['_id']
+    
+    data = client.get(f'/api/tasks?since={token}').get_json()
+    assert sorted(t['_id'] for t in data['tasks']) == sorted([ids['A'], ids['B'], new_id])
+    assert data['deleted'] == [ids['C']]
+    assert data['sync_token']
+    
+    # Purged tasks are still reported, from the tombstones
+    Tasks.finish_purge(ids['C'])
+    data = client.get(f'/api/tasks?since={token}&fields=title').get_json()
+    assert data['deleted'] == [ids['C']]
+    assert set(data['tasks'][0]) == {'_id', 'title'}
+    
+    assert client.get('/api/tasks?since=nope').status_code == 400
+    assert client.get(f'/api/tasks?since={token}&limit=5').status_code == 400
+    expired = encode_sync_token(datetime.utcnow() - timedelta(days=30))
+    assert client.get(f'/api/tasks?since={expired}').status_code == 410
+
+
+def test_list_tasks_by_ids_with_comments(client):
+    """Test ?ids= multi-gets tasks and include=comments embeds their newest comments."""
+    ids = [create_task(client, title=title)['_id'] for title in 'ABC']
+    for body in ('First', 'Second', 'Third'):
+        client.post(f'/api/tasks/{ids[0]}/comments', data=json.dumps({'body': body}),
+                   content_type='application/json')
+    client.delete(f'/api/tasks/{ids[2]}')
+    
+    response = client.get(f'/api/tasks?ids={ids[2]},{ids[1]},{ids[0]}')
+    assert response.status_code == 200
+    assert [t['_id'] for t in response.get_json()] == [ids[1], ids[0]]
+    assert 'comments' not in response.get_json()[0]
+    etag = response.headers['ETag']
+    assert client.get(f'/api/tasks?ids={ids[2]},{ids[1]},{ids[0]}',
+                      headers={'If-None-Match': etag}).status_code == 304
+    
+    data = client.get(f'/api/tasks?ids={ids[0]},{ids[1]}&include=comments'
+                      '&comments_limit=2&fields=title').get_json()
+    assert [c['body'] for c in data[0]['comments']] == ['Third', 'Second']
+    assert data[0]['comment_count'] == 3
+    assert data[1]['comments'] == [] and data[1]['title'] == 'B'
+    
+    data = client.get('/api/tasks?include=comments&limit=5').get_json()
+    assert [len(t['comments']) for t in data['tasks']] == [0, 3]
+    data = client.get('/api/tasks?include=comments&comments_limit=1').get_json()
+    assert [len(t['comments']) for t in data] == [0, 1]
+    
+    assert client.get('/api/tasks?ids=nope').status_code == 400
+    assert client.get(f'/api/tasks?ids={ids[0]}&limit=5').status_code == 400
+    assert client.get('/api/tasks?include=votes').status_code == 400
+    assert client.get('/api/tasks?comments_limit=2').status_code == 400
+
+def test_list_tasks_invalid_filters(client):
+    """Test invalid and unindexed filter/sort combinations are rejected."""
+    for query in ('status=nope', 'created_after=yesterday', 'sort=title', 'sort=--created_at'):
+        response = client.get(f'/api/tasks?{query}')
+        assert response.status_code == 400, query
+    
+    # A range on one field sorted by another would need an in-memory sort
+    response = client.get('/api/tasks?updated_after=2024-01-01&sort=-created_at')
+    assert response.status_code == 400
+    assert 'Cannot combine' in response.get_json()['error']
+
+
+def test_task_writes_round_trips(app, client, db_commands, monkeypatch):
+    """Test each task write endpoint issues the minimum of commands."""
+    scheduled = []
+    monkeypatch.setattr(app.extensions['task_purger'], 'schedule', scheduled.append)
+    task_id = create_task(client)['_id']
+    
+    db_commands.clear()
+    response = client.patch(f'/api/tasks/{task_id}',
+                            data=json.dumps({'status': 'done'}),
+                            content_type='application/json')
+    assert response.get_json()['status'] == 'done'
+    # The status change moves the task between the stats counts
+    assert db_commands == ['findAndModify', 'update']
+    
+    # The comment cascade is handed to the purger
+    db_commands.clear()
+    assert client.delete(f'/api/tasks/{task_id}').status_code == 204
+    assert db_commands == ['findAndModify', 'update']
+    assert [str(t) for t in scheduled] == [task_id]
+    
+    db_commands.clear()
+    assert client.delete(f'/api/tasks/{task_id}').status_code == 404
+    assert db_commands == ['findAndModify']
+    assert len(scheduled) == 1
+
+
+def test_create_tasks_batch(client):
+    """Test batch creation returns per-item results and errors."""
+    response = client.post('/api/tasks:batch',
+                          data=json.dumps({'tasks': [
+                              {'title': 'One'},
+                              {'title': '   '},
+                              {'title': 'Two', 'status': 'done'},
+                              {'title': 'Three', 'status': 'bogus'}
+                          ]}),
+                          content_type='application/json')
+    
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['succeeded'] == 2
+    assert data['failed'] == 2
+    assert [r['status'] for r in data['results']] == [201, 400, 201, 400]
+    assert data['results'][2]['task']['status'] == 'done'
+    assert len(client.get('/api/tasks').get_json()) == 2
+
+
+def test_tasks_batch_max_size(app, client):
+    """Test batches larger than MAX_BATCH_SIZE are rejected."""
+    limit = app.config['MAX_BATCH_SIZE']
+    response = client.post('/api/tasks:batch',
+                          data=json.dumps({'tasks': [{'title': 'x'}] * (limit + 1)}),
+                          content_type='application/json')
+    assert response.status_code == 400
+    
+    response = client.post('/api/tasks:batch',
+                          data=json.dumps({'tasks': []}),
+                          content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_update_and_delete_tasks_batch(app, client):
+    """Test batch update and delete report missing and invalid ids."""
+    first = create_task(client, title='First')['_id']
+    second = create_task(client, title='Second')['_id']
+    client.post(f'/api/tasks/{first}/comments',
+               data=json.dumps({'body': 'Hello'}),
+               content_type='application/json')
+    missing = '507f1f77bcf86cd799439011'
+    
+    response = client.patch('/api/tasks:batch',
+                           data=json.dumps({'tasks': [
+                               {'_id': first, 'status': 'done'},
+                               {'_id': missing, 'status': 'done'},
+                               {'_id': second}
+                           ]}),
+                           content_type='application/json')
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == [200, 404, 400]
+    assert results[0]['task']['status'] == 'done'
+    
+    response = client.delete('/api/tasks:batch',
+                            data=json.dumps({'ids': [first, second, missing, 'bad']}),
+                            content_type='application/json')
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == [204, 204, 404, 400]
+    assert client.get('/api/tasks').get_json() == []
+    assert client.get(f'/api/tasks/{first}/comments').status_code == 404
+    
+    app.extensions['task_purger'].join()
+    assert client.get('/api/tasks?limit=10').get_json()['tasks'] == []
+
+
+def test_tasks_reject_non_string_fields(client):
+    """Test non-string titles and descriptions are a 400, alone or batched."""
+    response = client.post('/api/tasks',
+                          data=json.dumps({'title': 5}),
+                          content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == "Title must be a string"
+    response = client.post('/api/tasks',
+                          data=json.dumps(['not', 'an', 'object']),
+                          content_type='application/json')
+    assert response.status_code == 400
+    
+    task_id = create_task(client)['_id']
+    response = client.patch(f'/api/tasks/{task_id}',
+                           data=json.dumps({'description': ['x']}),
+                           content_type='application/json')
+    assert response.status_code == 400
+    response = client.patch(f'/api/tasks/{task_id}',
+                           data=json.dumps({'description': None}),
+                           content_type='application/json')
+    assert response.get_json()['description'] is None
+    
+    response = client.patch('/api/tasks:batch',
+                           data=json.dumps({'tasks': [
+                               {'_id': task_id, 'title': {'text': 'x'}},
+                               {'_id': task_id, 'title': 'Renamed'}
+                           ]}),
+                           content_type='application/json')
+    assert response.status_code == 200
+    assert [r['status'] for r in response.get_json()['results']] == [400, 200]
+
+
+def test_update_tasks_batch_reports_write_errors(client, monkeypatch):
+    """Test batch updates that fail to write are reported per item, not as 200."""
+    from pymongo.errors import BulkWriteError
+    from backend.db import get_db
+    
+    first = create_task(client, title='First')['_id']
+    second = create_task(client, title='Second')['_id']
+    collection_class = type(get_db().tasks)
+    bulk_write = collection_class.bulk_write
+    
+    def failing_bulk_write(self, ops, ordered=True, **kwargs):
+        if self.name != 'tasks':
+            return bulk_write(self, ops, ordered=ordered, **kwargs)
+        bulk_write(self, ops[1:], ordered=ordered, **kwargs)
+        raise BulkWriteError({'writeErrors': [
+            {'index': 0, 'code': 121, 'errmsg': 'Document failed validation', 'op': {}}
+        ]})
+    
+    monkeypatch.setattr(collection_class, 'bulk_write', failing_bulk_write)
+    response = client.patch('/api/tasks:batch',
+                           data=json.dumps({'tasks': [
+                               {'_id': first, 'status': 'done'},
+                               {'_id': second, 'status': 'done'}
+                           ]}),
+                           content_type='application/json')
+    data = response.get_json()
+    assert [r['status'] for r in data['results']] == [500, 200]
+    assert data['failed'] == 1
+    assert data['results'][1]['task']['status'] == 'done'
+
+def test_delete_task_purges_in_background(app, client, test_db_name):
+    """Test deleted tasks vanish at once and their comments are purged."""
+    from src.backend.db import get_client
+    
+    task_id = create_task(client)['_id']
+    client.post(f'/api/tasks/{task_id}/comments:batch',
+               data=json.dumps({'comments': [{'body': f'c{i}'} for i in range(5)]}),
+               content_type='application/json')
+    
+    assert client.delete(f'/api/tasks/{task_id}').status_code == 204
+    assert client.get(f'/api/tasks/{task_id}').status_code == 404
+    assert client.get('/api/tasks').get_json() == []
+    response = client.patch(f'/api/tasks/{task_id}',
+                           data=json.dumps({'status': 'done'}),
+                           content_type='application/json')
+    assert response.status_code == 404
+    
+    app.extensions['task_purger'].join()
+    db = get_client()[test_db_name]
+    assert db.comments.count_documents({}) == 0
+    assert db.tasks.count_documents({}) == 0
+
+
+@pytest.mark.flask_only
+def test_purge_tasks_command_resumes(app, client, test_db_name):
+    """Test purge-tasks finishes tombstoned tasks left behind by a crash."""
+    from src.backend.db import get_client
+    
+    task_id = create_task(client)['_id']
+    client.post(f'/api/tasks/{task_id}/comments',
+               data=json.dumps({'body': 'Leftover'}),
+               content_type='application/json')
+    db = get_client()[test_db_name]
+    # Simulate a tombstone whose purge never ran
+    db.tasks.update_many({}, {'$set': {'deleted_at': db.tasks.find_one()['created_at']}})
+    
+    result = app.test_cli_runner().invoke(args=['purge-tasks'])
+    assert 'Purged 1 task(s)' in result.output
+    assert db.comments.count_documents({}) == 0
+    assert db.tasks.count_documents({}) == 0
+
+
+@pytest.mark.flask_only
+def test_in_process_purger_resumes_on_start(client, test_db_name):
+    """Test the in-process purger first finishes the tasks left tombstoned."""
+    from src.backend.db import get_client
+    from backend.purge import InProcessPurger
+    
+    task_id = create_task(client)['_id']
+    client.post(f'/api/tasks/{task_id}/comments',
+               data=json.dumps({'body': 'Leftover'}),
+               content_type='application/json')
+    db = get_client()[test_db_name]
+    db.tasks.update_many({}, {'$set': {'deleted_at': db.tasks.find_one()['created_at']}})
+    
+    purger = InProcessPurger()
+    purger.start()
+    purger.join()
+    assert db.comments.count_documents({}) == 0
+    assert db.tasks.count_documents({}) == 0
+
+
+def test_temporal_purges_are_opt_in(monkeypatch):
+    """Test a configured Temporal address alone keeps purges in-process."""
+    from backend import purge
+    
+    monkeypatch.setattr(purge, 'workflow', object())
+    # The development config sets temporal.server_address
+    assert isinstance(purge.create_purger(), purge.InProcessPurger)
+    
+    settings = {'temporal.enabled': True, 'temporal.server_address': 'temporal:7233'}
+    monkeypatch.setattr(purge, 'get_config',
+                        lambda key, default=None: settings.get(key, default))
+    purger = purge.create_purger()
+    assert isinstance(purger, purge.TemporalPurger)
+    # Tombstoned tasks are left to their workflows
+    assert not purger.fallback.resume
+    
+    del settings['temporal.server_address']
+    assert isinstance(purge.create_purger(), purge.InProcessPurger)
+
+
+@pytest.mark.flask_only
+def test_purge_skips_comments_deleted_meanwhile(client, test_db_name, monkeypatch):
+    """Test a comment deleted during a purge batch is not uncounted twice."""
+    from datetime import datetime
+    from bson import ObjectId
+    from src.backend.db import get_client
+    from src.backend.models import Comments, Tasks
+    
+    kept = create_task(client, title='Kept')['_id']
+    client.post(f'/api/tasks/{kept}/comments', data=json.dumps({'body': 'Stays'}),
+               content_type='application/json')
+    task_id = create_task(client)['_id']
+    client.post(f'/api/tasks/{task_id}/comments:batch',
+               data=json.dumps({'comments': [{'body': f'c{i}'} for i in range(3)]}),
+               content_type='application/json')
+    db = get_client()[test_db_name]
+    db.tasks.update_one({'_id': ObjectId(task_id)}, {'$set': {'deleted_at': datetime.utcnow()}})
+    raced = db.comments.find_one({'task_id': ObjectId(task_id)})['_id']
+    
+    collection_class = type(db.comments)
+    delete_many = collection_class.delete_many
+    
+    def racing_delete_many(self, *args, **kwargs):
+        monkeypatch.undo()
+        Comments.delete(raced)
+        return delete_many(self, *args, **kwargs)
+    
+    monkeypatch.setattr(collection_class, 'delete_many', racing_delete_many)
+    assert Tasks.purge_comments(task_id) == 2
+    assert db.tasks.find_one({'_id': ObjectId(task_id)})['purged_comments'] == 2
+    data = client.get('/api/tasks/stats?days=1').get_json()
+    assert data['comments']['total'] == 1
+    assert data['comments']['per_day'][-1]['count'] == 1
+
+
+@pytest.mark.flask_only
+def test_task_stats(app, client, test_db_name):
+    """Test the stats follow task and comment writes and can be rebuilt."""
+    from datetime import datetime
+    from src.backend.db import get_client
+    
+    first = create_task(client, title='First')['_id']
+    second = create_task(client, title='Second')['_id']
+    third = create_task(client, title='Third', status='done')['_id']
+    client.post(f'/api/tasks/{second}/comments:batch',
+               data=json.dumps({'comments': [{'body': f'c{i}'} for i in range(3)]}),
+               content_type='application/json')
+    client.post(f'/api/tasks/{first}/comments',
+               data=json.dumps({'body': 'Hello'}),
+               content_type='application/json')
+    client.patch(f'/api/tasks/{first}', data=json.dumps({'status': 'in_progress'}),
+                content_type='application/json')
+    client.patch('/api/tasks:batch',
+                data=json.dumps({'tasks': [{'_id': third, 'status': 'todo'}]}),
+                content_type='application/json')
+    client.delete(f'/api/tasks/{second}')
+    
+    data = client.get('/api/tasks/stats?days=2&top=5').get_json()
+    assert data['tasks'] == {'total': 2, 'by_status': {'todo': 1, 'in_progress': 1, 'done': 0}}
+    # Comments of deleted tasks count until the purge removes them
+    app.extensions['task_purger'].join()
+    data = client.get('/api/tasks/stats?days=2&top=5').get_json()
+    today = datetime.utcnow().strftime('%Y-%m-%d')
+    assert data['comments']['total'] == 1
+    assert [d['count'] for d in data['comments']['per_day']] == [0, 1]
+    assert data['comments']['per_day'][-1]['day'] == today
+    assert [(t['_id'], t['comment_count']) for t in data['most_active']] == [(first, 1)]
+    
+    db = get_client()[test_db_name]
+    db.task_stats.delete_many({})
+    db.task_stats.insert_one({'_id': 'comments:2000-01-01', 'day': '2000-01-01', 'comments': 9})
+    result = app.test_cli_runner().invoke(args=['rebuild-stats'])
+    assert 'Rebuilt stats: 2 task(s), 1 comment(s)' in result.output
+    assert client.get('/api/tasks/stats?days=2&top=5').get_json() == data
+    assert db.task_stats.count_documents({}) == 2
+    
+    for query in ('days=0', 'days=366', 'top=0', 'top=x'):
+        assert client.get(f'/api/tasks/stats?{query}').status_code == 400, query
+
+
+def test_temporal_purger_reuses_one_client(monkeypatch):
+    """Test schedules share a connection and fall back at once while Temporal is down."""
+    from backend import purge
+    
+    connects, started, fallen_back = [], [], []
+    
+    class FakeClient:
+        reachable = True
+        
+        @classmethod
+        async def connect(cls, address):
+            connects.append(address)
+            if not cls.reachable:
+                raise RuntimeError("unreachable")
+            return cls()
+        
+        async def start_workflow(self, name, task_id, **options):
+            started.append((task_id, options['id']))
+    
+    class Fallback:
+        schedule = fallen_back.append
+    
+    monkeypatch.setattr(purge, 'Client', FakeClient)
+    purger = purge.TemporalPurger('temporal:7233', Fallback())
+    purger.schedule('a')
+    purger.schedule('b')
+    assert connects == ['temporal:7233']
+    assert started == [('a', 'purge-task-a'), ('b', 'purge-task-b')]
+    
+    FakeClient.reachable = False
+    purger = purge.TemporalPurger('temporal:7233', Fallback())
+    purger.schedule('c')
+    purger.schedule('d')
+    assert len(connects) == 2
+    assert fallen_back == ['c', 'd']
+
+
+@pytest.mark.flask_only
+def test_sync_indexes_command(app, test_db_name):
+    """Test sync-indexes builds missing indexes and drops obsolete ones."""
+    from src.backend.db import get_client
+    
+    db = get_client()[test_db_name]
+    db.tasks.drop_index('created_at_-1__id_-1')
+    db.tasks.create_index('title')
+    runner = app.test_cli_runner()
+    
+    result = runner.invoke(args=['sync-indexes', '--dry-run'])
+    assert 'missing: tasks.created_at_-1__id_-1' in result.output
+    assert 'obsolete: tasks.title_1' in result.output
+    assert 'created_at_-1__id_-1' not in db.tasks.index_information()
+    
+    runner.invoke(args=['sync-indexes'])
+    indexes = db.tasks.index_information()
+    assert 'created_at_-1__id_-1' in indexes
+    assert 'title_1' not in indexes
+    
+    result = runner.invoke(args=['sync-indexes'])
+    assert 'Indexes match the manifest' in result.output
+
+
+def test_get_task_is_cached_and_invalidated(client, db_commands):
+    """Test repeated lookups hit the task cache and updates invalidate it."""
+    task_id = create_task(client)['_id']
+    
+    db_commands.clear()
+    client.get(f'/api/tasks/{task_id}')
+    client.get(f'/api/tasks/{task_id}')
+    # The cached task is validated by reading just its version fields
+    assert db_commands == ['find', 'find']
+    
+    client.patch(f'/api/tasks/{task_id}',
+                data=json.dumps({'title': 'Renamed'}),
+                content_type='application/json')
+    assert client.get(f'/api/tasks/{task_id}').get_json()['title'] == 'Renamed'
+    
+    client.post(f'/api/tasks/{task_id}/comments',
+               data=json.dumps({'body': 'Hi'}),
+               content_type='application/json')
+    assert client.get(f'/api/tasks/{task_id}').get_json()['comment_count'] == 1
+    
+    stats = client.get('/health/cache').get_json()['tasks']
+    assert stats['hits'] >= 1
+    assert stats['misses'] >= 1
+
+
+def test_task_cache_watcher_retries(monkeypatch):
+    """Test the change stream is reopened after errors and polled around where unsupported."""
+    from bson import ObjectId
+    from pymongo.errors import AutoReconnect, OperationFailure
+    from backend import models
+    
+    task_id = ObjectId()
+    invalidated, cleared = [], []
+    attempts = iter([
+        AutoReconnect('primary stepped down'),
+        [{'documentKey': {'_id': task_id}}],
+        OperationFailure('only supported on replica sets', models.CHANGE_STREAM_UNSUPPORTED),
+    ])
+    epoch = ObjectId()
+    
+    class StopPolling(Exception):
+        pass
+    
+    class Stream(list):
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc):
+            return False
+    
+    class Db:
+        def __init__(self, versions):
+            self.versions = iter(versions)
+            self.tasks = self
+            self.task_stats = self
+            self.watched = 0
+        
+        def watch(self, pipeline):
+            self.watched += 1
+            attempt = next(attempts)
+            if isinstance(attempt, Exception):
+                raise attempt
+            return Stream(attempt)
+        
+        def find_one(self, query):
+            version = next(self.versions, StopPolling)
+            if version is StopPolling:
+                raise StopPolling
+            if isinstance(version, Exception):
+                raise version
+            return {'_id': query['_id'], 'epoch': epoch, 'version': version}
+    
+    monkeypatch.setattr(models, 'WATCH_RETRY_MIN', 0)
+    monkeypatch.setattr(models, 'WATCH_POLL_INTERVAL', 0)
+    monkeypatch.setattr(models, '_change_streams_supported', None)
+    monkeypatch.setattr(models, '_watcher_pid', os.getpid())
+    monkeypatch.setattr(models._task_cache, 'invalidate', invalidated.append)
+    monkeypatch.setattr(models._task_cache, 'clear', lambda: cleared.append(True))
+    db = Db([1, 1, 2, 2])
+    with pytest.raises(StopPolling):
+        models._watch_tasks(db)
+    
+    assert invalidated == [task_id]
+    assert models._watcher_pid is None
+    # Once after the stream that was open, then on the first poll and
+    # when the version moved
+    assert len(cleared) == 3
+    assert models._change_streams_supported is False
+    
+    # A new watcher (e.g. after a fork) polls without asking again; a
+    # failed poll empties the cache
+    cleared.clear()
+    db = Db([2, AutoReconnect('connection reset'), 2])
+    monkeypatch.setattr(models, '_watcher_pid', os.getpid())
+    with pytest.raises(StopPolling):
+        models._watch_tasks(db)
+    assert db.watched == 0
+    assert len(cleared) == 3
+
+
+def test_task_cache_skips_reads_raced_by_writes(client, monkeypatch):
+    """Test a task read while a write invalidates it is not cached."""
+    from bson import ObjectId
+    from backend.db import get_db
+    from backend.models import Tasks
+    
+    task_id = ObjectId(create_task(client)['_id'])
+    collection_class = type(get_db().tasks)
+    find_one = collection_class.find_one
+    
+    def racing_find_one(self, *args, **kwargs):
+        task = find_one(self, *args, **kwargs)
+        # The write lands between the read and the cache fill
+        monkeypatch.undo()
+        Tasks.update(task_id, {'title': 'Renamed'})
+        return task
+    
+    monkeypatch.setattr(collection_class, 'find_one', racing_find_one)
+    assert Tasks.find_by_id(task_id)['title'] == 'Test Task'
+    assert Tasks.find_by_id(task_id)['title'] == 'Renamed'
+
+
+def test_tasks_sparse_fieldsets(client):
+    """Test ?fields= limits task payloads on every read endpoint."""
+    task_id = create_task(client, title='Sparse')['_id']
+    for i in range(2):
+        create_task(client, title=f'Other {i}')
+    
+    data = client.get(f'/api/tasks/{task_id}?fields=title,status').get_json()
+    assert data == {'_id': task_id, 'title': 'Sparse', 'status': 'todo'}
+    
+    data = client.get('/api/tasks?fields=title').get_json()
+    assert all(set(t) == {'_id', 'title'} for t in data)
+    
+    # Cursors still work when created_at is not requested
+    data = client.get('/api/tasks?limit=2&fields=status').get_json()
+    assert all(set(t) == {'_id', 'status'} for t in data['tasks'])
+    next_page = client.get(f'/api/tasks?limit=2&fields=status&cursor={data["next_cursor"]}')
+    assert [t['_id'] for t in next_page.get_json()['tasks']] == [task_id]
+    
+    response = client.get('/api/tasks?fields=title,secret')
+    assert response.status_code == 400
+
+
+def test_get_task_conditional(client):
+    """Test get_task answers 304 until the task or its comments change."""
+    task_id = create_task(client)['_id']
+    
+    response = client.get(f'/api/tasks/{task_id}')
+    etag = response.headers['ETag']
+    last_modified = response.headers['Last-Modified']
+    
+    response = client.get(f'/api/tasks/{task_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    response = client.get(f'/api/tasks/{task_id}',
+                          headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+    
+    # Another representation has another ETag
+    response = client.get(f'/api/tasks/{task_id}?fields=title',
+                          headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    
+    client.post(f'/api/tasks/{task_id}/comments',
+               data=json.dumps({'body': 'New'}),
+               content_type='application/json')
+    response = client.get(f'/api/tasks/{task_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+
+def test_list_tasks_conditional(client, db_commands):
+    """Test streamed and paged task lists honour If-None-Match."""
+    task_id = create_task(client)['_id']
+    
+    for url in ('/api/tasks', '/api/tasks?limit=5'):
+        etag = client.get(url).headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+        
+        client.patch(f'/api/tasks/{task_id}',
+                    data=json.dumps({'title': f'Renamed for {url}'}),
+                    content_type='application/json')
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+    
+    # A full listing is validated by one point read of the list version
+    comment_id = client.post(f'/api/tasks/{task_id}/comments',
+                            data=json.dumps({'body': 'Hi'}),
+                            content_type='application/json').get_json()['_id']
+    etag = client.get('/api/tasks').headers['ETag']
+    db_commands.clear()
+    assert client.get('/api/tasks', headers={'If-None-Match': etag}).status_code == 304
+    assert db_commands == ['find']
+    
+    client.patch(f'/api/comments/{comment_id}',
+                data=json.dumps({'body': 'Edited'}),
+                content_type='application/json')
+    assert client.get('/api/tasks', headers={'If-None-Match': etag}).status_code == 200
+
+
+@pytest.mark.flask_only
+def test_cors_allows_conditional_requests(client):
+    """Test the dev frontend may send If-None-Match and read the validators."""
+    origin = {'Origin': 'http://localhost:5173'}
+    response = client.options('/api/tasks', headers=dict(
+        origin, **{'Access-Control-Request-Method': 'GET',
+                   'Access-Control-Request-Headers': 'If-None-Match'}
+    ))
+    assert 'if-none-match' in response.headers['Access-Control-Allow-Headers'].lower()
+    
+    exposed = client.get('/api/tasks', headers=origin).headers['Access-Control-Expose-Headers']
+    assert {'ETag', 'X-Sync-Token'} <= {name.strip() for name in exposed.split(',')}
+
+
+def test_pool_metrics_endpoint(client):
+    """Test connection pool metrics are collected and exposed."""
+    create_task(client)
+    
+    pool = client.get('/health/db').get_json()['pool']
+    assert pool['checkouts'] >= 1
+    assert pool['in_use'] >= 0
+    assert pool['wait_queue'] == 0
+
+
+def test_server_timing_and_metrics(client):
+    """Test requests carry Server-Timing and are counted on /metrics."""
+    task_id = create_task(client)['_id']
+    
+    response = client.get(f'/api/tasks/{task_id}')
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('db;desc="') and 'serialize;dur=' in timing
+    assert 'total;dur=' in timing
+    
+    body = client.get('/metrics').get_data(as_text=True)
+    assert ('http_requests_total{method="GET",route="/api/tasks/<task_id>",status="200"}'
+            in body)
+    assert ('http_request_duration_seconds_bucket{method="POST",route="/api/tasks",le="+Inf"}'
+            in body)
+    assert 'mongodb_commands_total{method="POST",route="/api/tasks"}' in body
+
+
+def test_admission_control(app, app_kind, client, monkeypatch):
+    """Test rate limits, in-flight caps and pool-based shedding."""
+    from backend.admission import AdmissionController
+    from backend.db import pool_metrics
+    
+    def use(**settings):
+        controller = AdmissionController(dict({'enabled': True}, **settings))
+        monkeypatch.setitem(app.extensions, 'admission', controller)
+        return controller
+    
+    # Open streams pin a Flask worker thread, so few get a slot
+    assert app.extensions['admission'].max_in_flight['stream'] == (
+        2 if app_kind == 'flask' else 256
+    )
+    assert AdmissionController({}).max_in_flight['stream'] == 256
+    
+    controller = use(rate_limit={'requests_per_second': 1, 'burst': 2})
+    assert [client.get('/api/tasks?limit=1').status_code for _ in range(3)] == [200, 200, 429]
+    assert client.get('/api/tasks?limit=1').headers['Retry-After'] == '1'
+    assert controller.in_flight['read'] == 0
+    
+    # Reads are full; writes have their own slots
+    controller = use(rate_limit={'requests_per_second': 0}, max_in_flight={'read': 0})
+    response = client.get('/api/tasks')
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+    task_id = create_task(client)['_id']
+    assert controller.in_flight['write'] == 0
+    
+    # Cascading deletes are a class of their own
+    controller = use(max_in_flight={'cascade': 0})
+    assert client.delete(f'/api/tasks/{task_id}').status_code == 503
+    assert client.get(f'/api/tasks/{task_id}').status_code == 200
+    
+    controller = use(shed={'max_pool_wait_queue': 5})
+    monkeypatch.setattr(pool_metrics, 'waiting', 6)
+    assert client.get(f'/api/tasks/{task_id}').status_code == 503
+    assert client.get('/health').status_code == 200
+    
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'admission_requests_total{class="read",outcome="shed"} 1' in body
+    assert 'admission_in_flight_limit{class="cascade"} 4' in body
+
+
+@pytest.mark.flask_only
+def test_admission_client_key(app, monkeypatch):
+    """Test clients are told apart by what the trusted proxies appended."""
+    from flask import request
+    from backend import admission
+    
+    settings = {'is_server_running_behind_proxy': True, 'trusted_proxy_hops': 1}
+    monkeypatch.setattr(admission, 'get_config',
+                        lambda key, default=None: settings.get(key, default))
+    
+    def key(forwarded=None):
+        headers = {'X-Forwarded-For': forwarded} if forwarded else {}
+        with app.test_request_context(headers=headers,
+                                      environ_base={'REMOTE_ADDR': '10.0.0.2'}):
+            return admission.client_key(request)
+    
+    # Spoofed entries on the left do not change the key
+    assert key('1.2.3.4, 203.0.113.7') == '203.0.113.7'
+    assert key('203.0.113.7') == '203.0.113.7'
+    assert key() == '10.0.0.2'
+    settings['trusted_proxy_hops'] = 2
+    assert key('1.2.3.4, 203.0.113.7, 10.0.0.1') == '203.0.113.7'
+    assert key('203.0.113.7') == '10.0.0.2'
+    settings['is_server_running_behind_proxy'] = False
+    assert key('203.0.113.7') == '10.0.0.2'
+
+
+@pytest.mark.flask_only
+def test_slow_query_log(app, client, test_db_name):
+    """Test slow query shapes, explain summaries and their reports.
+    
+    The endpoint is enabled by config/development.yml.
+    """
+    import json as json_module
+    from datetime import datetime
+    from bson import ObjectId
+    from backend.slowlog import query_shape, summarize_explain
+    from src.backend.db import get_client
+    
+    shape = query_shape('find', {
+        'find': 'comments', 'filter': {'task_id': ObjectId(), 'created_at': {'$lt': 1}},
+        'sort': {'created_at': -1}, 'skip': 5000, 'limit': 20
+    })
+    assert shape == {'op': 'find', 'collection': 'comments',
+                     'filter': {'task_id': '?', 'created_at': {'$lt': '?'}},
+                     'sort': {'created_at': -1}, 'skip': '?', 'limit': '?'}
+    explain = summarize_explain({
+        'queryPlanner': {'winningPlan': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}},
+        'executionStats': {'totalDocsExamined': 9000, 'totalKeysExamined': 0, 'nReturned': 20}
+    })
+    assert explain['collscan'] and explain['in_memory_sort']
+    assert (explain['docs_examined'], explain['returned']) == (9000, 20)
+    
+    db = get_client()[test_db_name]
+    db.slow_queries.delete_many({})
+    for duration in (150, 250):
+        db.slow_queries.insert_one({
+            'shape': json_module.dumps(shape), 'caller': 'backend.models.Comments.find_by_task',
+            'duration_ms': duration, 'explain': explain, 'recorded_at': datetime.utcnow()
+        })
+    
+    data = client.get('/debug/slow-queries').get_json()
+    assert len(data['queries']) == 1
+    row = data['queries'][0]
+    assert (row['count'], row['avg_ms'], row['max_ms']) == (2, 200, 250)
+    assert row['shape'] == shape
+    assert row['callers'] == ['backend.models.Comments.find_by_task']
+    
+    result = app.test_cli_runner().invoke(args=['slow-queries'])
+    assert 'Comments.find_by_task' in result.output
+    assert 'collscan, in_memory_sort' in result.output
+    db.slow_queries.delete_many({})
+
+
+@pytest.mark.flask_only
+def test_slow_query_endpoint_is_opt_in(monkeypatch):
+    """Test /debug/slow-queries only exists where the config enables it."""
+    from src.backend import app as app_module
+    
+    monkeypatch.setattr(app_module, 'get_config', lambda key, default=None: default)
+    rules = {rule.rule for rule in app_module.create_app().url_map.iter_rules()}
+    assert '/debug/slow-queries' not in rules
+    assert '/metrics' in rules